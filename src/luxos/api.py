@@ -3,12 +3,32 @@ from __future__ import annotations
 import importlib.resources
 import json
 import logging
+from typing import Any
 
 log = logging.getLogger(__name__)
 
 
 COMMANDS = json.loads((importlib.resources.files("luxos") / "api.json").read_text())
 
+#: metadata for commands not described in api.json
+#:   logon_required: the command needs a session id
+#:   reply_key: the key holding the payload in the reply (eg. VERSION)
+#:   minfields/maxfields: the expected number of items under reply_key
+#:   idempotent: the command is read-only, it can be safely repeated
+#:   cost: relative expected cost (1 is a simple read)
+#:   cache_ttl: for how long (s) a reply can be reused (0 is never)
+#:   invalidates: the cached replies made stale by the command (None is all)
+DEFAULTS: dict[str, Any] = {
+    "logon_required": False,
+    "reply_key": None,
+    "minfields": None,
+    "maxfields": None,
+    "idempotent": False,
+    "cost": 1,
+    "cache_ttl": 0,
+    "invalidates": None,
+}
+
 
 def logon_required(cmd: str, commands_list=COMMANDS) -> bool | None:
     # Check if the command requires logon to LuxOS API
@@ -20,3 +40,23 @@ def logon_required(cmd: str, commands_list=COMMANDS) -> bool | None:
         return None
 
     return COMMANDS[cmd]["logon_required"]
+
+
+def get_command(cmd: str) -> dict[str, Any]:
+    """returns the cmd metadata (see DEFAULTS), unknown commands get the defaults"""
+    return {**DEFAULTS, **COMMANDS.get(cmd, {})}
+
+
+def is_idempotent(cmd: str) -> bool:
+    """True if cmd is a read-only command"""
+    return bool(COMMANDS.get(cmd, DEFAULTS)["idempotent"])
+
+
+def cache_ttl(cmd: str) -> float:
+    """for how long (s) the reply to cmd can be reused"""
+    return COMMANDS.get(cmd, DEFAULTS)["cache_ttl"]
+
+
+def invalidates(cmd: str) -> list[str] | None:
+    """the commands whose cached replies are made stale by cmd (None is all)"""
+    return COMMANDS.get(cmd, DEFAULTS)["invalidates"]
@@ -2,21 +2,95 @@ from __future__ import annotations
 
 import asyncio
 import contextlib
+import copy
 import functools
+import itertools
 import json
 import logging
-from typing import Any
+import time
+from typing import Any, AsyncIterator, Callable
 
-from . import api, exceptions
+from . import api, cache, exceptions, jsonlib, net, resolver, tracing
 
 log = logging.getLogger(__name__)
 
 #: default timeout (s) for operations
 TIMEOUT = 3.0
+#: default timeout (s) to connect to a miner (None: TIMEOUT)
+CONNECT_TIMEOUT: float | None = None
+#: default timeout (s) waiting for the miner data (None: TIMEOUT)
+IDLE_TIMEOUT: float | None = None
+#: default time limit (s) for a whole request, retries included (None: no limit)
+DEADLINE: float | None = None
+#: time limit (s) of the logoff after a command (best effort, past the deadline)
+LOGOFF_TIMEOUT = 1.0
 #: default number (>1) of retries on a failed operation
 RETRIES = 0
 #: delay (s) between retries
 RETRIES_DELAY = 1.0
+#: log one rexec request every REQUESTS_LOG_SAMPLE (0 disables the sampling)
+REQUESTS_LOG_SAMPLE = 0
+#: log every failed rexec request
+REQUESTS_LOG_FAILURES = False
+#: share the in-flight rexec of idempotent commands among concurrent callers
+SINGLE_FLIGHT = False
+
+# structured per-request log (see log_request)
+reqlog = logging.getLogger("luxos.requests")
+_requests_counter = itertools.count()
+
+# (loop, host, port, cmd, parameters, limits...) -> the in-flight rexec
+_inflight: dict[tuple[Any, ...], asyncio.Task] = {}
+
+
+def log_request(
+    host: str,
+    port: int,
+    cmd: str,
+    t0: float,
+    attempts: int,
+    failure: BaseException | None = None,
+) -> None:
+    """structured log of a request, sampled 1 every REQUESTS_LOG_SAMPLE
+
+    Failures are always logged if REQUESTS_LOG_FAILURES is set, the record
+    is available to log handlers in the ``request`` attribute, eg::
+
+        {"attempts": 1, "cmd": "version", "elapsed": 0.012,
+         "error": null, "host": "127.0.0.1", "port": 4028, "status": "ok"}
+    """
+    if not (REQUESTS_LOG_SAMPLE or REQUESTS_LOG_FAILURES):
+        return
+    sampled = REQUESTS_LOG_SAMPLE and (
+        next(_requests_counter) % REQUESTS_LOG_SAMPLE == 0
+    )
+    if not (sampled or (failure is not None and REQUESTS_LOG_FAILURES)):
+        return
+    if not reqlog.isEnabledFor(logging.INFO):
+        return
+    record = {
+        "host": host,
+        "port": port,
+        "cmd": cmd,
+        "status": "ok" if failure is None else "failed",
+        "attempts": attempts,
+        "elapsed": round(time.monotonic() - t0, 6),
+        "error": None if failure is None else repr(failure),
+    }
+    reqlog.info(json.dumps(record, sort_keys=True), extra={"request": record})
+
+
+def _expiry(timeout: float | None, expiry: float | None = None) -> float | None:
+    # the (monotonic) time timeout expires at, capped by expiry
+    if timeout is None:
+        return expiry
+    at = time.monotonic() + timeout
+    return at if expiry is None else min(at, expiry)
+
+
+def _left(expiry: float | None) -> float | None:
+    # the time left before expiry (None for no limit)
+    return None if expiry is None else max(expiry - time.monotonic(), 0.0)
 
 
 def wrapped(function):
@@ -51,34 +125,118 @@ def wrapped(function):
     return _function
 
 
-async def _roundtrip(
-    host: str, port: int, cmd: bytes | str, timeout: float | None
-) -> str:
-    """simple asyncio socket based send/receive function
-
-    Example:
-        print(await _roundtrip(host, port, "version"))
-        -> (str) "{'STATUS': [{'Code': 22, 'Description'...."
-    """
-    reader, writer = await asyncio.wait_for(
-        asyncio.open_connection(host, port), timeout
-    )
-
-    writer.write(cmd.encode() if isinstance(cmd, str) else cmd)
-    await writer.drain()
+async def _connect(host: str, port: int, expiry: float | None = None) -> net.Connection:
+    # a new connection to host:port (resolution included) by expiry
+    address = await asyncio.wait_for(resolver.aresolve(host, port), _left(expiry))
+    loop = asyncio.get_running_loop()
+    stack = contextlib.ExitStack()
+    try:
+        # the socket is bound to the next net.SOURCES source (if any)
+        sock = stack.enter_context(
+            net.connection(blocking=False, family=net.address_family(address))
+        )
+        with tracing.span("connect", host, port):
+            await asyncio.wait_for(
+                loop.sock_connect(sock, (address, port)), _left(expiry)
+            )
+            reader, writer = await asyncio.open_connection(sock=sock)
+    except BaseException:
+        stack.close()
+        raise
+    return net.Connection(reader, writer, stack)
+
+
+async def _exchange(
+    conn: net.Connection,
+    cmd: bytes | str,
+    idle_timeout: float | None,
+    expiry: float | None = None,
+) -> tuple[bytes, bool]:
+    # sends cmd and reads the reply, up to the NUL terminator (True)
+    # or the connection end (False)
+    conn.writer.write(cmd.encode() if isinstance(cmd, str) else cmd)
+    await conn.writer.drain()
 
     response = bytearray()
     while True:
-        data = await asyncio.wait_for(reader.read(1), timeout=timeout)
+        data = await asyncio.wait_for(
+            conn.reader.read(1), timeout=_left(_expiry(idle_timeout, expiry))
+        )
         if not data:
-            break
+            return bytes(response), False
         null_index = data.find(b"\x00")
         if null_index >= 0:
             response += data[:null_index]
-            break
+            return bytes(response), True
         response += data
 
-    return response.decode()
+
+async def _roundtrip_raw(
+    host: str,
+    port: int,
+    cmd: bytes | str,
+    timeout: float | None,
+    connect_timeout: float | None = None,
+    idle_timeout: float | None = None,
+    expiry: float | None = None,
+) -> bytes:
+    """simple asyncio socket based send/receive function (raw bytes)
+
+    The connection (resolution included) is limited by connect_timeout
+    and each read by idle_timeout (both default to timeout), all capped
+    by the expiry (monotonic) time.
+
+    With a net.POOL the connection is reused, if the miner keeps it open.
+
+    Example:
+        print(await _roundtrip_raw(host, port, "version"))
+        -> (bytes) b"{'STATUS': [{'Code': 22, 'Description'...."
+    """
+    connect_timeout = timeout if connect_timeout is None else connect_timeout
+    idle_timeout = timeout if idle_timeout is None else idle_timeout
+
+    pool = net.POOL
+    if pool and (conn := pool.acquire(host, port)):
+        try:
+            response, terminated = await _exchange(conn, cmd, idle_timeout, expiry)
+        except ConnectionError:
+            response, terminated = b"", False
+        except BaseException:
+            conn.close()
+            raise
+        if terminated:
+            pool.mark(host, port, True)
+            pool.release(host, port, conn)
+            return response
+        # closed by the miner, fallback to a new connection
+        conn.close()
+        if response:
+            return response
+        pool.mark(host, port, False)
+
+    conn = await _connect(host, port, _expiry(connect_timeout, expiry))
+    try:
+        response, terminated = await _exchange(conn, cmd, idle_timeout, expiry)
+    except BaseException:
+        conn.close()
+        raise
+    if pool and terminated:
+        pool.release(host, port, conn)
+    else:
+        conn.close()
+    return response
+
+
+async def _roundtrip(
+    host: str, port: int, cmd: bytes | str, timeout: float | None
+) -> str:
+    """simple asyncio socket based send/receive function
+
+    Example:
+        print(await _roundtrip(host, port, "version"))
+        -> (str) "{'STATUS': [{'Code': 22, 'Description'...."
+    """
+    return (await _roundtrip_raw(host, port, cmd, timeout)).decode()
 
 
 # TODO add annotations
@@ -90,18 +248,31 @@ async def roundtrip(
     timeout: float | None = None,
     retry: int | None = 0,
     retry_delay: float | None = None,
+    lazy: bool = False,
+    connect_timeout: float | None = None,
+    idle_timeout: float | None = None,
+    deadline: float | None = None,
 ):
     """utility wrapper around _roundrip
 
+    The connect_timeout, idle_timeout and deadline default to the
+    module values (:py:data:`CONNECT_TIMEOUT`, :py:data:`IDLE_TIMEOUT`
+    and :py:data:`DEADLINE`), the retries are stopped at the deadline.
+
     Example:
         print(await roundtrip(host, port, {"version"}))
         -> (json) {'STATUS': [{'Code': 22, 'Description': 'LUXminer 20 ...
         print(await roundtrip(host, port, "version"))
         -> (str) "{'STATUS': [{'Code': 22, 'Description': 'LUXminer 20 ..
+        print(await roundtrip(host, port, {"version"}, lazy=True))
+        -> (LazyReply) <LazyReply 312 bytes status=S>
     """
     timeout = TIMEOUT if timeout is None else timeout
     retry = RETRIES if retry is None else retry
     retry_delay = RETRIES_DELAY if retry_delay is None else retry_delay
+    connect_timeout = CONNECT_TIMEOUT if connect_timeout is None else connect_timeout
+    idle_timeout = IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+    expiry = _expiry(DEADLINE if deadline is None else deadline)
 
     if not isinstance(cmd, (bytes, str)):
         cmd = json.dumps(cmd, indent=2, sort_keys=True)
@@ -110,19 +281,30 @@ async def roundtrip(
 
     last_exception = None
     for _ in range(max(retry, 1)):
+        if _left(expiry) == 0:
+            break
         try:
-            res = await _roundtrip(host, port, cmd, timeout)
+            res = await _roundtrip_raw(
+                host, port, cmd, timeout, connect_timeout, idle_timeout, expiry
+            )
+            if lazy:
+                return jsonlib.LazyReply(res)
             if asjson:
-                return json.loads(res)
+                with tracing.span("decode", host, port, size=len(res)):
+                    return jsonlib.loads(res)
             else:
-                return res
+                return res.decode()
+        except exceptions.MinerResolutionError:
+            # no point in retrying (the failure is cached)
+            raise
         except (Exception, asyncio.TimeoutError) as e:
             last_exception = e
         if retry and retry_delay:
-            await asyncio.sleep(retry_delay)
+            await asyncio.sleep(_left(_expiry(retry_delay, expiry)) or 0)
 
     if last_exception is not None:
         raise exceptions.MinerCommandTimeoutError(host, port) from last_exception
+    raise exceptions.MinerCommandTimeoutError(host, port, "deadline exceeded")
 
 
 def validate_message(
@@ -133,55 +315,58 @@ def validate_message(
     minfields: None | int = 1,
     maxfields: None | int = 1,
 ) -> Any:
-    # all miner message comes with a STATUS
-    for key in ["STATUS", "id"]:
-        if key in res:
-            continue
-        raise exceptions.MinerCommandMalformedMessageError(
-            host, port, f"missing {key} from message STATUS", res
-        )
-
-    # no further validation here
-    if not extrakey:
-        return res
-
-    if not res["STATUS"] or not res["STATUS"][0].get("STATUS") == "S":
-        raise exceptions.MinerCommandMalformedMessageError(
-            host, port, "no status information in message", res
-        )
+    """validates res, checking the extrakey items count
 
-    # TODO if minfield is 0, there might not be extrakey
-    if minfields == 0 and extrakey not in res:
-        return []
+    Unlike :py:func:`validate` extrakey is not extracted (any sized value
+    is accepted) and minfields > maxfields rejects every message instead of
+    raising RuntimeError. The checks for each arguments set are cached.
 
-    if extrakey not in res:
-        if not minfields:
-            return []
-        raise exceptions.MinerCommandMalformedMessageError(
-            host, port, f"missing {extrakey} from message", res
-        )
-
-    n = len(res[extrakey])
-    msg = None
-
-    cond = ""
-    if minfields is not None and maxfields is None:
-        cond = f" ({n} < {minfields})"
-    elif minfields is None and maxfields is not None:
-        cond = f" ({n} > {maxfields})"
-    elif minfields is not None and maxfields is not None:
-        if n > maxfields:
-            cond = f" ({n} > {maxfields})"
-        else:
-            cond = f" ({n} < {minfields})"
+    Returns:
+        res, or [] if extrakey is missing and minfields allows it
 
-    if (minfields is not None) and (n < minfields):
-        msg = f"found too few items for '{extrakey}' {cond}"
-    elif (maxfields is not None) and (n > maxfields):
-        msg = f"found too many items for '{extrakey}' {cond}"
-    if msg is None:
+    Raises:
+        MinerCommandMalformedMessageError: if res is not a valid message
+    """
+    return _message_validator(extrakey, minfields, maxfields)(host, port, res)
+
+
+@functools.lru_cache(maxsize=None)
+def _message_validator(
+    extrakey: str | None, minfields: None | int, maxfields: None | int
+) -> Callable[[str, int, dict[str, Any]], Any]:
+    # validate_message, with the arguments interpreted once
+    invalid = _cardinality(extrakey, minfields, maxfields)
+
+    def validator(host: str, port: int, res: dict[str, Any]) -> Any:
+        # all miner message comes with a STATUS
+        for key in ["STATUS", "id"]:
+            if key in res:
+                continue
+            raise exceptions.MinerCommandMalformedMessageError(
+                host, port, f"missing {key} from message STATUS", res
+            )
+
+        # no further validation here
+        if not extrakey:
+            return res
+
+        if not res["STATUS"] or not res["STATUS"][0].get("STATUS") == "S":
+            raise exceptions.MinerCommandMalformedMessageError(
+                host, port, "no status information in message", res
+            )
+
+        if extrakey not in res:
+            if not minfields:
+                return []
+            raise exceptions.MinerCommandMalformedMessageError(
+                host, port, f"missing {extrakey} from message", res
+            )
+
+        if (msg := invalid(len(res[extrakey]))) is not None:
+            raise exceptions.MinerCommandMalformedMessageError(host, port, msg, res)
         return res
-    raise exceptions.MinerCommandMalformedMessageError(host, port, msg, res)
+
+    return validator
 
 
 def validate(
@@ -215,73 +400,131 @@ def validate(
             the len(res[extrakey]) is not valid.
     """
 
+    return compile_validator(extrakey, minfields, maxfields)(res)
+
+
+def _cardinality(
+    extrakey: str | None, minfields: None | int, maxfields: None | int
+) -> Callable[[int], str | None]:
+    # the error message for n extrakey items (None if n is valid)
+    def invalid(n: int) -> str | None:
+        cond = ""
+        if minfields is not None and maxfields is None:
+            cond = f" ({n} < {minfields})"
+        elif minfields is None and maxfields is not None:
+            cond = f" ({n} > {maxfields})"
+        elif minfields is not None and maxfields is not None:
+            if n > maxfields:
+                cond = f" ({n} > {maxfields})"
+            else:
+                cond = f" ({n} < {minfields})"
+
+        if (minfields is not None) and (n < minfields):
+            return f"found too few items for '{extrakey}' {cond}"
+        elif (maxfields is not None) and (n > maxfields):
+            return f"found too many items for '{extrakey}' {cond}"
+        return None
+
+    return invalid
+
+
+@functools.lru_cache(maxsize=None)
+def compile_validator(
+    extrakey: str | None = None,
+    minfields: None | int = None,
+    maxfields: None | int = None,
+) -> Callable[[dict[str, Any]], Any]:
+    """returns a function validating messages as :py:func:`validate`
+
+    The arguments are checked once, and the returned validator is cached,
+    so validating many messages doesn't pay for interpreting them again.
+
+    Raises:
+        RuntimeError: if minfield > maxfield (internal error).
+    """
     if minfields is not None and maxfields is not None:
         if minfields > maxfields:
             raise RuntimeError(f"invalid arguments: {minfields=} > {maxfields=}")
-    # all miner message comes with a STATUS
-    for key in ["STATUS", "id"]:
-        if key in res:
-            continue
-        raise exceptions.MinerMessageMalformedError(
-            f"missing {key} from message STATUS", res
-        )
 
-    # no further validation here
-    if not extrakey:
-        return res
+    single = (minfields, maxfields) == (1, 1)
+    invalid = _cardinality(extrakey, minfields, maxfields)
+
+    def validator(res: dict[str, Any]) -> Any:
+        # all miner message comes with a STATUS
+        for key in ["STATUS", "id"]:
+            if key in res:
+                continue
+            raise exceptions.MinerMessageMalformedError(
+                f"missing {key} from message STATUS", res
+            )
+
+        # no further validation here
+        if not extrakey:
+            return res
+
+        status = res["STATUS"][0].get("STATUS") if res["STATUS"] else None
+        if status != "S":
+            raise exceptions.MinerMessageError(
+                f"wrong status '{status}' in message (expected S)", res
+            )
+        # ok, when there aren't pools, the POOLS command
+        # doesn't add a 'POOLS': [] item
+        if extrakey not in res and not minfields:
+            return None
+
+        if extrakey not in res:
+            raise exceptions.MinerMessageInvalidError(
+                f"missing {extrakey} from message", res
+            )
+
+        values = res[extrakey]
+        if not isinstance(values, list):
+            raise exceptions.MinerMessageMalformedError(
+                f"message reply doesn't contain list in '{extrakey}'", res
+            )
+
+        if (msg := invalid(len(values))) is not None:
+            raise exceptions.MinerMessageInvalidError(msg, res)
+
+        if single and len(values) == 1:
+            return values[0]
+        return values
 
-    if (status := res["STATUS"][0].get("STATUS")) != "S":
-        raise exceptions.MinerMessageError(
-            f"wrong status '{status}' in message (expected S)", res
-        )
-    # ok, when there aren't pools, the POOLS command
-    # doesn't add a 'POOLS': [] item
-    if extrakey not in res and not minfields:
-        return None
+    return validator
 
-    if extrakey not in res:
-        raise exceptions.MinerMessageInvalidError(
-            f"missing {extrakey} from message", res
-        )
 
-    values = res[extrakey]
-    if not isinstance(values, list):
-        raise exceptions.MinerMessageMalformedError(
-            f"message reply doesn't contain list in '{extrakey}'", res
-        )
+@functools.lru_cache(maxsize=None)
+def get_validator(cmd: str) -> Callable[[dict[str, Any]], Any]:
+    """returns the validator/extractor for the cmd replies
 
-    n = len(values)
-    msg = None
+    The validator is built once per command out of the api.json metadata
+    (reply_key, minfields and maxfields), eg::
 
-    cond = ""
-    if minfields is not None and maxfields is None:
-        cond = f" ({n} < {minfields})"
-    elif minfields is None and maxfields is not None:
-        cond = f" ({n} > {maxfields})"
-    elif minfields is not None and maxfields is not None:
-        if n > maxfields:
-            cond = f" ({n} > {maxfields})"
-        else:
-            cond = f" ({n} < {minfields})"
+        get_validator("version")(res) -> res["VERSION"][0]
 
-    if (minfields is not None) and (n < minfields):
-        msg = f"found too few items for '{extrakey}' {cond}"
-    elif (maxfields is not None) and (n > maxfields):
-        msg = f"found too many items for '{extrakey}' {cond}"
-    if msg is not None:
-        raise exceptions.MinerMessageInvalidError(msg, res)
+    Commands without a reply_key are checked for the STATUS only, and
+    the whole message is returned.
+    """
+    info = api.get_command(cmd)
+    check = compile_validator(info["reply_key"], info["minfields"], info["maxfields"])
+    if info["reply_key"] or cmd not in api.COMMANDS:
+        return check
+
+    def validator(res: dict[str, Any]) -> Any:
+        res = check(res)
+        if (status := res["STATUS"][0].get("STATUS")) != "S":
+            raise exceptions.MinerMessageError(
+                f"wrong status '{status}' in message (expected S)", res
+            )
+        return res
 
-    if isinstance(values, list):
-        ones = (len(values), minfields, maxfields)
-        if ones == (1, 1, 1):
-            return values[0]
-    return values
+    return validator
 
 
 @wrapped
-async def logon(host: str, port: int, timeout: float | None = None) -> str:
+async def logon(host: str, port: int, timeout: float | None = None, **kwargs) -> str:
     timeout = TIMEOUT if timeout is None else timeout
-    res = await roundtrip(host, port, {"command": "logon"}, timeout=timeout)
+    res = await roundtrip(host, port, {"command": "logon"}, timeout=timeout, **kwargs)
 
     # when we first logon, we'll receive a token (session_id)
     #   [STATUS][SessionID]
@@ -304,14 +547,33 @@ async def logon(host: str, port: int, timeout: float | None = None) -> str:
 
 @wrapped
 async def logoff(
-    host: str, port: int, sid: str, timeout: float | None = None
+    host: str, port: int, sid: str, timeout: float | None = None, **kwargs
 ) -> dict[str, Any]:
     timeout = TIMEOUT if timeout is None else timeout
     return await roundtrip(
-        host, port, {"command": "logoff", "parameter": sid}, timeout=timeout
+        host, port, {"command": "logoff", "parameter": sid}, timeout=timeout, **kwargs
     )
 
 
+async def _logoff(host: str, port: int, sid: str, timeout: float) -> None:
+    # closes the rexec session, within LOGOFF_TIMEOUT even past the deadline
+    # (not to leave it open): a failure doesn't lose the command reply
+    limit = min(timeout, LOGOFF_TIMEOUT)
+    try:
+        with tracing.span("logoff", host, port):
+            await logoff(
+                host,
+                port,
+                sid,
+                limit,
+                connect_timeout=limit,
+                idle_timeout=limit,
+                deadline=limit,
+            )
+    except Exception as exc:
+        log.warning("cannot logoff from %s:%i: %s", host, port, exc)
+
+
 def parameters_to_list(
     parameters: str | int | float | bool | list[Any] | dict[str, Any] | None = None,
 ) -> list[str]:
@@ -341,7 +603,12 @@ async def rexec(
     timeout: float | None = None,
     retry: int | None = None,
     retry_delay: float | None = None,
-) -> dict[str, Any]:
+    lazy: bool = False,
+    validate: bool = False,
+    connect_timeout: float | None = None,
+    idle_timeout: float | None = None,
+    deadline: float | None = None,
+) -> Any:
     """
     Send a command to a host.
 
@@ -356,9 +623,22 @@ async def rexec(
             to retry the command execution in case of failure.
         retry_delay: Optional. A float representing the delay in seconds
             between each retry attempt.
+        lazy: Optional. Return a :py:class:`luxos.jsonlib.LazyReply`, parsing
+            the reply only when a field is accessed.
+        validate: Optional. Validate the reply and return its payload
+            (eg. ``res["VERSION"][0]`` for the version command), see
+            :py:func:`get_validator`.
+        connect_timeout: Optional. The maximum time in seconds to connect
+            (eg. to fail fast on dead hosts).
+        idle_timeout: Optional. The maximum time in seconds waiting for
+            data from the host.
+        deadline: Optional. The maximum time in seconds for the whole
+            request (logon, command and the retries): the closing logoff
+            can take up to :py:data:`LOGOFF_TIMEOUT` more.
 
     Returns:
-        A dictionary containing the response from the execution of the command.
+        A dictionary containing the response from the execution of the command,
+        or its payload if validate is set.
 
     Raises:
         Any exception that occurs during the execution of the command.
@@ -366,13 +646,134 @@ async def rexec(
     Notes:
         If `timeout`/`retry`/`retry_delay` aren't provided (or None),
         they will default to the module level values
-        (:py:data:`TIMEOUT`, :py:data:`RETRIES`, and :py:data:`RETRIES_DELAY`).
+        (:py:data:`TIMEOUT`, :py:data:`RETRIES`, and :py:data:`RETRIES_DELAY`),
+        the same for `connect_timeout`/`idle_timeout` (defaulting to
+        `timeout`) and `deadline`.
 
         This function will handle logon/logoff automatically.
 
+        With :py:data:`SINGLE_FLIGHT` set, concurrent calls for the same
+        idempotent command (same host, port, cmd, parameters, timeouts,
+        retries and deadline) share a single request, each getting its own
+        copy of the reply.
+
+        With a :py:data:`luxos.cache.CACHE`, the replies to the cacheable
+        commands are reused (see :py:mod:`luxos.cache`), and the commands
+        changing the miner drop its stale replies.
+
     """
+    if validate:
+        res = await rexec(
+            host,
+            port,
+            cmd,
+            parameters,
+            timeout,
+            retry,
+            retry_delay,
+            lazy,
+            connect_timeout=connect_timeout,
+            idle_timeout=idle_timeout,
+            deadline=deadline,
+        )
+        return get_validator(cmd)(res)
 
     parameters = parameters_to_list(parameters)
+    args = (host, port, cmd, parameters, timeout, retry, retry_delay, lazy)
+    limits = (connect_timeout, idle_timeout, deadline)
+
+    replies = cache.CACHE
+    if replies is None:
+        return await _single_flight(args, limits)
+    if not api.is_idempotent(cmd):
+        try:
+            return await _rexec(*args, *limits)
+        finally:
+            # even on failures, the miner might have changed
+            replies.invalidate(host, port, cmd)
+    if not api.cache_ttl(cmd):
+        # never cached (eg. devs, stats): not a miss
+        return await _single_flight(args, limits)
+    if (res := replies.get(host, port, cmd, parameters, lazy)) is not None:
+        return res
+    # fetched lazily, the cache keeps the raw reply
+    generation = replies.generation(host, port)
+    res = await _single_flight((*args[:-1], True), limits)
+    if not isinstance(res, jsonlib.LazyReply):
+        return res
+    replies.put(host, port, cmd, parameters, res, generation)
+    return res if lazy else jsonlib.loads(res.raw)
+
+
+def _unshare(res: Any, lazy: bool) -> Any:
+    # a copy of the shared reply res, for a single caller
+    if isinstance(res, jsonlib.LazyReply):
+        return jsonlib.LazyReply(res.raw) if lazy else jsonlib.loads(res.raw)
+    return copy.deepcopy(res)
+
+
+async def _single_flight(args: tuple[Any, ...], limits: tuple[Any, ...]) -> Any:
+    # _rexec, sharing the in-flight requests for the idempotent commands
+    host, port, cmd, parameters, timeout, retry, retry_delay, lazy = args
+    if not (SINGLE_FLIGHT and api.is_idempotent(cmd)):
+        return await _rexec(*args, *limits)
+
+    # shared only with the same limits (so the flight ends by the caller
+    # deadline), the reply is fetched lazily and decoded by each caller
+    loop = asyncio.get_running_loop()
+    key = (
+        loop,
+        host,
+        port,
+        cmd,
+        tuple(parameters),
+        timeout,
+        retry,
+        retry_delay,
+        *limits,
+    )
+    if (task := _inflight.get(key)) is None:
+        # a task, so cancelling a caller doesn't fail the others
+        _inflight[key] = task = loop.create_task(
+            _rexec(
+                host, port, cmd, parameters, timeout, retry, retry_delay, True, *limits
+            )
+        )
+
+        def done(task: asyncio.Task) -> None:
+            del _inflight[key]
+            if not task.cancelled():
+                task.exception()  # retrieved, even if all the callers are gone
+
+        task.add_done_callback(done)
+    else:
+        log.debug("sharing the in-flight '%s' on %s:%i", cmd, host, port)
+    return _unshare(await asyncio.shield(task), lazy)
+
+
+async def _rexec(
+    host: str,
+    port: int,
+    cmd: str,
+    parameters: list[str],
+    timeout: float | None,
+    retry: int | None,
+    retry_delay: float | None,
+    lazy: bool,
+    connect_timeout: float | None,
+    idle_timeout: float | None,
+    deadline: float | None,
+) -> Any:
+    # rexec, without the validation and the single flight
+    expiry = _expiry(DEADLINE if deadline is None else deadline)
+
+    def limits() -> dict[str, Any]:
+        # the roundtrip limits, with the time left as deadline
+        return {
+            "connect_timeout": connect_timeout,
+            "idle_timeout": idle_timeout,
+            "deadline": _left(expiry),
+        }
 
     timeout = TIMEOUT if timeout is None else timeout
     retry = RETRIES if retry is None else retry
@@ -384,33 +785,44 @@ async def rexec(
         for i in range(retry or 1):
             try:
                 if cmd == "logon":
-                    return {"sid": await logon(host, port, timeout)}
+                    return {"sid": await logon(host, port, timeout, **limits())}
                 else:
-                    return await logoff(host, port, parameters[0])
+                    return await logoff(host, port, parameters[0], **limits())
             except Exception as exc:
                 failure = exc
             if retry and (i < retry) and retry_delay:
-                await asyncio.sleep(retry_delay)
+                await asyncio.sleep(_left(_expiry(retry_delay, expiry)) or 0)
         if isinstance(failure, Exception):
             raise failure
 
+    t0 = time.monotonic()
     failure = None
     sid = ""
     for i in range(retry + 1):
         if not api.logon_required(cmd):
             log.debug("no logon required for command '%s' on %s:%i", cmd, host, port)
             break
+        if _left(expiry) == 0:
+            failure = failure or exceptions.MinerCommandTimeoutError(
+                host, port, "deadline exceeded"
+            )
+            break
         try:
-            sid = await logon(host, port, timeout)
+            with tracing.span("logon", host, port):
+                sid = await logon(host, port, timeout, **limits())
             parameters = [sid, *parameters]
             log.debug("session id requested & obtained for %s:%i (%s)", host, port, sid)
             break
+        except exceptions.MinerResolutionError as exc:
+            failure = exc
+            break
         except Exception as exc:
             failure = exc
         if retry and (i < retry) and retry_delay:
-            await asyncio.sleep(retry_delay)
+            await asyncio.sleep(_left(_expiry(retry_delay, expiry)) or 0)
 
     if isinstance(failure, Exception):
+        log_request(host, port, cmd, t0, retry + 1, failure)
         raise failure
 
     packet = {"command": cmd}
@@ -426,25 +838,132 @@ async def rexec(
 
     failure = None
     for i in range(retry + 1):
+        if _left(expiry) == 0:
+            failure = failure or exceptions.MinerCommandTimeoutError(
+                host, port, "deadline exceeded"
+            )
+            break
         try:
-            ret = await roundtrip(host, port, packet, timeout=timeout)
-            log.debug("received from %s:%s: %s", host, port, str(ret))
+            with tracing.span("command", host, port, cmd=cmd):
+                ret = await roundtrip(
+                    host, port, packet, timeout=timeout, lazy=lazy, **limits()
+                )
+            log.debug("received from %s:%s: %s", host, port, ret)
             if sid:
-                await logoff(host, port, sid)
+                await _logoff(host, port, sid, timeout)
+            log_request(host, port, cmd, t0, i + 1)
             return ret
+        except exceptions.MinerResolutionError as exc:
+            failure = exc
+            break
         except Exception as exc:
             failure = exc
         if retry and (i < retry) and retry_delay:
             log.debug("failed attempt %i (out of %i)", i + 1, retry)
-            await asyncio.sleep(retry_delay)
+            await asyncio.sleep(_left(_expiry(retry_delay, expiry)) or 0)
 
     if sid:
-        await logoff(host, port, sid)
+        await _logoff(host, port, sid, timeout)
     if isinstance(failure, Exception):
+        log_request(host, port, cmd, t0, retry + 1, failure)
         raise failure
     return {}
 
 
+async def stream_items(
+    host: str,
+    port: int,
+    cmd: str,
+    key: str | None = None,
+    parameters: str | int | float | bool | list[Any] | dict[str, Any] | None = None,
+    timeout: float | None = None,
+    connect_timeout: float | None = None,
+    idle_timeout: float | None = None,
+    deadline: float | None = None,
+    chunk: int = 65536,
+) -> AsyncIterator[Any]:
+    """yields the items of the key array in the cmd reply, as they arrive
+
+    Large replies (eg. healthchipget, one item per chip) are aggregated in
+    constant memory, without building the whole reply::
+
+        unhealthy = 0
+        async for chip in stream_items(host, port, "healthchipget"):
+            unhealthy += chip["Healthy"] != "Y"
+
+    Args:
+        host: the host ip or name.
+        port: the port number.
+        cmd: a command not requiring logon (eg. healthchipget, devdetails).
+        key: the reply array (default to the cmd reply_key in api.json).
+        parameters: any additional parameters for the command.
+        timeout, connect_timeout, idle_timeout, deadline: as in :py:func:`rexec`.
+        chunk: the socket read size (bytes).
+
+    Raises:
+        MinerConnectionError: on connection failures (MinerCommandTimeoutError
+            on timeouts), there are no retries as the items are yielded already.
+        MinerMessageReplyError: if the reply is truncated, has an error
+            STATUS or no key array (once all the items are yielded).
+    """
+    info = api.get_command(cmd)
+    key = key or info["reply_key"]
+    if not key:
+        raise ValueError(f"no reply key for command '{cmd}'")
+    if info["logon_required"]:
+        raise ValueError(f"command '{cmd}' requires logon, cannot be streamed")
+
+    timeout = TIMEOUT if timeout is None else timeout
+    connect_timeout = CONNECT_TIMEOUT if connect_timeout is None else connect_timeout
+    idle_timeout = IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+    connect_timeout = timeout if connect_timeout is None else connect_timeout
+    idle_timeout = timeout if idle_timeout is None else idle_timeout
+    expiry = _expiry(DEADLINE if deadline is None else deadline)
+
+    packet = {"command": cmd}
+    if parameters := parameters_to_list(parameters):
+        packet["parameter"] = ",".join(parameters)
+
+    stream = jsonlib.ArrayStream(key)
+    try:
+        conn = await _connect(host, port, _expiry(connect_timeout, expiry))
+    except asyncio.TimeoutError as exc:
+        raise exceptions.MinerCommandTimeoutError(host, port) from exc
+    except OSError as exc:
+        raise exceptions.MinerConnectionError(host, port) from exc
+    try:
+        with tracing.span("command", host, port, cmd=cmd):
+            conn.writer.write(json.dumps(packet).encode())
+            await conn.writer.drain()
+            while True:
+                data = await asyncio.wait_for(
+                    conn.reader.read(chunk), _left(_expiry(idle_timeout, expiry))
+                )
+                if (null_index := data.find(b"\x00")) >= 0:
+                    data = data[:null_index]
+                for item in stream.feed(data):
+                    yield item
+                if not data or null_index >= 0:
+                    break
+    except asyncio.TimeoutError as exc:
+        raise exceptions.MinerCommandTimeoutError(host, port) from exc
+    except OSError as exc:
+        raise exceptions.MinerConnectionError(host, port) from exc
+    finally:
+        conn.close()
+
+    try:
+        res = stream.close()
+    except ValueError as exc:
+        raise exceptions.MinerMessageMalformedError(str(exc)) from exc
+    if (status := res.get("STATUS", [{}])[0].get("STATUS")) != "S":
+        raise exceptions.MinerMessageError(
+            f"wrong status '{status}' in message (expected S)", res
+        )
+    if not stream.found and info["minfields"]:
+        raise exceptions.MinerMessageInvalidError(f"missing {key} from message", res)
+
+
 @contextlib.asynccontextmanager
 async def with_atm(host, port, enabled: bool, timeout: float | None = None):
     res = await rexec(host, port, "atm", timeout=timeout)
@@ -455,3 +974,7 @@ async def with_atm(host, port, enabled: bool, timeout: float | None = None):
     # TODO
     yield current
     await rexec(host, port, "atmset", {"enabled": current}, timeout=timeout)
+
+
+# typed helpers, eg. asyncops.commands.devs(host, port)
+from . import commands  # noqa: E402, F401
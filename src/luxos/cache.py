@@ -0,0 +1,239 @@
+"""time to live cache for the miners replies
+
+Replies to rarely changing commands (eg. version, config, devdetails or
+profiles) are reused for their api.json cache_ttl seconds, instead of
+being fetched again from every miner. The cache is bounded (the least
+recently used replies are dropped first) and can be kept in a file, to
+be reused by the next runs.
+
+Commands changing a miner drop its cached replies made stale (the
+api.json invalidates list, eg. profileset drops profiles and config, all
+of them if not listed).
+
+Example::
+
+    from luxos import asyncops, cache
+
+    cache.CACHE = cache.ReplyCache(path="replies.json")
+    cache.CACHE.load()
+    await asyncops.rexec(host, port, "version")  # from the miner
+    await asyncops.rexec(host, port, "version")  # cached
+    cache.CACHE.save()
+
+Note:
+    the replies are kept as the raw bytes, and decoded on each hit: the
+    callers can modify them.
+"""
+
+from __future__ import annotations
+
+import collections
+import contextlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Iterator, Sequence
+
+from . import api, jsonlib
+
+log = logging.getLogger(__name__)
+
+#: the reply cache used by asyncops.rexec (None: no caching)
+CACHE: ReplyCache | None = None
+
+#: default max number of cached replies
+MAXSIZE = 10_000
+
+# (host, port, cmd, parameters)
+Key = tuple[str, int, str, tuple[str, ...]]
+
+
+def _raw(reply: bytes | jsonlib.LazyReply | dict[str, Any]) -> bytes:
+    if isinstance(reply, jsonlib.LazyReply):
+        return reply.raw
+    if isinstance(reply, (bytes, bytearray)):
+        return bytes(reply)
+    return json.dumps(reply).encode()
+
+
+class ReplyCache:
+    """a LRU cache of the miners replies, each expiring after the cmd ttl
+
+    The expiry times are wall clock times, so they hold across runs.
+    """
+
+    def __init__(self, maxsize: int = MAXSIZE, path: Path | str | None = None):
+        self.maxsize = maxsize
+        self.path = Path(path) if path else None
+        # key -> (expiry, the raw reply)
+        self.entries: collections.OrderedDict[Key, tuple[float, bytes]] = (
+            collections.OrderedDict()
+        )
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # (host, port) -> number of invalidations, to discard the replies
+        # received after a concurrent write
+        self._generations: dict[tuple[str, int], int] = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(
+        self,
+        host: str,
+        port: int,
+        cmd: str,
+        parameters: Sequence[str] = (),
+        lazy: bool = False,
+    ) -> Any | None:
+        """a new copy of the cached reply to cmd (None if missing or expired)
+
+        The reply is a :py:class:`luxos.jsonlib.LazyReply` if lazy is set.
+        """
+        key = (host, port, cmd, tuple(parameters))
+        if (item := self.entries.get(key)) is None:
+            self.misses += 1
+            return None
+        expiry, raw = item
+        if expiry < time.time():
+            del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return jsonlib.LazyReply(raw) if lazy else jsonlib.loads(raw)
+
+    def generation(self, host: str, port: int) -> int:
+        """the host:port invalidations counter (see put)"""
+        return self._generations.get((host, port), 0)
+
+    def put(
+        self,
+        host: str,
+        port: int,
+        cmd: str,
+        parameters: Sequence[str],
+        reply: bytes | jsonlib.LazyReply | dict[str, Any],
+        generation: int | None = None,
+    ) -> bool:
+        """caches the reply to cmd for its api.json cache_ttl
+
+        Replies to not cacheable commands, error replies and replies
+        requested before the last invalidation of host:port (generation
+        is the value at request time) are not cached.
+
+        Returns:
+            True if the reply is cached
+        """
+        if not (ttl := api.cache_ttl(cmd)):
+            return False
+        raw = _raw(reply)
+        if jsonlib.LazyReply(raw).status != "S":
+            return False
+        if generation is not None and generation != self.generation(host, port):
+            return False
+        key = (host, port, cmd, tuple(parameters))
+        self.entries[key] = (time.time() + ttl, raw)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return True
+
+    def invalidate(self, host: str, port: int, cmd: str | None = None) -> int:
+        """drops the host:port replies made stale by cmd (all if None)
+
+        Returns:
+            the number of dropped replies
+        """
+        names = None if cmd is None else api.invalidates(cmd)
+        if names is not None and not names:
+            return 0
+        self._generations[(host, port)] = self.generation(host, port) + 1
+        stale = [
+            key
+            for key in self.entries
+            if key[:2] == (host, port) and (names is None or key[2] in names)
+        ]
+        for key in stale:
+            del self.entries[key]
+        self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.hits = self.misses = self.invalidations = 0
+
+    def load(self) -> int:
+        """loads the (not expired) replies from path, if it exists
+
+        Returns:
+            the number of loaded replies
+        """
+        if not (self.path and self.path.exists()):
+            return 0
+        now = time.time()
+        try:
+            items = [
+                ((host, port, cmd, tuple(parameters)), (expiry, raw.encode("latin-1")))
+                for host, port, cmd, parameters, expiry, raw in json.loads(
+                    self.path.read_bytes()
+                )
+                if expiry >= now
+            ]
+        except (OSError, ValueError, TypeError, AttributeError) as exc:
+            log.warning("cannot load the replies cache %s: %s", self.path, exc)
+            return 0
+        self.entries.update(items)
+        count = len(items)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return count
+
+    def save(self) -> None:
+        """writes the (not expired) replies to path (atomically)
+
+        Failures are logged, and leave the previous file in place.
+        """
+        if not self.path:
+            return
+        now = time.time()
+        # latin-1 maps every byte (the replies are not always valid utf-8)
+        items = [
+            [*key[:3], list(key[3]), expiry, raw.decode("latin-1")]
+            for key, (expiry, raw) in self.entries.items()
+            if expiry >= now
+        ]
+        tmp = self.path.with_name(f".{self.path.name}.tmp")
+        try:
+            tmp.write_text(json.dumps(items))
+            os.replace(tmp, self.path)
+        except OSError as exc:
+            log.warning("cannot save the replies cache %s: %s", self.path, exc)
+            tmp.unlink(missing_ok=True)
+
+    def report(self) -> list[str]:
+        total = self.hits + self.misses
+        return [
+            f"replies cache: {self.hits} hits, {self.misses} misses "
+            f"({(self.hits / total if total else 0):.0%} hit rate), "
+            f"{self.invalidations} invalidated, {len(self.entries)} cached"
+        ]
+
+
+@contextlib.contextmanager
+def reply_cache(path: Path | str | None = None) -> Iterator[ReplyCache]:
+    """reuses the replies (as CACHE, kept in path), logging the hits/misses on exit"""
+    global CACHE
+    replies = ReplyCache(path=path)
+    if count := replies.load():
+        log.debug("loaded %i cached replies from %s", count, path)
+    previous, CACHE = CACHE, replies
+    try:
+        yield replies
+    finally:
+        CACHE = previous
+        replies.save()
+        log.info("\n".join(replies.report()))
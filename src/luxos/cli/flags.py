@@ -21,9 +21,13 @@ from __future__ import annotations
 import argparse
 import contextlib
 import datetime
+import itertools
 import logging
 from pathlib import Path
-from typing import Any, Sequence
+from typing import TYPE_CHECKING, Any, Iterator
+
+if TYPE_CHECKING:
+    from luxos.ips import AddressSet
 
 from .shared import ArgumentTypeBase, LuxosParserBase
 
@@ -67,7 +71,7 @@ class type_ipaddress(ArgumentTypeBase):
             raise argparse.ArgumentTypeError(f"failed to parse {txt=}: {exc.args[0]}")
 
 
-def type_range(txt: str) -> Sequence[tuple[str, int | None]]:
+def type_range(txt: str) -> AddressSet | Iterator[tuple[str, int | None]]:
     """
     Validate a range of ip addresses.
 
@@ -75,7 +79,8 @@ def type_range(txt: str) -> Sequence[tuple[str, int | None]]:
         argparse.ArgumentTypeError: on an invalid input.
 
     Returns:
-        Sequence[tuple[str, int | None]]
+        AddressSet (the ranges are not expanded), or a lazy iterator
+        of (host, port) for **@-**
 
     Example:
         file.py::
@@ -95,14 +100,14 @@ def type_range(txt: str) -> Sequence[tuple[str, int | None]]:
 
             file.py -x 127.0.0.1:9999:127.0.0.3
 
-        Alternatively you can pass a **@filename** to read data from a csv file
+        Alternatively you can pass a **@filename** to read data from a yaml/csv
+        file (see luxos.ips.load_ips), or **@-** to stream them (csv) from stdin.
     """
-    from luxos.ips import (
-        DataParsingError,
-        iter_ip_ranges,
-        load_ips_from_csv,
-        load_ips_from_yaml,
-    )
+    from luxos.ips import AddressSet, iter_ips_from_csv, load_ips
+
+    if txt == "@-":
+        # read lazily, while the miners are processed
+        return iter_ips_from_csv("-", None)
 
     path = None
     if txt.startswith("@") and not (path := Path(txt[1:])).exists():
@@ -110,14 +115,11 @@ def type_range(txt: str) -> Sequence[tuple[str, int | None]]:
     if Path(txt).exists():
         path = Path(txt)
 
-    if path:
-        with contextlib.suppress(RuntimeError, DataParsingError):
-            return load_ips_from_yaml(path, None)
-
     try:
         if path:
-            return load_ips_from_csv(path, None)
-        return list(iter_ip_ranges(txt))
+            # yaml or csv, compiled in a cache for the next runs
+            return AddressSet(load_ips(path, None))
+        return AddressSet.from_expr(txt)
     except RuntimeError as exc:
         raise argparse.ArgumentTypeError(f"conversion failed '{txt}': {exc.args[0]}")
     except Exception as exc:
@@ -219,6 +221,9 @@ def add_arguments_rexec(parser: LuxosParserBase):
         return args
     """
     from ..asyncops import RETRIES, RETRIES_DELAY, TIMEOUT
+    from ..jsonlib import PREFERENCE
+    from ..net import PROFILES
+    from ..resolver import TTL
 
     group = parser.add_argument_group(
         "Remote execution", "rexec remote execution limits/timeouts"
@@ -226,6 +231,21 @@ def add_arguments_rexec(parser: LuxosParserBase):
     group.add_argument(
         "--timeout", type=float, default=TIMEOUT, help="Timeout for each command"
     )
+    group.add_argument(
+        "--connect-timeout",
+        type=float,
+        help="Timeout to connect to a miner (default: --timeout)",
+    )
+    group.add_argument(
+        "--idle-timeout",
+        type=float,
+        help="Timeout waiting for the miner data (default: --timeout)",
+    )
+    group.add_argument(
+        "--deadline",
+        type=float,
+        help="Time limit for each command, retries included (default: no limit)",
+    )
     group.add_argument(
         "--retries",
         type=int,
@@ -238,13 +258,88 @@ def add_arguments_rexec(parser: LuxosParserBase):
         default=RETRIES_DELAY,
         help="Delay in s between retries",
     )
+    group.add_argument(
+        "--json-backend",
+        choices=["auto", *PREFERENCE],
+        default="auto",
+        help="json library used to decode replies",
+    )
+    group.add_argument(
+        "--log-requests",
+        type=int,
+        default=0,
+        metavar="N",
+        help="log (on luxos.requests) one request every N",
+    )
+    group.add_argument(
+        "--log-failures",
+        action="store_true",
+        help="log (on luxos.requests) every failed request",
+    )
+    group.add_argument(
+        "--dns-ttl",
+        type=float,
+        default=TTL,
+        metavar="SECONDS",
+        help="for how long the miners hostnames resolutions are reused",
+    )
+    group.add_argument(
+        "--source",
+        action="append",
+        dest="sources",
+        metavar="ADDRESS[%%IFACE]",
+        help="local source address (or %%interface) for the connections, "
+        "repeat it to rotate over many",
+    )
+    group.add_argument(
+        "--keep-alive",
+        action="store_true",
+        help="reuse the connections to the miners keeping them open",
+    )
+    group.add_argument(
+        "--reply-cache",
+        nargs="?",
+        const="",
+        metavar="PATH",
+        help="reuse the replies to the rarely changing commands (eg. version), "
+        "kept in PATH across the runs",
+    )
+    group.add_argument(
+        "--single-flight",
+        action="store_true",
+        help="share the in-flight requests of the concurrent identical "
+        "read-only commands",
+    )
+    group.add_argument(
+        "--socket-profile",
+        choices=list(PROFILES),
+        default="default",
+        help="socket options for the connections (eg. sweep avoids TIME_WAIT)",
+    )
 
     def callback(args: argparse.Namespace):
-        from .. import asyncops, syncops
+        from .. import asyncops, jsonlib, net, resolver, syncops
 
         asyncops.TIMEOUT = syncops.TIMEOUT = args.timeout
+        asyncops.CONNECT_TIMEOUT = syncops.CONNECT_TIMEOUT = args.connect_timeout
+        asyncops.IDLE_TIMEOUT = syncops.IDLE_TIMEOUT = args.idle_timeout
+        asyncops.DEADLINE = syncops.DEADLINE = args.deadline
         asyncops.RETRIES = syncops.RETRIES = args.retries
         asyncops.RETRIES_DELAY = syncops.RETRIES_DELAY = args.retries_delay
+        asyncops.REQUESTS_LOG_SAMPLE = max(args.log_requests, 0)
+        asyncops.REQUESTS_LOG_FAILURES = args.log_failures
+        asyncops.SINGLE_FLIGHT = args.single_flight
+        resolver.TTL = args.dns_ttl
+        net.PROFILE = net.PROFILES[args.socket_profile]
+        if args.sources:
+            try:
+                net.SOURCES = net.SourcePool(args.sources)
+            except ValueError as exc:
+                args.error(str(exc))
+        try:
+            jsonlib.set_backend(args.json_backend)
+        except ModuleNotFoundError:
+            args.error(f"json backend '{args.json_backend}' is not installed")
 
     parser.callbacks.append(callback)
 
@@ -314,6 +409,38 @@ def add_arguments_logging(parser: LuxosParserBase):
     parser.callbacks.append(callback)
 
 
+def add_arguments_diagnostics(parser: LuxosParserBase):
+    """adds the run time diagnostics flags (handled in cli.v1.setup)"""
+    group = parser.add_argument_group("Diagnostics", "run time diagnostics")
+    group.add_argument(
+        "--loop-monitor",
+        nargs="?",
+        type=float,
+        const=0.1,
+        metavar="S",
+        help="report the event loop lag and the calls blocking it for more than S",
+    )
+    group.add_argument(
+        "--profile",
+        nargs="?",
+        type=Path,
+        const=Path(f"{Path(parser.prog).stem}.pstats"),
+        metavar="FILE",
+        help="save a cProfile dump of the run",
+    )
+    group.add_argument(
+        "--trace-out",
+        type=Path,
+        metavar="FILE",
+        help="save the miners phases timeline as chrome trace events (json)",
+    )
+    group.add_argument(
+        "--memory-report",
+        action="store_true",
+        help="report the peak memory and the top allocation sites by phase",
+    )
+
+
 def add_arguments_database(parser: LuxosParserBase):
     """
     takes a string on a command line and retunr a sa engine.
@@ -366,7 +493,7 @@ def add_arguments_new_miners_ips(parser: LuxosParserBase):
         "--range",
         action="append",
         dest="addresses",
-        help="IPs range or @file",
+        help="IPs range (eg. 10.1.0.0/16,!10.1.255.0/24), @file or @- (stdin)",
         type=type_range,
     )
     group.add_argument(
@@ -374,15 +501,25 @@ def add_arguments_new_miners_ips(parser: LuxosParserBase):
     )
 
     def callback(args: argparse.Namespace):
-        addresses = []
-        if args.addresses:
-            addresses.extend(
-                [
-                    (host, port or args.port)
-                    for group in args.addresses
-                    for host, port in group
-                ]
+        from luxos.ips import AddressSet
+
+        # overlapping ranges are merged, so no miner is polled twice
+        addresses = AddressSet()
+        streams = []
+        for group in args.addresses or []:
+            if isinstance(group, AddressSet):
+                addresses.update(group)
+            else:
+                streams.append(group)
+        args.addresses = addresses.with_port(args.port)
+        if streams:
+            # the @- streams are consumed lazily (and not de-duplicated)
+            args.addresses = itertools.chain(
+                args.addresses,
+                *(
+                    ((host, args.port if port is None else port) for host, port in s)
+                    for s in streams
+                ),
             )
-        args.addresses = addresses
 
     parser.callbacks.append(callback)
@@ -0,0 +1,318 @@
+"""run time monitors for the cli scripts
+
+These are enabled from the command line (see flags.add_arguments_diagnostics)
+and report at the end of the run, after the "task completed" line.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import cProfile
+import dataclasses as dc
+import heapq
+import itertools
+import logging
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+from pathlib import Path
+from typing import ContextManager
+
+from .. import tracing
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None  # type: ignore
+
+log = logging.getLogger(__name__)
+
+#: the active memory report (see memory_report)
+MEMORY: MemoryReport | None = None
+
+
+class LoopMonitor:
+    """measures the event loop lag and catches the blocking calls
+
+    A heartbeat task sleeps for interval seconds, the extra time it takes to
+    wake up is the loop lag. A watchdog thread samples the loop thread stack
+    when the heartbeat is late by more than threshold seconds: that is the
+    code blocking the loop (eg. a big json decode or a file write).
+
+    Example::
+
+        monitor = LoopMonitor(threshold=0.1)
+        monitor.start()
+        ...
+        monitor.stop()
+        print("\\n".join(monitor.report()))
+    """
+
+    def __init__(self, threshold: float = 0.1, interval: float = 0.01, maxitems=5):
+        self.threshold = threshold
+        self.interval = interval
+        self.maxitems = maxitems
+
+        self.samples = 0
+        self.total = 0.0
+        self.maxlag = 0.0
+        # the slowest blocking calls, as (lag, n, stack) min-heap
+        self.slowest: list[tuple[float, int, traceback.StackSummary]] = []
+
+        self._counter = itertools.count()
+        self._beat = 0.0
+        self._pending: tuple[float, traceback.StackSummary] | None = None
+        self._thread_id: int | None = None
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        """starts monitoring the running loop"""
+        loop = asyncio.get_running_loop()
+        self._thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = loop.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(
+            target=self._watch, name="luxos-loop-monitor", daemon=True
+        )
+        self._watchdog.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+        if self._watchdog:
+            self._watchdog.join()
+        # the loop might be still blocked since the last heartbeat
+        if self._pending:
+            self._record(self._beat)
+
+    async def _heartbeat(self):
+        while True:
+            self._beat = t0 = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self._record(t0)
+
+    def _record(self, t0: float) -> None:
+        lag = max(time.monotonic() - t0 - self.interval, 0.0)
+
+        self.samples += 1
+        self.total += lag
+        self.maxlag = max(self.maxlag, lag)
+
+        pending, self._pending = self._pending, None
+        if not pending or pending[0] != t0:
+            return
+        item = (lag, next(self._counter), pending[1])
+        if len(self.slowest) < self.maxitems:
+            heapq.heappush(self.slowest, item)
+        else:
+            heapq.heappushpop(self.slowest, item)
+
+    def _watch(self):
+        captured = None
+        while not self._stopped.wait(self.interval):
+            beat = self._beat
+            if beat == captured or (time.monotonic() - beat) < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            captured = beat
+            self._pending = (beat, traceback.extract_stack(frame))
+            del frame
+
+    def report(self, depth: int = 5) -> list[str]:
+        """the lag statistics followed by the slowest blocking calls"""
+        mean = (self.total / self.samples) if self.samples else 0.0
+        lines = [
+            f"loop lag: max {self.maxlag:.3f}s, mean {mean * 1000:.1f}ms "
+            f"({self.samples} samples)"
+        ]
+        for lag, _, stack in sorted(self.slowest, reverse=True):
+            lines.append(f"loop blocked for {lag:.3f}s in:")
+            lines.extend(
+                line.rstrip("\n")
+                for line in traceback.StackSummary.from_list(stack[-depth:]).format()
+            )
+        return lines
+
+
+@contextlib.contextmanager
+def loop_monitor(threshold: float = 0.1):
+    """monitors the running loop and logs a report on exit"""
+    try:
+        monitor = LoopMonitor(threshold=threshold)
+        monitor.start()
+    except RuntimeError:
+        log.warning("no running event loop, ignoring --loop-monitor")
+        yield None
+        return
+
+    try:
+        yield monitor
+    finally:
+        monitor.stop()
+        log.info("\n".join(monitor.report()))
+
+
+@contextlib.contextmanager
+def profile(path: Path):
+    """profiles the run, saving the pstats dump in path on exit"""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        log.info("profile saved in %s (python -m pstats %s)", path, path)
+
+
+@contextlib.contextmanager
+def trace(path: Path):
+    """records the miners phases, saving the chrome trace in path on exit"""
+    tracer = tracing.Tracer()
+    previous, tracing.TRACER = tracing.TRACER, tracer
+    try:
+        yield tracer
+    finally:
+        tracing.TRACER = previous
+        tracer.dump(path)
+        log.info("trace saved in %s (%i events)", path, len(tracer.events))
+
+
+def peak_rss() -> int | None:
+    """the process peak resident memory in bytes (None if not available)"""
+    if resource is None:
+        return None
+    value = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kB, macos bytes
+    return value if sys.platform == "darwin" else value * 1024
+
+
+def fmtsize(value: float) -> str:
+    for unit in ["B", "kB", "MB"]:
+        if abs(value) < 1024:
+            return f"{value:.1f}{unit}"
+        value /= 1024
+    return f"{value:.1f}GB"
+
+
+@dc.dataclass
+class Phase:
+    name: str
+    #: traced memory allocated (and not freed) during the phase
+    delta: int
+    #: traced memory peak during the phase
+    peak: int
+    #: process peak rss at the end of the phase
+    rss: int | None
+    #: number of items processed in the phase (eg. miners)
+    items: int
+    sites: list[tracemalloc.StatisticDiff]
+
+
+class MemoryReport:
+    """tracks the memory allocations broken down by phases
+
+    Example::
+
+        report = MemoryReport()
+        report.start()
+        with report.phase("launch", items=len(addresses)):
+            ...
+        report.stop()
+        print("\n".join(report.report()))
+    """
+
+    FILTERS = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ]
+
+    def __init__(self, top: int = 3):
+        self.top = top
+        self.phases: list[Phase] = []
+        self._snapshot: tracemalloc.Snapshot | None = None
+
+    def start(self) -> None:
+        tracemalloc.start()
+        self._snapshot = self.snapshot()
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+
+    def snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(self.FILTERS)
+
+    @contextlib.contextmanager
+    def phase(self, name: str, items: int = 0):
+        """records the allocations during the name phase"""
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = self.snapshot()
+            sites = []
+            if self._snapshot:
+                sites = snapshot.compare_to(self._snapshot, "lineno")[: self.top]
+            self._snapshot = snapshot
+            self.phases.append(
+                Phase(name, current - before, peak, peak_rss(), items, sites)
+            )
+
+    def report(self) -> list[str]:
+        """the peaks followed by the phases and their top allocation sites"""
+        rss = peak_rss()
+        lines = [
+            f"memory: peak rss {'n/a' if rss is None else fmtsize(rss)}, "
+            f"traced peak {fmtsize(max((p.peak for p in self.phases), default=0))}"
+        ]
+        for phase in self.phases:
+            line = (
+                f"  {phase.name:<10} {fmtsize(phase.delta):>9} "
+                f"(peak {fmtsize(phase.peak)})"
+            )
+            if phase.items:
+                line += f", {fmtsize(phase.delta / phase.items)} per item"
+            lines.append(line)
+            for site in phase.sites:
+                frame = site.traceback[0]
+                lines.append(
+                    f"    {frame.filename}:{frame.lineno}: "
+                    f"{fmtsize(site.size_diff)} ({site.count_diff:+} blocks)"
+                )
+        return lines
+
+
+def phase(name: str, items: int = 0) -> ContextManager[None]:
+    """marks the name phase for the active memory report (if any)"""
+    if MEMORY is None:
+        return contextlib.nullcontext()
+    return MEMORY.phase(name, items)
+
+
+@contextlib.contextmanager
+def memory_report(top: int = 3):
+    """tracks the memory in phases, logging a report on exit"""
+    global MEMORY
+
+    report = MemoryReport(top=top)
+    previous, MEMORY = MEMORY, report
+    report.start()
+    try:
+        yield report
+    finally:
+        report.stop()
+        MEMORY = previous
+        log.info("\n".join(report.report()))
@@ -6,6 +6,9 @@ interface.
 A simple v1 script will always have:
 * `-v/--verbose | -q/--quiet` flags to increase the logging verbosity level
 * `-c/--config` to pass a config file (default to config.yaml)
+* `--loop-monitor` to report the event loop lag and the blocking calls
+* `--profile` and `--trace-out` to save a cProfile dump and a miners timeline
+* `--memory-report` to report the peak memory and the top allocation sites
 
 A `sample.py` script with default sensible and consistent interface:
 
@@ -55,6 +58,14 @@ LOGGING_CONFIG = {
 
 The `LOGGING_CONFIG` is a dictionary feed into `logging.basicConfig(**LOGGING_CONFIG)`.
 
+`LOGGING_QUEUE` controls where the log records are formatted and written out:
+if True the handlers are moved on a background thread (fed through a queue),
+so a slow terminal or disk won't stall the event loop. The default (None)
+enables it only for async entry points:
+```
+LOGGING_QUEUE = False
+```
+
 #### add and process new extra arguments
 
 in the `sample.py` file:
@@ -95,13 +106,15 @@ import contextlib
 import functools
 import inspect
 import logging.handlers
+import queue
 import sys
 import time
 import types
 from pathlib import Path
 from typing import Any, Callable
 
-from . import flags
+from .. import cache, net
+from . import flags, monitors
 from .shared import ArgumentTypeBase, LuxosParserBase
 
 
@@ -119,6 +132,7 @@ LOGGING_CONFIG = {
     ],
 }
 CONFIGPATH = Path("config.yaml")
+LOGGING_QUEUE: bool | None = None
 
 
 log = logging.getLogger(__name__)
@@ -143,6 +157,38 @@ def log_sys_info(modules=None):
     log.debug("interpreter: %s", sys.executable)
 
 
+class QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # the stdlib formats the message here (on the caller thread) to make
+        # the record picklable: we're in-process, the listener formats it
+        return record
+
+
+@contextlib.contextmanager
+def queue_logging(logger: logging.Logger | None = None):
+    """moves the logger (default root) handlers on a background thread
+
+    The handlers are restored (and the pending records flushed) on exit.
+    """
+    logger = logger or logging.getLogger()
+    handlers = logger.handlers[:]
+    if not handlers:
+        yield None
+        return
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        records, *handlers, respect_handler_level=True
+    )
+    logger.handlers = [QueueHandler(records)]
+    listener.start()
+    try:
+        yield listener
+    finally:
+        listener.stop()
+        logger.handlers = handlers
+
+
 ArgumentParser = LuxosParserBase
 
 
@@ -155,12 +201,33 @@ class LuxosParser(LuxosParserBase):
         # we're adding the -v|-q flags, to control the logging level
         flags.add_arguments_logging(self)
 
+        # and the run time diagnostics flags
+        flags.add_arguments_diagnostics(self)
+
+        # --keep-alive and --reply-cache (see flags.add_arguments_rexec)
+        self.set_defaults(keep_alive=False, reply_cache=None)
+
         # and a --version flag
         self.add_argument("--version", action="version", version=get_version(modules))
 
     def error(self, message: str):
         raise AbortWrongArgumentError(message)
 
+    def memory_report(self, args=None) -> bool:
+        """True if --memory-report is passed (looked up before parse_args)"""
+        parser = argparse.ArgumentParser(
+            prefix_chars=self.prefix_chars,
+            allow_abbrev=self.allow_abbrev,
+            add_help=False,
+            exit_on_error=False,
+        )
+        parser.add_argument("--memory-report", action="store_true")
+        try:
+            return parser.parse_known_args(args)[0].memory_report
+        except argparse.ArgumentError:
+            # reported by parse_args
+            return False
+
     def parse_args(self, args=None, namespace=None):
         options = super().parse_args(args, namespace)
 
@@ -241,13 +308,40 @@ def setup(
     if "parser" in sig.parameters:
         kwargs["parser"] = parser
 
+    # LOGGING_QUEUE, from the module then from luxos.cli.v*
+    use_queue = None
+    for mod in reversed(modules):
+        if getattr(mod, "LOGGING_QUEUE", None) is not None:
+            use_queue = mod.LOGGING_QUEUE
+            break
+    if use_queue is None:
+        use_queue = inspect.iscoroutinefunction(function)
+
     t0 = time.monotonic()
     success = "completed"
     errormsg = ""
     show_timing = True
+    stack = contextlib.ExitStack()
     try:
         if "parser" not in sig.parameters:
-            args = parser.parse_args()
+            # the arguments (eg. the miners addresses) are accounted too
+            if parser.memory_report():
+                stack.enter_context(monitors.memory_report())
+            with monitors.phase("arguments"):
+                args = parser.parse_args()
+            # logging is configured in parse_args
+            if use_queue:
+                stack.enter_context(queue_logging())
+            if args.loop_monitor is not None:
+                stack.enter_context(monitors.loop_monitor(args.loop_monitor))
+            if args.trace_out:
+                stack.enter_context(monitors.trace(args.trace_out))
+            if args.profile:
+                stack.enter_context(monitors.profile(args.profile))
+            if args.keep_alive:
+                stack.enter_context(net.keep_alive())
+            if args.reply_cache is not None:
+                stack.enter_context(cache.reply_cache(args.reply_cache or None))
             if process_args:
                 args = process_args(args) or args
 
@@ -274,6 +368,7 @@ def setup(
         if show_timing:
             delta = round(time.monotonic() - t0, 2)
             log.info("task %s in %.2fs", success, delta)
+        stack.close()
     if errormsg:
         parser.error(errormsg)
 
@@ -0,0 +1,416 @@
+"""typed replies for the most common commands
+
+Miners reply with deeply nested dictionaries, where usually only a handful
+of fields are of any interest: these helpers run a command and decode the
+reply into small ``__slots__`` based structures, holding only those fields.
+
+Example::
+
+    from luxos import asyncops
+
+    for board in await asyncops.commands.devs(host, port):
+        print(board.asc, board.status, board.mhs_5m)
+
+    version = await asyncops.commands.version(host, port)
+    print(version.luxminer)
+
+Note:
+    the decoders can be used on already available replies too, eg.
+    ``commands.decode("devs", res)``.
+
+Note:
+    the raw replies (bytes or a :py:class:`luxos.jsonlib.LazyReply`) are
+    decoded with `msgspec <https://jcristharif.com/msgspec>`_ if installed,
+    straight into msgspec twins of the structs (same fields, properties and
+    equality, and instances of the struct class): the other fields are
+    skipped, and the reply dictionaries never built. Without msgspec, and
+    for the already decoded replies, the fields are copied out of the whole
+    reply.
+"""
+
+from __future__ import annotations
+
+import functools
+from typing import Any, Callable, ClassVar, Sequence, TypeVar
+
+from . import api, asyncops, exceptions, jsonlib
+
+T = TypeVar("T", bound="Struct")
+
+# the msgspec types decoding the raw replies -> the struct they stand for
+_TWINS: dict[type, type[Struct]] = {}
+
+
+class _StructType(type):
+    # the msgspec twins of a struct (see _raw_decoder) are its instances too
+    def __instancecheck__(cls, obj: Any) -> bool:
+        if super().__instancecheck__(obj):
+            return True
+        struct = _TWINS.get(type(obj))
+        return struct is not None and issubclass(struct, cls)
+
+
+class Struct(metaclass=_StructType):
+    """base class for the typed replies
+
+    Subclasses define in FIELDS the mapping between each attribute and the
+    (reply key, default value) pair, and set ``__slots__ = tuple(FIELDS)``.
+    """
+
+    __slots__: ClassVar[tuple[str, ...]] = ()
+    FIELDS: ClassVar[dict[str, tuple[str, Any]]] = {}
+
+    def __init__(self, **kwargs):
+        for attr, (_, default) in self.FIELDS.items():
+            setattr(self, attr, kwargs.pop(attr, default))
+        if kwargs:
+            raise TypeError(f"unknown fields {', '.join(kwargs)}")
+
+    @classmethod
+    def from_dict(cls: type[T], data: dict[str, Any]) -> T:
+        obj = cls.__new__(cls)
+        for attr, (key, default) in cls.FIELDS.items():
+            setattr(obj, attr, data.get(key, default))
+        return obj
+
+    @classmethod
+    def from_list(cls: type[T], data: Sequence[dict[str, Any]] | None) -> list[T]:
+        return [cls.from_dict(item) for item in data or []]
+
+    def asdict(self) -> dict[str, Any]:
+        return {attr: getattr(self, attr) for attr in self.FIELDS}
+
+    def __eq__(self, other):
+        if not isinstance(other, self.__class__):
+            return NotImplemented
+        return self.asdict() == other.asdict()
+
+    def __repr__(self):
+        args = ", ".join(f"{k}={v!r}" for k, v in self.asdict().items())
+        return f"{self.__class__.__name__}({args})"
+
+
+class Board(Struct):
+    """an item in the devs reply"""
+
+    asc: int | None
+    enabled: str
+    status: str
+    profile: str
+    temperature: float
+    elapsed: int
+    mhs_5s: float
+    mhs_1m: float
+    mhs_5m: float
+    mhs_15m: float
+    mhs_av: float
+    accepted: int
+    rejected: int
+    hardware_errors: int
+
+    FIELDS = {
+        "asc": ("ASC", None),
+        "enabled": ("Enabled", ""),
+        "status": ("Status", ""),
+        "profile": ("Profile", ""),
+        "temperature": ("Temperature", 0.0),
+        "elapsed": ("Device Elapsed", 0),
+        "mhs_5s": ("MHS 5s", 0.0),
+        "mhs_1m": ("MHS 1m", 0.0),
+        "mhs_5m": ("MHS 5m", 0.0),
+        "mhs_15m": ("MHS 15m", 0.0),
+        "mhs_av": ("MHS av", 0.0),
+        "accepted": ("Accepted", 0),
+        "rejected": ("Rejected", 0),
+        "hardware_errors": ("Hardware Errors", 0),
+    }
+    __slots__ = tuple(FIELDS)
+
+    @property
+    def alive(self) -> bool:
+        return self.status == "Alive"
+
+
+class Summary(Struct):
+    """the summary reply"""
+
+    elapsed: int
+    mhs_5s: float
+    mhs_1m: float
+    mhs_5m: float
+    mhs_15m: float
+    mhs_av: float
+    accepted: int
+    rejected: int
+    stale: int
+    hardware_errors: int
+    best_share: int
+
+    FIELDS = {
+        "elapsed": ("Elapsed", 0),
+        "mhs_5s": ("MHS 5s", 0.0),
+        "mhs_1m": ("MHS 1m", 0.0),
+        "mhs_5m": ("MHS 5m", 0.0),
+        "mhs_15m": ("MHS 15m", 0.0),
+        "mhs_av": ("MHS av", 0.0),
+        "accepted": ("Accepted", 0),
+        "rejected": ("Rejected", 0),
+        "stale": ("Stale", 0),
+        "hardware_errors": ("Hardware Errors", 0),
+        "best_share": ("Best Share", 0),
+    }
+    __slots__ = tuple(FIELDS)
+
+
+class Pool(Struct):
+    """an item in the pools reply"""
+
+    pool: int | None
+    url: str
+    user: str
+    status: str
+    stratum_active: bool
+    accepted: int
+    rejected: int
+    stale: int
+    diff_accepted: float
+    diff_rejected: float
+    diff_stale: float
+
+    FIELDS = {
+        "pool": ("POOL", None),
+        "url": ("URL", ""),
+        "user": ("User", ""),
+        "status": ("Status", ""),
+        "stratum_active": ("Stratum Active", False),
+        "accepted": ("Accepted", 0),
+        "rejected": ("Rejected", 0),
+        "stale": ("Stale", 0),
+        "diff_accepted": ("Difficulty Accepted", 0.0),
+        "diff_rejected": ("Difficulty Rejected", 0.0),
+        "diff_stale": ("Difficulty Stale", 0.0),
+    }
+    __slots__ = tuple(FIELDS)
+
+
+class Config(Struct):
+    """the config reply"""
+
+    model: str
+    mac: str
+    os: str
+    hostname: str
+    profile: str
+    atm_enabled: bool
+    fpga_build_hex: str
+    fpga_build_str: str
+
+    FIELDS = {
+        "model": ("Model", ""),
+        "mac": ("MACAddr", ""),
+        "os": ("OS", ""),
+        "hostname": ("Hostname", ""),
+        "profile": ("Profile", ""),
+        "atm_enabled": ("IsAtmEnabled", False),
+        "fpga_build_hex": ("FPGABuildIdHex", ""),
+        "fpga_build_str": ("FPGABuildIdStr", ""),
+    }
+    __slots__ = tuple(FIELDS)
+
+
+class Version(Struct):
+    """the version reply"""
+
+    luxminer: str
+    api: str
+    miner: str
+    type: str
+    compile_time: str
+
+    FIELDS = {
+        "luxminer": ("LUXminer", ""),
+        "api": ("API", ""),
+        "miner": ("Miner", ""),
+        "type": ("Type", ""),
+        "compile_time": ("CompileTime", ""),
+    }
+    __slots__ = tuple(FIELDS)
+
+
+class Temp(Struct):
+    """an item in the temps reply"""
+
+    id: int | None
+    board: int | None
+    top_left: float
+    top_right: float
+    bottom_left: float
+    bottom_right: float
+
+    FIELDS = {
+        "id": ("ID", None),
+        "board": ("Board", None),
+        "top_left": ("TopLeft", 0.0),
+        "top_right": ("TopRight", 0.0),
+        "bottom_left": ("BottomLeft", 0.0),
+        "bottom_right": ("BottomRight", 0.0),
+    }
+    __slots__ = tuple(FIELDS)
+
+
+class Chip(Struct):
+    """an item in the healthchipget reply"""
+
+    board: int | None
+    chip: int | None
+    healthy: str
+
+    FIELDS = {
+        "board": ("Board", None),
+        "chip": ("Chip", None),
+        "healthy": ("Healthy", ""),
+    }
+    __slots__ = tuple(FIELDS)
+
+    @property
+    def is_healthy(self) -> bool:
+        return self.healthy == "Y"
+
+
+#: command -> struct (reply key and cardinality are from api.json)
+DECODERS: dict[str, type[Struct]] = {
+    "devs": Board,
+    "summary": Summary,
+    "pools": Pool,
+    "config": Config,
+    "version": Version,
+    "temps": Temp,
+    "healthchipget": Chip,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _raw_decoder(cmd: str) -> Callable[[bytes | bytearray], dict[str, Any]] | None:
+    # a msgspec decoder of the cmd raw replies (None without msgspec): it
+    # keeps STATUS, id and the reply key items, as twins of the struct
+    try:
+        import msgspec
+    except ImportError:
+        return None
+
+    struct = DECODERS[cmd]
+    key = api.get_command(cmd)["reply_key"]
+    namespace: dict[str, Any] = {
+        name: value
+        for name, value in vars(struct).items()
+        if isinstance(value, property)
+    }
+    namespace.update(
+        FIELDS=struct.FIELDS,
+        asdict=Struct.asdict,
+        __eq__=Struct.__eq__,
+        __repr__=Struct.__repr__,
+    )
+    item = msgspec.defstruct(
+        struct.__name__,
+        [(attr, Any, default) for attr, (_, default) in struct.FIELDS.items()],
+        rename={attr: name for attr, (name, _) in struct.FIELDS.items()},
+        namespace=namespace,
+        module=__name__,
+    )
+    _TWINS[item] = struct
+    status = msgspec.defstruct("Status", [("STATUS", Any, None)])
+    array: Any = list  # for the types built at run time
+    reply = msgspec.defstruct(
+        f"{struct.__name__}Reply",
+        [
+            ("STATUS", array[status], msgspec.UNSET),
+            ("id", Any, msgspec.UNSET),
+            (key, array[item], msgspec.UNSET),
+        ],
+    )
+    decoder = msgspec.json.Decoder(reply)
+
+    def decode(raw: bytes | bytearray) -> dict[str, Any]:
+        obj: Any = decoder.decode(raw)
+        # a (small) reply for the validator
+        res: dict[str, Any] = {}
+        if obj.STATUS is not msgspec.UNSET:
+            res["STATUS"] = [{"STATUS": item.STATUS} for item in obj.STATUS]
+        if obj.id is not msgspec.UNSET:
+            res["id"] = obj.id
+        if (items := getattr(obj, key)) is not msgspec.UNSET:
+            res[key] = items
+        return res
+
+    return decode
+
+
+def decode(
+    cmd: str, res: dict[str, Any] | jsonlib.LazyReply | bytes | bytearray
+) -> Any:
+    """validate and decode the reply res of the command cmd
+
+    The raw replies (bytes, or a not yet parsed LazyReply) are decoded
+    with msgspec if available (see the module notes).
+
+    Returns:
+        a Struct instance for single item replies (eg. version), or a
+        list of Struct instances otherwise (eg. devs)
+
+    Raises:
+        KeyError: if there's no decoder for cmd
+        MinerMessageReplyError: if res is not a valid reply (see asyncops.validate)
+    """
+    struct = DECODERS[cmd]
+    if isinstance(res, jsonlib.LazyReply):
+        res = res.data if res.parsed else res.raw
+    # the raw replies decoded by msgspec hold the (twin) structs already
+    twins = False
+    if isinstance(res, (bytes, bytearray)):
+        try:
+            if (raw_decoder := _raw_decoder(cmd)) is None:
+                data = jsonlib.loads(res)
+            else:
+                data = raw_decoder(res)
+                twins = True
+        except ValueError as exc:
+            raise exceptions.MinerMessageMalformedError(
+                f"cannot decode the {cmd} reply: {exc}", res
+            ) from exc
+    else:
+        data = res
+
+    values = asyncops.get_validator(cmd)(data)
+    if values is None or isinstance(values, list):
+        return list(values or []) if twins else struct.from_list(values)
+    return values if twins else struct.from_dict(values)
+
+
+async def devs(host: str, port: int, **kwargs) -> list[Board]:
+    return decode("devs", await asyncops.rexec(host, port, "devs", **kwargs))
+
+
+async def summary(host: str, port: int, **kwargs) -> Summary:
+    return decode("summary", await asyncops.rexec(host, port, "summary", **kwargs))
+
+
+async def pools(host: str, port: int, **kwargs) -> list[Pool]:
+    return decode("pools", await asyncops.rexec(host, port, "pools", **kwargs))
+
+
+async def config(host: str, port: int, **kwargs) -> Config:
+    return decode("config", await asyncops.rexec(host, port, "config", **kwargs))
+
+
+async def version(host: str, port: int, **kwargs) -> Version:
+    return decode("version", await asyncops.rexec(host, port, "version", **kwargs))
+
+
+async def temps(host: str, port: int, **kwargs) -> list[Temp]:
+    return decode("temps", await asyncops.rexec(host, port, "temps", **kwargs))
+
+
+async def healthchipget(host: str, port: int, **kwargs) -> list[Chip]:
+    res = await asyncops.rexec(host, port, "healthchipget", **kwargs)
+    return decode("healthchipget", res)
@@ -46,6 +46,11 @@ class MinerCommandTimeoutError(MinerConnectionError, asyncio.TimeoutError):
     pass
 
 
+# the miner hostname cannot be resolved (see luxos.resolver)
+class MinerResolutionError(MinerConnectionError):
+    pass
+
+
 class MinerCommandSessionAlreadyActive(MinerConnectionError):
     pass
 
@@ -0,0 +1,155 @@
+"""miners fingerprints: firmware family, model, version and mac address
+
+Sweeps work out the miners firmware (LuxOS or stock) out of a probe
+reply (the devs keys order), and then issue a different set of commands.
+The fingerprints keep what was found for each miner, so the next sweeps
+go straight to the right commands: a fingerprint holds until the miner
+uptime counter resets (eg. after a reboot, maybe on a new firmware) or
+its mac address changes (a different machine at the same address).
+
+Example::
+
+    from luxos import fingerprint
+
+    store = fingerprint.FingerprintStore("fingerprints.json")
+    store.load()
+    if known := store.check(host, port, elapsed=uptime, mac=mac):
+        ... known.family, known.version
+    else:
+        ... probe the miner
+        store.update(fingerprint.Fingerprint(host, port, "luxos", ...))
+    store.save()
+"""
+
+from __future__ import annotations
+
+import dataclasses as dc
+import json
+import logging
+import os
+import re
+import time
+from pathlib import Path
+from typing import Any
+
+log = logging.getLogger(__name__)
+
+LUXOS = "luxos"
+STOCK = "stock"
+
+# the first key of a raw reply
+_FIRST_KEY = re.compile(rb'\s*\{\s*"(\w+)"')
+
+
+def family(devs: dict[str, Any] | bytes | bytearray) -> str | None:
+    """the firmware family (LUXOS or STOCK) from the devs reply keys order
+
+    The raw (not parsed) reply works too, from its first key.
+    """
+    if isinstance(devs, (bytes, bytearray)):
+        match = _FIRST_KEY.match(devs)
+        first = match.group(1) if match else None
+        if first == b"DEVS":
+            return LUXOS
+        if first == b"STATUS" and b'"DEVS"' in devs:
+            return STOCK
+        return None
+    keys = list(devs)
+    if keys == ["DEVS", "STATUS", "id"]:
+        return LUXOS
+    if keys == ["STATUS", "DEVS", "id"]:
+        return STOCK
+    return None
+
+
+@dc.dataclass
+class Fingerprint:
+    host: str
+    port: int
+    #: the firmware family (LUXOS or STOCK)
+    family: str
+    model: str = ""
+    version: str = ""
+    #: the mac address (empty if not known, eg. on stock firmware)
+    mac: str = ""
+    #: the miner uptime (s) when last seen
+    elapsed: float = 0.0
+    #: when the miner was last seen (wall clock time)
+    seen: float = dc.field(default_factory=time.time)
+
+
+class FingerprintStore:
+    """the miners fingerprints, by (host, port), kept in path (json)"""
+
+    def __init__(self, path: Path | str | None = None):
+        self.path = Path(path) if path else None
+        self.fingerprints: dict[tuple[str, int], Fingerprint] = {}
+        #: number of checks finding a valid fingerprint (hits) or not (misses)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.fingerprints)
+
+    def get(self, host: str, port: int) -> Fingerprint | None:
+        return self.fingerprints.get((host, port))
+
+    def check(
+        self, host: str, port: int, elapsed: float, mac: str | None = None
+    ) -> Fingerprint | None:
+        """the host:port fingerprint, if still valid
+
+        The fingerprint is dropped if the uptime went back (elapsed is
+        lower than last seen) or mac (if given) is a different one.
+        """
+        if (known := self.get(host, port)) is None:
+            self.misses += 1
+            return None
+        if elapsed < known.elapsed or (mac and known.mac and mac != known.mac):
+            log.debug("fingerprint for %s:%i expired", host, port)
+            del self.fingerprints[(host, port)]
+            self.misses += 1
+            return None
+        known.elapsed = elapsed
+        known.seen = time.time()
+        self.hits += 1
+        return known
+
+    def update(self, fingerprint: Fingerprint) -> None:
+        self.fingerprints[(fingerprint.host, fingerprint.port)] = fingerprint
+
+    def drop(self, host: str, port: int) -> None:
+        self.fingerprints.pop((host, port), None)
+
+    def load(self) -> int:
+        """loads the fingerprints from path, if it exists
+
+        Returns:
+            the number of loaded fingerprints
+        """
+        if not (self.path and self.path.exists()):
+            return 0
+        try:
+            items = json.loads(self.path.read_bytes())
+            fingerprints = [Fingerprint(**item) for item in items]
+        except (OSError, ValueError, TypeError) as exc:
+            log.warning("cannot load the fingerprints %s: %s", self.path, exc)
+            return 0
+        for fingerprint in fingerprints:
+            self.update(fingerprint)
+        return len(fingerprints)
+
+    def save(self) -> None:
+        """writes the fingerprints to path (atomically)"""
+        if not self.path:
+            return
+        items = [dc.asdict(fingerprint) for fingerprint in self.fingerprints.values()]
+        tmp = self.path.with_name(f".{self.path.name}.tmp")
+        tmp.write_text(json.dumps(items, indent=2))
+        os.replace(tmp, self.path)
+
+    def report(self) -> list[str]:
+        return [
+            f"fingerprints: {self.hits} still valid, {self.misses} probed, "
+            f"{len(self.fingerprints)} known"
+        ]
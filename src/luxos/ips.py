@@ -2,25 +2,93 @@
 
 from __future__ import annotations
 
+import array
+import bisect
+import contextlib
+import functools
+import hashlib
+import io
 import ipaddress
+import itertools
+import json
+import logging
+import os
+import random
 import re
+import struct
+import sys
+import zlib
 from pathlib import Path
-from typing import Generator
+from typing import (
+    IO,
+    AbstractSet,
+    Generator,
+    Iterable,
+    Iterator,
+    Optional,
+    Sequence,
+    Tuple,
+    overload,
+)
 
 from .exceptions import AddressParsingError, LuxosBaseException
+from .misc import batched
+
+log = logging.getLogger(__name__)
 
 
 class DataParsingError(LuxosBaseException):
     pass
 
 
+# the parse_expr tokens, tried in order at each position
+TOKENIZER = re.compile(
+    r"""
+    (?P<ip>\d{1,3}(?:[.]\d{1,3}){3})
+    |(?P<sep>:)
+    |(?P<div>-)
+    |(?P<mask>/\d{1,2})
+    |(?P<port>\d+)
+    |(?P<address>[^:]+)
+    """,
+    re.VERBOSE,
+)
+SPLITIP = re.compile(r"(?P<ip>\d{1,3}([.]\d{1,3}){3})(:(?P<port>\d+))?")
+
+
+def _syntaxes() -> dict[tuple[str, ...], tuple]:
+    # parse_expr token sequences -> (start, end, port, port1, mask) tokens indexes
+    patterns = [
+        ("ip|address", (0, None, None, None, None)),
+        ("ip|address sep port", (0, None, 2, None, None)),
+        ("ip sep|div ip", (0, 2, None, None, None)),
+        ("ip sep port div|sep ip", (0, 4, 2, None, None)),
+        ("ip div|sep ip sep port", (0, 2, 4, None, None)),
+        ("ip sep port div|sep ip sep port", (0, 4, 2, 6, None)),
+        ("ip mask", (0, None, None, None, 1)),
+        ("ip mask sep port", (0, None, 3, None, 1)),
+    ]
+    result: dict[tuple[str, ...], tuple] = {}
+    for syntax, indexes in patterns:
+        alternatives = [token.split("|") for token in syntax.split()]
+        for concrete in itertools.product(*alternatives):
+            result.setdefault(concrete, indexes)
+    return result
+
+
+SYNTAXES = _syntaxes()
+
+# dotted-quad last octets
+_OCTETS = [str(i) for i in range(256)]
+
+
 def splitip(txt: str) -> tuple[str, int | None]:
-    expr = re.compile(r"(?P<ip>\d{1,3}([.]\d{1,3}){3})(:(?P<port>\d+))?")
-    if not (match := expr.search(txt)):
+    if not (match := SPLITIP.search(txt)):
         raise RuntimeError(f"invalid ip:port address {txt}")
     return match["ip"], int(match["port"]) if match["port"] is not None else None
 
 
+@functools.lru_cache(maxsize=2**14)
 def parse_expr(txt: str) -> None | tuple[str, str | None, int | None]:
     """parse text into a (start, end, port) tuple.
 
@@ -29,82 +97,87 @@ def parse_expr(txt: str) -> None | tuple[str, str | None, int | None]:
         <ip>:port
         <startip>:<endip>
         <startip>:<port>:<endip>
+        <ip>/<prefix>
+        <ip>/<prefix>:<port>
     Eg.
         >>> parse_expr("127.0.0.1")
         ("127.0.0.1", None, None)
         >>> ips.parse_expr("127.0.0.1:1234:127.0.0.3")
         ("127.0.0.1", "127.0.0.3", 1234)
+        >>> ips.parse_expr("10.1.0.0/16:1234")
+        ("10.1.0.0", "10.1.255.255", 1234)
     """
-    tokens = {
-        "ip": re.compile(r"(?P<ip>\d{1,3}([.]\d{1,3}){3})"),
-        "sep": re.compile(":"),
-        "div": re.compile("-"),
-        "port": re.compile(r"(?P<port>\d+)"),
-        "address": re.compile(r"(?P<address>[^:]+)"),
-    }
-
-    txt2 = txt.replace(" ", "")
-
-    items = []
-    while txt2.strip():
-        for k, e in tokens.items():
-            if match := e.match(txt2):
-                i, j = match.span()
-                items.append((k, txt2[i:j]))
-                txt2 = txt2[j:]
-                break
-        else:
+    txt2 = txt.replace(" ", "").strip()
+
+    kinds = []
+    values = []
+    pos, n = 0, len(txt2)
+    while pos < n:
+        if not (match := TOKENIZER.match(txt2, pos)):
             raise AddressParsingError(f"cannot parse text '{txt}'")
+        kinds.append(match.lastgroup or "")
+        values.append(match.group())
+        pos = match.end()
 
-    if len(items) == 0:
+    if len(kinds) == 0:
         raise AddressParsingError(f"cannot parse '{txt}'")
 
-    def matcher(syntax):
-        def match(left, right):
-            if len(left) != len(right):
-                return False
-            for a, b in zip(left, right):
-                if isinstance(b, str):
-                    if a != b:
-                        return False
-                elif a not in b:
-                    return False
-            return True
-
-        start = end = port = None
-        if match(syntax, [{"ip", "address"}]):
-            start = items[0][1]
-        elif match(syntax, [{"ip", "address"}, "sep", "port"]):
-            start = items[0][1]
-            port = int(items[2][1])
-        elif match(syntax, ["ip", {"sep", "div"}, "ip"]):
-            start = items[0][1]
-            end = items[2][1]
-        elif match(syntax, ["ip", "sep", "port", {"div", "sep"}, "ip"]):
-            start = items[0][1]
-            end = items[4][1]
-            port = int(items[2][1])
-        elif match(syntax, ["ip", {"div", "sep"}, "ip", "sep", "port"]):
-            start = items[0][1]
-            end = items[2][1]
-            port = int(items[4][1])
-        elif match(syntax, ["ip", "sep", "port", {"div", "sep"}, "ip", "sep", "port"]):
-            start = items[0][1]
-            end = items[4][1]
-            port = int(items[2][1])
-            port1 = int(items[6][1])
-            if port != port1:
-                raise AddressParsingError(f"ports mismatch {port} != {port1}")
-        else:
-            raise AddressParsingError(f"cannot parse '{txt}': {syntax=}")
-        return start, end, port
+    syntax = tuple(kinds)
+    if (indexes := SYNTAXES.get(syntax)) is None:
+        raise AddressParsingError(f"cannot parse '{txt}': syntax={list(syntax)}")
+
+    i, j, k, k1, m = indexes
+    start = values[i]
+    end = None if j is None else values[j]
+    port = None if k is None else int(values[k])
+    if k1 is not None and port != (port1 := int(values[k1])):
+        raise AddressParsingError(f"ports mismatch {port} != {port1}")
+    if m is not None:
+        prefix = int(values[m][1:])
+        if prefix > 32 or (value := ip2int(start)) is None:
+            raise AddressParsingError(f"invalid network '{txt}'")
+        hostmask = (1 << (32 - prefix)) - 1
+        start = int2ip(value & ~hostmask)
+        end = int2ip(value | hostmask)
+    return start, end, port
+
+
+def ip2int(host: str) -> int | None:
+    """the ipv4 (dotted-quad) host as int, None if host is a hostname"""
+    try:
+        return int(ipaddress.IPv4Address(host))
+    except ValueError:
+        return None
 
-    syntax = [item[0] for item in items]
-    return matcher(syntax)
+
+def int2ip(value: int) -> str:
+    """the ipv4 value as dotted-quad string"""
+    return f"{value >> 24}.{(value >> 16) & 255}.{(value >> 8) & 255}.{value & 255}"
+
+
+def iter_hosts(first: int, last: int) -> Iterator[str]:
+    """iterate over the (inclusive) range of ipv4 addresses given as int
+
+    Example::
+
+        >>> list(iter_hosts(2130706433, 2130706435))
+        ["127.0.0.1", "127.0.0.2", "127.0.0.3"]
+    """
+    # the addresses are formatted as a /24 block prefix plus the last octet
+    for block in range(first >> 8, (last >> 8) + 1):
+        prefix = f"{block >> 16}.{(block >> 8) & 255}.{block & 255}."
+        lo = first & 255 if block == first >> 8 else 0
+        hi = last & 255 if block == last >> 8 else 255
+        for octet in _OCTETS[lo : hi + 1]:
+            yield prefix + octet
 
 
 def iter_ip_ranges(
-    txt: str, port: int | None = None, gsep: str = ",", strict: bool = True
+    txt: str,
+    port: int | None = None,
+    gsep: str = ",",
+    strict: bool = True,
+    hosts_only: bool = False,
 ) -> Generator[tuple[str, int | None], None, None]:
     """iterate over ip ranges.
 
@@ -113,8 +186,14 @@ def iter_ip_ranges(
     1. a single ip and (optional) port: ``127.0.0.1`` or ``127.0.0.1:8080``
     2. an (inclusive) range using two ips separated by a
        ``-`` (minus) sign: ``127.0.0.1-127.0.0.3``
-    3. a combination of the above separated by a ``,`` (comma) sign:
+    3. a network in CIDR notation: ``10.1.0.0/16``
+    4. a combination of the above separated by a ``,`` (comma) sign:
        ``127.0.0.1,192.168.0.1-192.168.0.10``
+    5. any of the above prefixed by ``!`` to exclude it:
+       ``10.1.0.0/16,!10.1.255.0/24`` (without a port it excludes any port)
+
+    The ranges are expanded lazily, during the iteration. If hosts_only
+    is set the networks (3.) skip their network and broadcast addresses.
 
     Example::
 
@@ -126,7 +205,65 @@ def iter_ip_ranges(
         ...
         (127.0.0.15, 9999),
     """
+    for host, first, last, theport in _iter_intervals(
+        txt, port, gsep, strict, hosts_only
+    ):
+        if first is None or last is None:
+            yield (host, theport)
+            continue
+        for address in iter_hosts(first, last):
+            yield (address, theport)
+
+
+def _iter_intervals(
+    txt: str,
+    port: int | None = None,
+    gsep: str = ",",
+    strict: bool = True,
+    hosts_only: bool = False,
+    excluded: AddressSet | None = None,
+) -> Iterator[tuple[str, int | None, int | None, int | None]]:
+    # (hostname, None, None, port) or ("", first, last, port) for each txt
+    # segment, with the exclusions applied and port as fallback port
+    # (the txt exclusions are added to excluded, if passed)
+    exprs = list(_iter_exprs(txt, gsep, strict, hosts_only))
+    excluded = AddressSet() if excluded is None else excluded
+    for exclude, host, first, last, theport in exprs:
+        if not exclude:
+            continue
+        if first is None or last is None:
+            excluded.add(host, theport)
+        else:
+            excluded.add_range(first, last, theport)
+
+    for exclude, host, first, last, theport in exprs:
+        if exclude:
+            continue
+        theport = theport or port
+        if first is None or last is None:
+            if not excluded or not (
+                (host, None) in excluded or (host, theport) in excluded
+            ):
+                yield (host, None, None, theport)
+            continue
+
+        intervals = [(first, last)]
+        if excluded:
+            intervals = _subtract(intervals, excluded.intervals(None))
+            intervals = _subtract(intervals, excluded.intervals(theport))
+        for start, end in intervals:
+            yield ("", start, end, theport)
+
+
+def _iter_exprs(
+    txt: str, gsep: str = ",", strict: bool = True, hosts_only: bool = False
+) -> Iterator[tuple[bool, str, int | None, int | None, int | None]]:
+    # (exclude, host, first, last, port) for each txt segment, where first and
+    # last are the (inclusive) ipv4 range as int (None for hostnames)
     for segment in txt.replace(" ", "").split(gsep):
+        exclude = segment.startswith("!")
+        if exclude:
+            segment = segment[1:]
         try:
             if not (found := parse_expr(segment)):
                 continue
@@ -134,24 +271,22 @@ def iter_ip_ranges(
             if strict:
                 raise
             continue
-        start, end, theport = found
+        start, end, port = found
         if start is None and end is None:
             raise RuntimeError(f"cannot parse '{segment}'")
         if end is None:
-            yield (start, theport or port)
+            value = ip2int(start)
+            yield exclude, start, value, value, port
             continue
-
-        cur = ipaddress.IPv4Address(start)
-        last = ipaddress.IPv4Address(end)
-        while cur <= last:
-            yield (str(cur), theport or port)
-            cur += 1
+        first = int(ipaddress.IPv4Address(start))
+        last = int(ipaddress.IPv4Address(end))
+        if hosts_only and not exclude and "/" in segment and last - first > 1:
+            first, last = first + 1, last - 1
+        yield exclude, start, first, last, port
 
 
-def ip_ranges(
-    txt: str, gsep: str = ":", strict: bool = True
-) -> list[tuple[str, int | None]]:
-    """return a list of ips given a text expression.
+def ip_ranges(txt: str, gsep: str = ":", strict: bool = True) -> AddressBook:
+    """return an AddressBook (a compact list) of ips given a text expression.
 
     Eg.
         >>> for ip in ip_ranges("127.0.0.1"):
@@ -166,19 +301,565 @@ def ip_ranges(
 
     NOTE: use the `:` (gsep) to separate ips groups, and `-` (rsep) to define a range.
     """
-    return list(iter_ip_ranges(txt, gsep=gsep, strict=strict))
+    return AddressBook.from_expr(txt, gsep=gsep, strict=strict)
+
+
+Interval = Tuple[int, int]
+
+
+def _merge(intervals: Iterable[Interval]) -> list[Interval]:
+    # sorts and merges overlapping (or adjacent) inclusive intervals
+    result: list[Interval] = []
+    for start, end in sorted(intervals):
+        if result and start <= result[-1][1] + 1:
+            if end > result[-1][1]:
+                result[-1] = (result[-1][0], end)
+        else:
+            result.append((start, end))
+    return result
+
+
+def _intersect(left: list[Interval], right: list[Interval]) -> list[Interval]:
+    result = []
+    i = j = 0
+    while i < len(left) and j < len(right):
+        start = max(left[i][0], right[j][0])
+        end = min(left[i][1], right[j][1])
+        if start <= end:
+            result.append((start, end))
+        if left[i][1] < right[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+def _subtract(left: list[Interval], right: list[Interval]) -> list[Interval]:
+    result = []
+    j = 0
+    for start, end in left:
+        while j < len(right) and right[j][1] < start:
+            j += 1
+        k = j
+        while k < len(right) and right[k][0] <= end:
+            if right[k][0] > start:
+                result.append((start, right[k][0] - 1))
+            start = max(start, right[k][1] + 1)
+            k += 1
+        if start <= end:
+            result.append((start, end))
+    return result
+
+
+class AddressSet:
+    """a set of (host, port) miners addresses
+
+    The ipv4 addresses are kept as sorted, non overlapping, integer intervals
+    grouped per port (hostnames as they are): ranges are never expanded, so
+    ``len()``, the O(log n) membership and the set algebra don't depend on the
+    number of addresses, and the iteration is lazy.
+
+    Example::
+
+        >>> addresses = AddressSet.from_expr("10.0.0.0-10.0.255.255:4028")
+        >>> addresses |= AddressSet([("10.0.1.1", 4028), ("a.host", None)])
+        >>> len(addresses)
+        65537
+        >>> ("10.0.1.1", 4028) in addresses
+        True
+        >>> for host, port in addresses.with_port(4028):
+        ...     print(host, port)
+
+    Note:
+        an AddressSet compares equal to any collection (eg. a list) of the
+        same (host, port) pairs, regardless the order or the duplicates.
+    """
+
+    def __init__(self, addresses: Iterable[tuple[str, int | None]] = ()):
+        # port -> merged intervals (and their starts, for bisect)
+        self._intervals: dict[int | None, list[Interval]] = {}
+        self._starts: dict[int | None, list[int]] = {}
+        # port -> intervals not merged yet
+        self._pending: dict[int | None, list[Interval]] = {}
+        # port -> hostnames (an ordered set)
+        self._names: dict[int | None, dict[str, None]] = {}
+        self.update(addresses)
+
+    @classmethod
+    def from_expr(
+        cls,
+        txt: str,
+        port: int | None = None,
+        gsep: str = ",",
+        strict: bool = True,
+        hosts_only: bool = False,
+    ) -> AddressSet:
+        """AddressSet from a range expression (see iter_ip_ranges), unexpanded"""
+        result = cls()
+        excluded = cls()
+        for exclude, host, first, last, theport in _iter_exprs(
+            txt, gsep, strict, hosts_only
+        ):
+            target = excluded if exclude else result
+            theport = theport if exclude else (theport or port)
+            if first is None or last is None:
+                target.add(host, theport)
+            else:
+                target.add_range(first, last, theport)
+        return result.exclude(excluded) if excluded else result
+
+    def exclude(self, other: AddressSet) -> AddressSet:
+        """like difference, but the other addresses without a port match any port"""
+        wildcard = AddressSet()
+        for port in self.ports():
+            for start, end in other.intervals(None):
+                wildcard.add_range(start, end, port)
+            for name in other._names.get(None, {}):
+                wildcard.add(name, port)
+        return self - other - wildcard
+
+    def add(self, host: str, port: int | None = None) -> None:
+        if (value := ip2int(host)) is None:
+            self._names.setdefault(port, {})[host] = None
+        else:
+            self._pending.setdefault(port, []).append((value, value))
+
+    def add_range(self, first: str | int, last: str | int, port: int | None = None):
+        """adds the (inclusive) range of ipv4 addresses first-last"""
+        start = int(ipaddress.IPv4Address(first))
+        end = int(ipaddress.IPv4Address(last))
+        if start <= end:
+            self._pending.setdefault(port, []).append((start, end))
+
+    def update(self, addresses: Iterable[tuple[str, int | None]]) -> None:
+        if isinstance(addresses, AddressBook):
+            hostnames = addresses.names
+            for index, (value, number) in enumerate(
+                zip(addresses.hosts, addresses.ports)
+            ):
+                if index in hostnames:
+                    self._names.setdefault(number or None, {})[hostnames[index]] = None
+                else:
+                    self._pending.setdefault(number or None, []).append((value, value))
+            return
+        if not isinstance(addresses, AddressSet):
+            for host, port in addresses:
+                self.add(host, port)
+            return
+        for port, intervals in addresses._pending.items():
+            self._pending.setdefault(port, []).extend(intervals)
+        for port, intervals in addresses._intervals.items():
+            self._pending.setdefault(port, []).extend(intervals)
+        for port, names in addresses._names.items():
+            self._names.setdefault(port, {}).update(names)
+
+    def _compact(self) -> None:
+        for port, pending in self._pending.items():
+            intervals = _merge([*self._intervals.get(port, []), *pending])
+            self._intervals[port] = intervals
+            self._starts[port] = [start for start, _ in intervals]
+        self._pending.clear()
+
+    def intervals(self, port: int | None) -> list[Interval]:
+        """the (inclusive) ipv4 addresses intervals for port"""
+        self._compact()
+        return self._intervals.get(port, [])
+
+    def ports(self) -> list[int | None]:
+        self._compact()
+        return list(dict.fromkeys([*self._intervals, *self._names]))
+
+    def with_port(self, port: int | None) -> AddressSet:
+        """a copy where the addresses without a port get port"""
+        result = AddressSet()
+        for theport in self.ports():
+            theport1 = port if theport is None else theport
+            if intervals := self.intervals(theport):
+                result._pending.setdefault(theport1, []).extend(intervals)
+            if names := self._names.get(theport):
+                result._names.setdefault(theport1, {}).update(names)
+        return result
+
+    def __len__(self) -> int:
+        self._compact()
+        return sum(
+            end - start + 1
+            for intervals in self._intervals.values()
+            for start, end in intervals
+        ) + sum(len(names) for names in self._names.values())
+
+    def __bool__(self) -> bool:
+        return any(
+            any(values.values())
+            for values in (self._pending, self._intervals, self._names)
+        )
+
+    def __contains__(self, address) -> bool:
+        host, port = address
+        if (value := ip2int(host)) is None:
+            return host in self._names.get(port, {})
+        self._compact()
+        if not (starts := self._starts.get(port)):
+            return False
+        index = bisect.bisect_right(starts, value) - 1
+        return index >= 0 and value <= self._intervals[port][index][1]
+
+    def __iter__(self) -> Iterator[tuple[str, int | None]]:
+        for port in self.ports():
+            for start, end in self._intervals.get(port, []):
+                for host in iter_hosts(start, end):
+                    yield (host, port)
+            for host in self._names.get(port, {}):
+                yield (host, port)
+
+    def _combine(self, other: Iterable[tuple[str, int | None]], op) -> AddressSet:
+        if not isinstance(other, AddressSet):
+            other = AddressSet(other)
+        result = AddressSet()
+        for port in dict.fromkeys([*self.ports(), *other.ports()]):
+            intervals = op(self.intervals(port), other.intervals(port))
+            if intervals:
+                result._intervals[port] = intervals
+                result._starts[port] = [start for start, _ in intervals]
+            left = self._names.get(port, {})
+            right = other._names.get(port, {})
+            if op is _intersect:
+                names = {name: None for name in left if name in right}
+            elif op is _subtract:
+                names = {name: None for name in left if name not in right}
+            else:
+                names = {**left, **right}
+            if names:
+                result._names[port] = names
+        return result
+
+    def union(self, other: Iterable[tuple[str, int | None]]) -> AddressSet:
+        return self._combine(other, lambda a, b: _merge([*a, *b]))
+
+    def intersection(self, other: Iterable[tuple[str, int | None]]) -> AddressSet:
+        return self._combine(other, _intersect)
+
+    def difference(self, other: Iterable[tuple[str, int | None]]) -> AddressSet:
+        return self._combine(other, _subtract)
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+
+    def __eq__(self, other):
+        if not isinstance(other, (AddressSet, AbstractSet, list, tuple)):
+            return NotImplemented
+        if not isinstance(other, AddressSet):
+            other = AddressSet(other)
+        ports = set(self.ports()) | set(other.ports())
+        return all(
+            self.intervals(port) == other.intervals(port)
+            and set(self._names.get(port, {})) == set(other._names.get(port, {}))
+            for port in ports
+        )
+
+    def __repr__(self):
+        return f"<AddressSet {len(self)} addresses, {len(self.ports())} ports>"
+
+
+Address = Tuple[str, Optional[int]]
+
+
+class AddressBook(Sequence[Address]):
+    """a compact, ordered, list of (host, port) miners addresses
+
+    The ipv4 addresses are packed in an uint32 array and the ports in an
+    uint16 one (0 standing for no port), hostnames are kept aside by index:
+    it takes ~6 bytes per miner, instead of ~150 of a list of tuples. The
+    (host, port) tuples are created on access.
+
+    Example::
+
+        >>> book = AddressBook.from_expr("10.0.0.0/16:4028,a.host")
+        >>> len(book), book[0], book[-1]
+        (65537, ("10.0.0.0", 4028), ("a.host", None))
+
+        # split the miners into 4 random shards
+        >>> book.shuffle()
+        >>> shards = [book[i::4] for i in range(4)]
+
+    Note:
+        an AddressBook compares equal to a list (or tuple) holding the
+        same (host, port) items.
+    """
+
+    def __init__(self, addresses: Iterable[Address] = ()):
+        self.hosts = array.array("I")
+        self.ports = array.array("H")
+        # index -> hostname (hosts has a 0 placeholder)
+        self.names: dict[int, str] = {}
+        self.extend(addresses)
+
+    @classmethod
+    def from_expr(
+        cls,
+        txt: str,
+        port: int | None = None,
+        gsep: str = ",",
+        strict: bool = True,
+        hosts_only: bool = False,
+    ) -> AddressBook:
+        """AddressBook from a range expression (see iter_ip_ranges)"""
+        result = cls()
+        for host, first, last, theport in _iter_intervals(
+            txt, port, gsep, strict, hosts_only
+        ):
+            if first is None or last is None:
+                result.append(host, theport)
+            else:
+                result._extend_range(first, last, theport)
+        return result
+
+    def _extend_range(self, first: int, last: int, port: int | None) -> None:
+        self.hosts.extend(range(first, last + 1))
+        self.ports.extend(itertools.repeat(port or 0, last - first + 1))
+
+    def append(self, host: str, port: int | None = None) -> None:
+        if (value := ip2int(host)) is None:
+            self.names[len(self.hosts)] = host
+            value = 0
+        self.hosts.append(value)
+        self.ports.append(port or 0)
+
+    def extend(self, addresses: Iterable[Address]) -> None:
+        if isinstance(addresses, AddressBook):
+            offset = len(self.hosts)
+            self.names.update((offset + i, n) for i, n in addresses.names.items())
+            self.hosts.extend(addresses.hosts)
+            self.ports.extend(addresses.ports)
+        elif isinstance(addresses, AddressSet):
+            for port in addresses.ports():
+                for first, last in addresses.intervals(port):
+                    self._extend_range(first, last, port)
+                for host in addresses._names.get(port, {}):
+                    self.append(host, port)
+        else:
+            for host, port in addresses:
+                self.append(host, port)
+
+    def with_port(self, port: int | None) -> AddressBook:
+        """a copy where the addresses without a port get port"""
+        result = self[:]
+        if port:
+            result.ports = array.array("H", (p or port for p in result.ports))
+        return result
+
+    def shuffle(self, rng: random.Random | None = None) -> None:
+        """shuffles the addresses in place"""
+        indexes = list(range(len(self)))
+        (rng or random).shuffle(indexes)
+        self._select(indexes, self)
+
+    def _select(self, indexes: Sequence[int], target: AddressBook) -> AddressBook:
+        hosts, ports, names = self.hosts, self.ports, self.names
+        target.hosts = array.array("I", (hosts[i] for i in indexes))
+        target.ports = array.array("H", (ports[i] for i in indexes))
+        target.names = (
+            {new: names[old] for new, old in enumerate(indexes) if old in names}
+            if names
+            else {}
+        )
+        return target
+
+    def _item(self, index: int) -> Address:
+        if index in self.names:
+            host = self.names[index]
+        else:
+            host = int2ip(self.hosts[index])
+        return (host, self.ports[index] or None)
+
+    def __len__(self) -> int:
+        return len(self.hosts)
+
+    @overload
+    def __getitem__(self, index: int) -> Address: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> AddressBook: ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            result = AddressBook()
+            if not self.names:
+                result.hosts = self.hosts[index]
+                result.ports = self.ports[index]
+                return result
+            return self._select(range(len(self))[index], result)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("AddressBook index out of range")
+        return self._item(index)
+
+    def __iter__(self) -> Iterator[Address]:
+        names = self.names
+        for index, (value, port) in enumerate(zip(self.hosts, self.ports)):
+            if names and index in names:
+                yield (names[index], port or None)
+            else:
+                yield (int2ip(value), port or None)
+
+    def __contains__(self, address) -> bool:
+        host, port = address
+        if (value := ip2int(host)) is None:
+            return any(
+                name == host and (self.ports[i] or None) == port
+                for i, name in self.names.items()
+            )
+        port = port or 0
+        return any(
+            v == value and p == port and i not in self.names
+            for i, (v, p) in enumerate(zip(self.hosts, self.ports))
+        )
+
+    def __eq__(self, other):
+        if isinstance(other, AddressBook):
+            return (self.hosts, self.ports, self.names) == (
+                other.hosts,
+                other.ports,
+                other.names,
+            )
+        if isinstance(other, (list, tuple)):
+            return len(self) == len(other) and all(
+                a == tuple(b) for a, b in zip(self, other)
+            )
+        return NotImplemented
+
+    def __repr__(self):
+        return f"<AddressBook {len(self)} addresses>"
+
+
+@contextlib.contextmanager
+def _open(path: Path | str | io.StringIO) -> Iterator[IO[str]]:
+    # path, - for stdin (not closed on exit) or a text buffer (read from the
+    # start on each open, as a file)
+    if isinstance(path, io.StringIO):
+        yield io.StringIO(path.getvalue())
+        return
+    if str(path) == "-":
+        yield sys.stdin
+        return
+    with Path(path).open() as fp:
+        yield fp
+
+
+def _iter_csv_lines(fp: IO[str]) -> Iterator[str]:
+    for line in fp:
+        line = line.partition("#")[0]
+        if not line.strip():
+            continue
+        # for excel, an exception
+        if line.strip().lower() == "hostname":
+            continue
+        yield line
+
+
+def _iter_csv_intervals(
+    path: Path | str | io.StringIO, port: int | None, strict: bool, hosts_only: bool
+) -> Iterator[tuple[str, int | None, int | None, int | None]]:
+    excluded = AddressSet()
+    if str(path) != "-":
+        # a first pass for the exclusions, so they apply to the whole file
+        with _open(path) as fp:
+            for line in _iter_csv_lines(fp):
+                if "!" in line:
+                    for _ in _iter_intervals(line, None, ",", strict, False, excluded):
+                        pass
+
+    with _open(path) as fp:
+        lines = _iter_csv_lines(fp)
+        if str(path) == "-":
+            # no read ahead on stdin, the addresses are processed as they come
+            chunks: Iterator[str] = iter(lines)
+        else:
+            chunks = (",".join(chunk) for chunk in batched(lines, 1024))
+        for chunk in chunks:
+            yield from _iter_intervals(chunk, port, ",", strict, hosts_only, excluded)
+
+
+def iter_ips_from_csv(
+    path: Path | str | io.StringIO,
+    port: int | None = 4028,
+    strict: bool = False,
+    hosts_only: bool = False,
+) -> Iterator[tuple[str, int | None]]:
+    """
+    Stream ip addresses from a csv file, line by line.
+
+    Arguments:
+        path: a Path object to load data from (csv-like), - for stdin or
+            an io.StringIO
+        port: a fallback port if not defined
+        strict: abort with AddressParsingError if there's a malformed entry
+        hosts_only: skip the networks (CIDR) network and broadcast addresses
+
+    Raises:
+        AddressParsingError: if strict is set to True and there's a
+            malformed entry in path.
+
+    Notes:
+        The **strict** argument if set to False will ignore malformed
+        lines in csv. If set to True it will raise AddressParsingError on
+        invalid entries.
+
+    Example:
+        **foobar.csv** file::
+
+            # comment (or empty lines) will be ignored
+            127.0.0.1 # a single address
+            127.0.0.2-127.0.0.10 # a range of addresses
+
+            # you can specify a port
+            127.0.0.11:9999
+            127.0.0.12-127.0.0.20:8888
+
+            # a network, and exclusions (they apply to the whole file,
+            # reading from stdin only to the following lines)
+            10.1.0.0/16
+            !10.1.255.0/24
+
+        You can iterate over the (host, port) tuples as::
+
+           for ip in iter_ips_from_csv("foobar.csv"):
+               print(ip)
+
+           (127.0.0.1, 4028)
+           (127.0.0.2, 4028)
+           (127.0.0.3, 4028)
+           ...
+           (127.0.0.10, 4028)
+
+    """
+    for host, first, last, theport in _iter_csv_intervals(
+        path, port, strict, hosts_only
+    ):
+        if first is None or last is None:
+            yield (host, theport)
+            continue
+        for address in iter_hosts(first, last):
+            yield (address, theport)
 
 
 def load_ips_from_csv(
-    path: Path | str, port: int | None = 4028, strict: bool = False
-) -> list[tuple[str, int | None]]:
+    path: Path | str | io.StringIO,
+    port: int | None = 4028,
+    strict: bool = False,
+    hosts_only: bool = False,
+) -> AddressBook:
     """
     Load ip addresses from a csv file.
 
     Arguments:
-        path: a Path object to load data from (csv-like)
+        path: a Path object to load data from (csv-like), - for stdin or
+            an io.StringIO
         port: a fallback port if not defined
         strict: abort with AddressParsingError if there's a malformed entry
+        hosts_only: skip the networks (CIDR) network and broadcast addresses
 
     Raises:
         AddressParsingError: if strict is set to True and there's a
@@ -200,7 +881,11 @@ def load_ips_from_csv(
             127.0.0.11:9999
             127.0.0.12-127.0.0.20:8888
 
-        You can read into a list of (host, port) tuples as::
+            # a network, and exclusions (they apply to the whole file)
+            10.1.0.0/16
+            !10.1.255.0/24
+
+        You can read into an AddressBook (a list) of (host, port) tuples as::
 
            for ip in load_ips_from_csv("foobar.csv"):
                print(ip)
@@ -212,29 +897,101 @@ def load_ips_from_csv(
            (127.0.0.10, 4028)
 
     """
-    result = []
-    for line in Path(path).read_text().split("\n"):
-        line = line.partition("#")[0]
-        if not line.strip():
-            continue
-        # for excel, an exception
-        if line.strip().lower() == "hostname":
-            continue
-        for host, port2 in iter_ip_ranges(line, strict=strict):
-            result.append((host, port2 or port))
+    result = AddressBook()
+    for host, first, last, theport in _iter_csv_intervals(
+        path, port, strict, hosts_only
+    ):
+        if first is None or last is None:
+            result.append(host, theport)
+        else:
+            result._extend_range(first, last, theport)
     return result
 
 
+def _load_yaml_miners(path: Path | str | io.StringIO) -> tuple[str, int | None]:
+    # the miners addresses (as a single expression) and the default port
+    import yaml
+
+    # libyaml is way faster, if available
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    with _open(path) as fp:
+        try:
+            data = yaml.load(fp, Loader=loader)
+        except Exception as exc:
+            raise DataParsingError(f"cannot parse yaml file {path}") from exc
+
+    if isinstance(data, dict) and "addresses" in data.get("miners", {}):
+        miners = data["miners"]
+        # a single expression, so the exclusions apply to all the addresses
+        txt = ",".join(str(address) for address in miners["addresses"])
+        return txt, miners.get("luxos_port", None)
+
+    raise DataParsingError(f"cannot find miners definitions in {path}")
+
+
+def iter_ips_from_yaml(
+    path: Path | str | io.StringIO,
+    port: int | None = 4028,
+    strict: bool = False,
+    hosts_only: bool = False,
+) -> Iterator[tuple[str, int | None]]:
+    """
+    Iterate over the ip addresses in a yaml file (lazily expanded).
+
+    Arguments:
+        path: a Path object to load data from (yaml), - for stdin or an
+            io.StringIO
+        port: a fallback port if not defined
+        strict: abort with AddressParsingError if there's a malformed entry
+        hosts_only: skip the networks (CIDR) network and broadcast addresses
+
+    Raises:
+        AddressParsingError: if strict is set to True and
+            there's a malformed entry in path.
+
+    Notes:
+        The **strict** argument if set to False will ignore malformed
+        lines in csv. If set to True it will raise AddressParsingError on
+        invalid entries.
+
+    Example:
+        **foobar.yaml** file::
+
+            miners:
+                luxos_port: 9999  # default fallback port
+                addresses:
+                    - 127.0.0.1 # a single address
+                    - 127.0.0.2-127.0.0.10 # a range of addresses
+
+                    # you can specify a port
+                    - 127.0.0.11:9999
+                    - 127.0.0.12-127.0.0.20:8888
+
+                    # a network, and exclusions (for all the addresses)
+                    - 10.1.0.0/16
+                    - "!10.1.255.0/24"
+    """
+    txt, default_port = _load_yaml_miners(path)
+    yield from iter_ip_ranges(
+        txt, default_port or port, strict=strict, hosts_only=hosts_only
+    )
+
+
 def load_ips_from_yaml(
-    path: Path | str, port: int | None = 4028, strict: bool = False
-) -> list[tuple[str, int | None]]:
+    path: Path | str | io.StringIO,
+    port: int | None = 4028,
+    strict: bool = False,
+    hosts_only: bool = False,
+) -> AddressBook:
     """
     Load ip addresses from a yaml file.
 
     Arguments:
-        path: a Path object to load data from (csv-like)
+        path: a Path object to load data from (yaml), - for stdin or an
+            io.StringIO
         port: a fallback port if not defined
         strict: abort with AddressParsingError if there's a malformed entry
+        hosts_only: skip the networks (CIDR) network and broadcast addresses
 
     Raises:
         AddressParsingError: if strict is set to True and
@@ -257,22 +1014,165 @@ def load_ips_from_yaml(
                     # you can specify a port
                     - 127.0.0.11:9999
                     - 127.0.0.12-127.0.0.20:8888
+
+                    # a network, and exclusions (for all the addresses)
+                    - 10.1.0.0/16
+                    - "!10.1.255.0/24"
     """
-    from yaml import safe_load
+    txt, default_port = _load_yaml_miners(path)
+    return AddressBook.from_expr(
+        txt, default_port or port, strict=strict, hosts_only=hosts_only
+    )
+
+
+#: where the inventory caches are kept (None: next to the inventory file)
+CACHE_DIR: Path | None = None
+
+# magic, byteorder, flags, default port (-1 for None), inventory mtime_ns and
+# size, number of addresses, names size and the payload crc32
+_CACHE_HEADER = struct.Struct("<8scBxiqqIII")
+_CACHE_MAGIC = b"LUXIPS\x00\x01"
 
-    txt = Path(path).read_text()
+
+def cache_path(path: Path | str) -> Path:
+    """the compiled cache location for the path inventory (see CACHE_DIR)"""
+    path = Path(path).absolute()
+    if CACHE_DIR is None:
+        return path.with_name(f".{path.name}.ipcache")
+    digest = hashlib.sha1(str(path).encode()).hexdigest()[:16]
+    return CACHE_DIR / f"{digest}-{path.name}.ipcache"
+
+
+def _cache_flags(strict: bool, hosts_only: bool) -> int:
+    return int(strict) | int(hosts_only) << 1
+
+
+def save_cache(
+    book: AddressBook,
+    path: Path | str,
+    port: int | None = 4028,
+    strict: bool = False,
+    hosts_only: bool = False,
+) -> Path | None:
+    """saves book as the compiled cache of the path inventory
+
+    Returns:
+        the cache path, or None if it couldn't be written
+    """
+    stat = Path(path).stat()
+    names = json.dumps(book.names).encode()
+    payload = book.hosts.tobytes() + book.ports.tobytes() + names
+    header = _CACHE_HEADER.pack(
+        _CACHE_MAGIC,
+        sys.byteorder[0].encode(),
+        _cache_flags(strict, hosts_only),
+        -1 if port is None else port,
+        stat.st_mtime_ns,
+        stat.st_size,
+        len(book),
+        len(names),
+        zlib.crc32(payload),
+    )
+
+    dst = cache_path(path)
+    tmp = dst.with_name(f"{dst.name}.{os.getpid()}")
     try:
-        data = safe_load(txt)
-    except Exception as exc:
-        raise DataParsingError(f"cannot parse yaml file {path}") from exc
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_bytes(header + payload)
+        os.replace(tmp, dst)
+    except OSError as exc:
+        log.debug("cannot write the inventory cache %s: %s", dst, exc)
+        tmp.unlink(missing_ok=True)
+        return None
+    return dst
 
-    if "miners" in data and "addresses" in data["miners"]:
-        miners = data["miners"]
-        default_port = miners.get("luxos_port", None)
-        result = []
-        for address in data["miners"]["addresses"]:
-            for host, thisport in iter_ip_ranges(address, strict=strict):
-                result.append((host, thisport or default_port or port))
-        return result
 
-    raise DataParsingError(f"cannot find miners definitions in {path}")
+def load_cache(
+    path: Path | str,
+    port: int | None = 4028,
+    strict: bool = False,
+    hosts_only: bool = False,
+) -> AddressBook | None:
+    """the compiled path inventory, None if missing or stale
+
+    The cache is valid if it has been compiled with the same arguments
+    (port, strict, hosts_only) from an inventory with the same mtime and
+    size, and the payload checksum matches.
+    """
+    try:
+        stat = Path(path).stat()
+        data = cache_path(path).read_bytes()
+    except OSError:
+        return None
+    if len(data) < _CACHE_HEADER.size:
+        return None
+
+    magic, order, flags, theport, mtime, size, count, nsize, crc = (
+        _CACHE_HEADER.unpack_from(data)
+    )
+    if (magic, order, flags, theport, mtime, size) != (
+        _CACHE_MAGIC,
+        sys.byteorder[0].encode(),
+        _cache_flags(strict, hosts_only),
+        -1 if port is None else port,
+        stat.st_mtime_ns,
+        stat.st_size,
+    ):
+        return None
+
+    payload = memoryview(data)[_CACHE_HEADER.size :]
+    book = AddressBook()
+    hsize, psize = count * book.hosts.itemsize, count * book.ports.itemsize
+    if len(payload) != hsize + psize + nsize or zlib.crc32(payload) != crc:
+        log.debug("corrupted inventory cache for %s", path)
+        return None
+    book.hosts.frombytes(payload[:hsize])
+    book.ports.frombytes(payload[hsize : hsize + psize])
+    book.names = {int(k): v for k, v in json.loads(bytes(payload[-nsize:])).items()}
+    return book
+
+
+def load_ips(
+    path: Path | str,
+    port: int | None = 4028,
+    strict: bool = False,
+    hosts_only: bool = False,
+    cache: bool = True,
+) -> AddressBook:
+    """
+    Load ip addresses from a yaml or csv inventory, using the compiled cache.
+
+    On the first load the parsed addresses are saved as a compiled (binary)
+    cache (see cache_path), loaded in one read by the following calls until
+    the inventory changes (mtime or size).
+
+    Arguments:
+        path: a yaml or csv inventory, (see load_ips_from_yaml and
+            load_ips_from_csv), or - for stdin (never cached)
+        port: a fallback port if not defined
+        strict: abort with AddressParsingError if there's a malformed entry
+        hosts_only: skip the networks (CIDR) network and broadcast addresses
+        cache: use (and update) the compiled cache
+
+    Example:
+        the second call doesn't parse miners.csv::
+
+            book = load_ips("miners.csv")
+            assert load_ips("miners.csv") == book
+    """
+    source: Path | str | io.StringIO = path
+    if str(path) == "-":
+        # stdin is read once, for both the yaml and the csv attempts
+        source = io.StringIO(sys.stdin.read())
+        cache = False
+    if cache and (book := load_cache(path, port, strict, hosts_only)) is not None:
+        return book
+
+    try:
+        book = load_ips_from_yaml(source, port, strict, hosts_only)
+    except (RuntimeError, DataParsingError):
+        book = load_ips_from_csv(source, port, strict, hosts_only)
+
+    if cache:
+        save_cache(book, path, port, strict, hosts_only)
+    return book
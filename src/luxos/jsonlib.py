@@ -0,0 +1,346 @@
+"""json decoding backends for miner replies
+
+Miner replies are decoded straight from bytes using the fastest available
+library: `orjson <https://github.com/ijl/orjson>`_ or
+`msgspec <https://jcristharif.com/msgspec>`_ if installed, falling back to
+the stdlib :py:mod:`json` module.
+
+Example::
+
+    from luxos import jsonlib
+
+    jsonlib.loads(b'{"STATUS": [{"STATUS": "S"}], "id": 1}')
+
+    # force a backend (eg. the stdlib one)
+    jsonlib.set_backend("json")
+
+    # defer the parsing until a field is accessed
+    reply = jsonlib.LazyReply(data)
+    if reply.status == "S":
+        reply.write("reply.json")
+
+    # decode the CHIPS items as the data arrives
+    stream = jsonlib.ArrayStream("CHIPS")
+    for chunk in chunks:
+        for item in stream.feed(chunk):
+            ...
+    envelope = stream.close()  # the reply without the CHIPS items
+"""
+
+from __future__ import annotations
+
+import codecs
+import json
+import logging
+import re
+from pathlib import Path
+from typing import IO, Any, Callable, Iterator, Mapping
+
+log = logging.getLogger(__name__)
+
+#: backends in order of preference (the first available wins with "auto")
+PREFERENCE = ["orjson", "msgspec", "json"]
+
+#: the name of the backend in use
+BACKEND = ""
+
+
+def _orjson() -> Callable[[Any], Any]:
+    import orjson
+
+    return orjson.loads
+
+
+def _msgspec() -> Callable[[Any], Any]:
+    import msgspec
+
+    return msgspec.json.Decoder().decode
+
+
+def _json() -> Callable[[Any], Any]:
+    return json.loads
+
+
+LOADERS: dict[str, Callable[[], Callable[[Any], Any]]] = {
+    "orjson": _orjson,
+    "msgspec": _msgspec,
+    "json": _json,
+}
+
+_loads: Callable[[Any], Any] = json.loads
+
+
+def available() -> list[str]:
+    """returns the list of installed backends (in order of preference)"""
+    result = []
+    for name in PREFERENCE:
+        try:
+            LOADERS[name]()
+        except ModuleNotFoundError:
+            continue
+        result.append(name)
+    return result
+
+
+def set_backend(name: str | None = None) -> str:
+    """select the json backend used by :py:func:`loads`
+
+    Arguments:
+        name: one of the :py:data:`PREFERENCE` names, or "auto"/None
+              to pick the first available.
+
+    Returns:
+        the selected backend name
+
+    Raises:
+        ValueError: if the backend is unknown
+        ModuleNotFoundError: if the backend is not installed
+    """
+    global BACKEND, _loads
+
+    if name in {None, "", "auto"}:
+        name = available()[0]
+    if name not in LOADERS:
+        raise ValueError(f"unknown json backend '{name}' (one of {PREFERENCE})")
+    _loads = LOADERS[name]()
+    BACKEND = name
+    log.debug("using json backend '%s'", name)
+    return name
+
+
+def loads(data: bytes | bytearray | memoryview | str) -> Any:
+    """decode a json document (preferably bytes) using the current backend
+
+    Note:
+        fast backends are stricter than the stdlib (eg. NaN values are
+        rejected), so on failure we fall back to the stdlib json module.
+    """
+    try:
+        return _loads(data)
+    except Exception:
+        if BACKEND == "json":
+            raise
+        return json.loads(bytes(data) if isinstance(data, memoryview) else data)
+
+
+class LazyReply(Mapping[str, Any]):
+    """a miner reply wrapping the raw bytes, parsed on first field access
+
+    The STATUS and id fields are found with a cheap scan of the raw bytes,
+    so pass-through workloads (eg. check the status and store the reply)
+    never pay for the full parsing.
+
+    Example::
+
+        reply = LazyReply(b'{"STATUS": [{"STATUS": "S", ...}], "id": 1, ...}')
+        reply.status  -> "S" (no parsing)
+        reply["VERSION"]  -> parses the whole reply
+        reply.write(path)  -> writes the original bytes
+    """
+
+    __slots__ = ("raw", "_data")
+
+    STATUS_EXPR = re.compile(rb'"STATUS"\s*:\s*"(?P<value>[^"]*)"')
+    # the top level id, the last key in the miners replies (a nested id is
+    # followed by more closing brackets), searched in the reply tail
+    ID_EXPR = re.compile(rb'"id"\s*:\s*(?P<value>-?\d+)\s*}\s*$')
+    ID_TAIL = 64
+
+    def __init__(self, raw: bytes | bytearray | memoryview):
+        self.raw = bytes(raw)
+        self._data: dict[str, Any] | None = None
+
+    @property
+    def parsed(self) -> bool:
+        return self._data is not None
+
+    @property
+    def data(self) -> dict[str, Any]:
+        """the fully parsed reply"""
+        if self._data is None:
+            self._data = loads(self.raw)
+        return self._data
+
+    @property
+    def status(self) -> str | None:
+        """the STATUS/STATUS value (eg. "S" or "E") without parsing"""
+        if self._data is not None:
+            try:
+                return self._data["STATUS"][0]["STATUS"]
+            except (KeyError, IndexError, TypeError):
+                return None
+        match = self.STATUS_EXPR.search(self.raw)
+        return match["value"].decode() if match else None
+
+    @property
+    def id(self) -> int | None:
+        """the id value, without parsing if it's the last key (as usual)"""
+        if self._data is not None:
+            return self._data.get("id")
+        if match := self.ID_EXPR.search(self.raw, max(len(self.raw) - self.ID_TAIL, 0)):
+            return int(match["value"])
+        if b'"id"' not in self.raw:
+            return None
+        # somewhere else, or nested only
+        return self.data.get("id")
+
+    def write(self, dst: Path | str | IO[bytes]) -> None:
+        """write the original bytes to dst (a path or a binary file object)"""
+        if isinstance(dst, (str, Path)):
+            Path(dst).write_bytes(self.raw)
+        else:
+            dst.write(self.raw)
+
+    def __contains__(self, key: object) -> bool:
+        if self._data is None:
+            if key == "STATUS":
+                return self.status is not None
+            if key == "id":
+                return self.id is not None
+        return key in self.data
+
+    def __getitem__(self, key: str) -> Any:
+        return self.data[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.data)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {len(self.raw)} bytes status={self.status}>"
+
+
+class ArrayStream:
+    """incremental decoder of the items of a top level array in a reply
+
+    The reply bytes are fed as they arrive, and the items of the key
+    array (eg. "CHIPS" in the healthchipget reply) are decoded as soon as
+    they are complete: only the data not decoded yet is kept in memory.
+    The rest of the reply (the envelope, eg. STATUS and id) is small and
+    kept, with the key array left empty.
+
+    Example::
+
+        stream = ArrayStream("CHIPS")
+        stream.feed(b'{"CHIPS": [{"Chip": 0}, {"Ch')  -> [{"Chip": 0}]
+        stream.feed(b'ip": 1}], "id": 1}')  -> [{"Chip": 1}]
+        stream.close()  -> {"CHIPS": [], "id": 1}
+
+    Note:
+        the items are decoded with the stdlib json scanner (the only one
+        decoding from a position in a partial document).
+    """
+
+    # a (possibly unterminated) string or a structural char
+    TOKEN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*("?)|[{}\[\],]')
+    SPACE = re.compile(r"[ \t\n\r]*")
+
+    def __init__(self, key: str):
+        self.key = key
+        #: number of items decoded so far
+        self.count = 0
+        #: True once the key array is found
+        self.found = False
+
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._raw_decode = json.JSONDecoder().raw_decode
+        self._envelope: list[str] = []
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._expect_key = False
+        self._last_key: str | None = None
+        self._in_array = False
+
+    def feed(self, data: bytes | bytearray | memoryview) -> list[Any]:
+        """adds data to the reply, returning the items completed by it"""
+        items: list[Any] = []
+        buffer = self._buffer + self._decoder.decode(data)
+        pos = self._pos
+        while True:
+            if self._in_array:
+                pos = self.SPACE.match(buffer, pos).end()  # type: ignore
+                if pos >= len(buffer):
+                    break
+                char = buffer[pos]
+                if char == ",":
+                    pos += 1
+                    continue
+                if char == "]":
+                    # the envelope continues from "]"
+                    self._in_array = False
+                    self._depth -= 1
+                    buffer, pos = buffer[pos:], 1
+                    continue
+                try:
+                    item, end = self._raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    # the item is completed in the next chunks
+                    break
+                if end >= len(buffer):
+                    # eg. a number might continue in the next chunk
+                    break
+                items.append(item)
+                pos = end
+                continue
+
+            match = self.TOKEN.search(buffer, pos)
+            if match is None:
+                pos = len(buffer)
+                break
+            token = match[0]
+            if token[0] == '"':
+                if not match[1]:
+                    # the string ends in the next chunks
+                    pos = match.start()
+                    break
+                pos = match.end()
+                if self._depth == 1 and self._expect_key:
+                    self._last_key = json.loads(token) if "\\" in token else token[1:-1]
+                    self._expect_key = False
+                continue
+
+            pos = match.end()
+            if token in {"{", "["}:
+                self._depth += 1
+                if self._depth == 1:
+                    self._expect_key = token == "{"
+                elif (
+                    self._depth == 2
+                    and token == "["
+                    and not self.found
+                    and self._last_key == self.key
+                ):
+                    # the envelope gets "key": [, the items are not kept
+                    self.found = self._in_array = True
+                    self._envelope.append(buffer[:pos])
+                    buffer, pos = buffer[pos:], 0
+            elif token in {"}", "]"}:
+                self._depth -= 1
+            elif self._depth == 1:
+                self._expect_key = True
+
+        if self._in_array:
+            buffer, pos = buffer[pos:], 0
+        self._buffer, self._pos = buffer, pos
+        self.count += len(items)
+        return items
+
+    def close(self) -> dict[str, Any]:
+        """the reply envelope (with an empty key array)
+
+        Raises:
+            ValueError: if the reply is truncated or malformed
+        """
+        buffer = self._buffer + self._decoder.decode(b"", final=True)
+        if self._in_array or self._depth:
+            raise ValueError(f"truncated reply ({self.count} items decoded)")
+        result = loads("".join(self._envelope) + buffer)
+        if not isinstance(result, dict):
+            raise ValueError("the reply is not an object")
+        return result
+
+
+set_backend()
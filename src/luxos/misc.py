@@ -4,6 +4,7 @@ from __future__ import annotations
 import ipaddress
 import itertools
 import sys
+import traceback
 import types
 from pathlib import Path
 from typing import Generator
@@ -48,6 +49,86 @@ def iter_ip_ranges(
                 cur += 1
 
 
+#: maximum number of interned stacks (see format_traceback)
+TRACEBACKS_MAXSIZE = 1024
+_TRACEBACKS: dict[tuple, str] = {}
+
+_CAUSE = "\nThe above exception was the direct cause of the following exception:\n\n"
+_CONTEXT = "\nDuring handling of the above exception, another exception occurred:\n\n"
+
+
+def _iter_chain(exc: BaseException | None):
+    """yields (separator, exception) from the innermost cause to exc"""
+    chain = []
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if exc.__cause__ is not None:
+            chain.append((_CAUSE, exc))
+            exc = exc.__cause__
+        elif exc.__context__ is not None and not exc.__suppress_context__:
+            chain.append((_CONTEXT, exc))
+            exc = exc.__context__
+        else:
+            chain.append(("", exc))
+            exc = None
+    yield from reversed(chain)
+
+
+def _format_stack(exc: BaseException) -> str:
+    frames = traceback.walk_tb(exc.__traceback__)
+    key = tuple((frame.f_code, lineno) for frame, lineno in frames)
+    if (text := _TRACEBACKS.get(key)) is None:
+        if len(_TRACEBACKS) >= TRACEBACKS_MAXSIZE:
+            _TRACEBACKS.clear()
+        stack = traceback.TracebackException(
+            type(exc), exc, exc.__traceback__, lookup_lines=False
+        ).stack
+        text = "Traceback (most recent call last):\n" + "".join(stack.format())
+        _TRACEBACKS[key] = text
+    return text
+
+
+class FormattedTraceback(Exception):
+    """an already formatted traceback text, held as an exception
+
+    It keeps working the callers passing the traceback text (instead of
+    the exception) to the results, see :py:func:`format_traceback`.
+    """
+
+    def __init__(self, text: str):
+        super().__init__(text)
+        self.text = text
+
+
+def clear_frames(exc: BaseException) -> BaseException:
+    """release the local variables held by the exc traceback (and its chain)
+
+    This keeps the exception around cheaply: it can be formatted later,
+    using :py:func:`format_traceback`.
+    """
+    for _, item in _iter_chain(exc):
+        traceback.clear_frames(item.__traceback__)
+    return exc
+
+
+def format_traceback(exc: BaseException) -> str:
+    """format exc as traceback.format_exception, interning repeated stacks
+
+    Failures coming from the same code path (eg. thousands of connection
+    timeouts) share the same stack, formatted only once.
+    """
+    if isinstance(exc, FormattedTraceback):
+        return exc.text
+    result = []
+    for separator, item in _iter_chain(exc):
+        result.append(separator)
+        if item.__traceback__ is not None:
+            result.append(_format_stack(item))
+        result.extend(traceback.format_exception_only(type(item), item))
+    return "".join(result)
+
+
 def loadmod(path: Path) -> types.ModuleType:
     from importlib import util
 
@@ -0,0 +1,354 @@
+"""outgoing miners connections
+
+A sweep over a large fleet opens a few connections per miner (logon,
+command, logoff and the retries), that can fill the ephemeral ports range
+(and the TIME_WAIT table) of a single source address. Connections can be
+spread over a rotating set of local source addresses (and/or interfaces)
+with SOURCES, each keeping track of its connections.
+
+The socket options are set from the PROFILE socket profile (see PROFILES),
+eg. "sweep" resets the connections on close to avoid the TIME_WAIT buildup.
+
+With POOL set, asyncops keeps the connections open after the (NUL
+terminated) reply, and reuses them for the next commands to the same
+miner, unless the miner closes them (see ConnectionPool).
+
+Example::
+
+    from luxos import net
+
+    # eg. loopback aliases, or addresses on different interfaces
+    net.SOURCES = net.SourcePool(["127.0.0.2", "127.0.0.3", "10.0.0.5%eth1"])
+    net.PROFILE = net.PROFILES["sweep"]
+    ... run the commands
+    print("\\n".join(net.SOURCES.report()))
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import dataclasses as dc
+import errno
+import itertools
+import logging
+import socket
+import struct
+import sys
+import time
+from typing import Iterable, Iterator
+
+log = logging.getLogger(__name__)
+
+#: the source addresses for the connections (None: chosen by the os)
+SOURCES: SourcePool | None = None
+
+#: the persistent connections pool (None: a new connection for each command)
+POOL: ConnectionPool | None = None
+
+# defer the source port allocation to connect(), so a source address
+# port can be reused towards different miners (linux only)
+IP_BIND_ADDRESS_NO_PORT = getattr(
+    socket, "IP_BIND_ADDRESS_NO_PORT", 24 if sys.platform == "linux" else None
+)
+
+# bind a socket to an interface (linux only, None if not supported)
+SO_BINDTODEVICE = getattr(
+    socket, "SO_BINDTODEVICE", 25 if sys.platform == "linux" else None
+)
+
+# the SO_LINGER struct linger (onoff, seconds): u_short on windows
+LINGER_FORMAT = "HH" if sys.platform == "win32" else "ii"
+
+
+@dc.dataclass(frozen=True)
+class SocketProfile:
+    """the socket options for the miners connections
+
+    Options not available on the platform are skipped.
+    """
+
+    name: str
+    #: disable the Nagle algorithm (TCP_NODELAY), the commands are sent at once
+    nodelay: bool = False
+    #: SO_LINGER timeout, 0 resets the connection on close (no TIME_WAIT)
+    linger: int | None = None
+    #: ack the replies right away (TCP_QUICKACK, linux)
+    quickack: bool = False
+    #: SYN retransmissions before connect gives up (TCP_SYNCNT, linux)
+    syncnt: int | None = None
+
+    def apply(self, sock: socket.socket) -> None:
+        if self.nodelay:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.linger is not None:
+            sock.setsockopt(
+                socket.SOL_SOCKET,
+                socket.SO_LINGER,
+                struct.pack(LINGER_FORMAT, 1, self.linger),
+            )
+        if self.quickack and hasattr(socket, "TCP_QUICKACK"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+        if self.syncnt is not None and hasattr(socket, "TCP_SYNCNT"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_SYNCNT, self.syncnt)
+
+
+#: the available socket profiles
+PROFILES = {
+    # the os defaults
+    "default": SocketProfile("default"),
+    # lower latency
+    "fast": SocketProfile("fast", nodelay=True, quickack=True),
+    # large sweeps: no TIME_WAIT and fail fast on unreachable miners
+    "sweep": SocketProfile("sweep", nodelay=True, linger=0, quickack=True, syncnt=2),
+}
+
+#: the socket profile for the new connections
+PROFILE: SocketProfile = PROFILES["default"]
+
+
+@dc.dataclass
+class Source:
+    """a local source address and/or interface, with its connections count"""
+
+    address: str = ""
+    #: bind to the interface (SO_BINDTODEVICE, linux only needs CAP_NET_RAW)
+    device: str = ""
+    #: connections opened so far (each used a local port)
+    connections: int = 0
+    #: connections currently open (the local ports in use)
+    active: int = 0
+    #: connections failed to open
+    failures: int = 0
+
+    @classmethod
+    def parse(cls, txt: str) -> Source:
+        """a Source from ADDRESS, ADDRESS%DEVICE or %DEVICE"""
+        address, _, device = txt.strip().partition("%")
+        if not (address or device):
+            raise ValueError(f"invalid source '{txt}'")
+        if device and SO_BINDTODEVICE is None:
+            raise ValueError(
+                f"invalid source '{txt}': binding to an interface "
+                f"is not supported on {sys.platform}"
+            )
+        return cls(address, device)
+
+    def __str__(self) -> str:
+        return f"{self.address}%{self.device}" if self.device else self.address
+
+    def accepts(self, family: int) -> bool:
+        """True if the source can connect to the family addresses"""
+        return not self.address or address_family(self.address) == family
+
+    def bind(self, sock: socket.socket) -> None:
+        if self.device:
+            if SO_BINDTODEVICE is None:
+                raise OSError(
+                    errno.ENOPROTOOPT,
+                    f"cannot bind to {self.device}: not supported on {sys.platform}",
+                )
+            sock.setsockopt(socket.SOL_SOCKET, SO_BINDTODEVICE, self.device.encode())
+        if self.address:
+            if IP_BIND_ADDRESS_NO_PORT is not None:
+                sock.setsockopt(socket.IPPROTO_IP, IP_BIND_ADDRESS_NO_PORT, 1)
+            sock.bind((self.address, 0))
+
+
+class SourcePool:
+    """rotates the connections over a set of sources
+
+    Example::
+
+        pool = SourcePool(["127.0.0.2", "127.0.0.3"])
+        with pool.connection() as sock:
+            sock.connect((host, port))
+    """
+
+    def __init__(self, sources: Iterable[str | Source]):
+        self.sources = [
+            source if isinstance(source, Source) else Source.parse(source)
+            for source in sources
+        ]
+        if not self.sources:
+            raise ValueError("no sources")
+        self._cycle = itertools.cycle(self.sources)
+
+    def acquire(self, family: int | None = None) -> Source:
+        """the next source (accepting the family addresses, if given)
+
+        Raises:
+            OSError: (EAFNOSUPPORT) if no source accepts the family
+        """
+        for _ in self.sources:
+            source = next(self._cycle)
+            if family is None or source.accepts(family):
+                return source
+        name = "ipv6" if family == socket.AF_INET6 else "ipv4"
+        raise OSError(errno.EAFNOSUPPORT, f"no {name} source to connect from")
+
+    @contextlib.contextmanager
+    def connection(
+        self, blocking: bool = True, family: int = socket.AF_INET
+    ) -> Iterator[socket.socket]:
+        """a new socket (of family) bound to the next source, closed on exit
+
+        The sources of the other family are skipped.
+        """
+        source = self.acquire(family)
+        with socket.socket(family, socket.SOCK_STREAM) as sock:
+            sock.setblocking(blocking)
+            PROFILE.apply(sock)
+            try:
+                source.bind(sock)
+            except OSError:
+                source.failures += 1
+                raise
+            source.connections += 1
+            source.active += 1
+            try:
+                yield sock
+            finally:
+                source.active -= 1
+
+    def report(self) -> list[str]:
+        return [
+            f"{source}: {source.connections} connections, "
+            f"{source.active} active, {source.failures} failed"
+            for source in self.sources
+        ]
+
+
+def address_family(address: str) -> int:
+    """the socket family (AF_INET or AF_INET6) for an ip address"""
+    return socket.AF_INET6 if ":" in address else socket.AF_INET
+
+
+@contextlib.contextmanager
+def connection(
+    blocking: bool = True, family: int = socket.AF_INET
+) -> Iterator[socket.socket]:
+    """a new tcp socket (from SOURCES if set, with the PROFILE options)
+
+    The family is the one of the address to connect to (see
+    :py:func:`address_family`).
+    """
+    if SOURCES is not None:
+        with SOURCES.connection(blocking, family) as sock:
+            yield sock
+        return
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        sock.setblocking(blocking)
+        PROFILE.apply(sock)
+        yield sock
+
+
+@dc.dataclass
+class Connection:
+    """an open asyncio connection, holding its socket (see connection)"""
+
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+    stack: contextlib.ExitStack
+    loop: asyncio.AbstractEventLoop = dc.field(default_factory=asyncio.get_running_loop)
+    #: last time (monotonic) the connection was released
+    released: float = 0.0
+
+    @property
+    def alive(self) -> bool:
+        return (
+            self.loop is asyncio.get_running_loop()
+            and not self.reader.at_eof()
+            and not self.writer.is_closing()
+        )
+
+    def close(self) -> None:
+        # the loop might be closed already
+        with contextlib.suppress(RuntimeError):
+            self.writer.close()
+        self.stack.close()
+
+
+class ConnectionPool:
+    """keeps the idle connections by miner, for reuse
+
+    A miner keeping the connection open after a reply is detected on
+    the first reuse: miners closing it are marked as not capable, and
+    get a new connection for each command from then on.
+
+    Example::
+
+        conn = pool.acquire(host, port) or await new_connection(host, port)
+        ... send the command and read the reply
+        pool.release(host, port, conn)
+    """
+
+    def __init__(self, maxsize: int = 2, idle: float = 30.0):
+        self.maxsize = maxsize
+        self.idle = idle
+        #: (host, port) -> the idle connections
+        self.connections: dict[tuple[str, int], list[Connection]] = {}
+        #: (host, port) -> True if the miner keeps the connections open
+        self.capable: dict[tuple[str, int], bool] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def acquire(self, host: str, port: int) -> Connection | None:
+        """an idle connection to host:port, if any"""
+        key = (host, port)
+        idle = self.connections.get(key, [])
+        while idle:
+            conn = idle.pop()
+            if conn.alive and (time.monotonic() - conn.released) < self.idle:
+                self.hits += 1
+                return conn
+            if conn.reader.at_eof():
+                # closed by the miner after the reply
+                self.capable[key] = False
+            conn.close()
+        self.misses += 1
+        return None
+
+    def release(self, host: str, port: int, conn: Connection) -> None:
+        """returns conn to the pool (or closes it)"""
+        key = (host, port)
+        idle = self.connections.setdefault(key, [])
+        if self.capable.get(key) is False or len(idle) >= self.maxsize:
+            conn.close()
+            return
+        conn.released = time.monotonic()
+        idle.append(conn)
+
+    def mark(self, host: str, port: int, capable: bool) -> None:
+        """records if host:port keeps the connections open"""
+        self.capable[(host, port)] = capable
+
+    def close(self) -> None:
+        for idle in self.connections.values():
+            for conn in idle:
+                conn.close()
+        self.connections.clear()
+
+    def report(self) -> list[str]:
+        total = self.hits + self.misses
+        capable = sum(self.capable.values())
+        return [
+            f"connections pool: {self.hits} hits, {self.misses} misses "
+            f"({(self.hits / total if total else 0):.0%} hit rate), "
+            f"{capable} miners keeping the connections open, "
+            f"{len(self.capable) - capable} not"
+        ]
+
+
+@contextlib.contextmanager
+def keep_alive(maxsize: int = 2) -> Iterator[ConnectionPool]:
+    """reuses the miners connections (as POOL), logging the hits/misses on exit"""
+    global POOL
+    pool = ConnectionPool(maxsize=maxsize)
+    previous, POOL = POOL, pool
+    try:
+        yield pool
+    finally:
+        POOL = previous
+        pool.close()
+        log.info("\n".join(pool.report()))
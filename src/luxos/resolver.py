@@ -0,0 +1,198 @@
+"""process-wide cache for the miners hostnames resolution
+
+Miners addressed by name would be resolved again (through the default
+thread-pool resolver) on every connection and retry: here each name is
+resolved once, and the address kept for TTL seconds (the stdlib resolver
+doesn't expose the records TTL, so this is a fixed value). Failures are
+cached for NEGATIVE_TTL seconds, and reported as MinerResolutionError.
+
+Example::
+
+    from luxos import resolver
+
+    # resolve all the names in bulk, before starting
+    failures = await resolver.prefetch(["miner1.local", "miner2.local"])
+
+    address = await resolver.aresolve("miner1.local", 4028)  # cached
+
+Note:
+    ip addresses (ipv4 or ipv6) are returned as they are, names resolve to
+    the first getaddrinfo address of any family (the system preferred one).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import socket
+import time
+from typing import Any, Iterable, Sequence
+
+from . import exceptions, ips, tracing
+
+log = logging.getLogger(__name__)
+
+#: for how long (s) a resolved address is reused
+TTL = 300.0
+#: for how long (s) a resolution failure is reused
+NEGATIVE_TTL = 5.0
+#: max number of concurrent lookups in prefetch
+CONCURRENCY = 32
+
+
+def is_address(host: str) -> bool:
+    """True if host is an ip address (ipv4, or ipv6 as names have no ':')"""
+    return ips.ip2int(host) is not None or ":" in host
+
+
+class Resolver:
+    """caches the hostname -> ip address resolutions
+
+    Concurrent lookups of the same name (in the same loop) share a single
+    getaddrinfo call.
+    """
+
+    def __init__(self) -> None:
+        # host -> (expiry, address or the failure)
+        self.cache: dict[str, tuple[float, str | OSError]] = {}
+        self.hits = 0
+        self.misses = 0
+        self._inflight: dict[tuple[Any, str], asyncio.Future[str | OSError]] = {}
+
+    def clear(self) -> None:
+        self.cache.clear()
+        self.hits = self.misses = 0
+
+    def _cached(self, host: str, port: int) -> str | None:
+        if (item := self.cache.get(host)) is None:
+            return None
+        expiry, value = item
+        if expiry < time.monotonic():
+            del self.cache[host]
+            return None
+        self.hits += 1
+        if isinstance(value, OSError):
+            raise exceptions.MinerResolutionError(host, port) from value
+        return value
+
+    def _store(self, host: str, port: int, value: str | OSError) -> str:
+        self.misses += 1
+        ttl = NEGATIVE_TTL if isinstance(value, OSError) else TTL
+        self.cache[host] = (time.monotonic() + ttl, value)
+        if isinstance(value, OSError):
+            raise exceptions.MinerResolutionError(host, port) from value
+        return value
+
+    def resolve(self, host: str, port: int) -> str:
+        """the host ip address (blocking)
+
+        Raises:
+            MinerResolutionError: if host cannot be resolved
+        """
+        if is_address(host):
+            return host
+        if (address := self._cached(host, port)) is not None:
+            return address
+
+        value: str | OSError
+        with tracing.span("resolve", host, port):
+            try:
+                infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+                value = str(infos[0][4][0])
+            except OSError as exc:
+                value = exc
+        return self._store(host, port, value)
+
+    async def aresolve(self, host: str, port: int) -> str:
+        """the host ip address
+
+        Raises:
+            MinerResolutionError: if host cannot be resolved
+        """
+        if is_address(host):
+            return host
+        if (address := self._cached(host, port)) is not None:
+            return address
+
+        loop = asyncio.get_running_loop()
+        key = (loop, host)
+        if (future := self._inflight.get(key)) is not None:
+            value = await asyncio.shield(future)
+            self.hits += 1
+            if isinstance(value, OSError):
+                raise exceptions.MinerResolutionError(host, port) from value
+            return value
+
+        self._inflight[key] = future = loop.create_future()
+        try:
+            with tracing.span("resolve", host, port):
+                try:
+                    infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+                    value = str(infos[0][4][0])
+                except OSError as exc:
+                    value = exc
+            future.set_result(value)
+        except BaseException:
+            # eg. cancelled, the waiters are cancelled too
+            future.cancel()
+            raise
+        finally:
+            del self._inflight[key]
+        return self._store(host, port, value)
+
+    async def prefetch(
+        self, hosts: Iterable[str], port: int = 4028
+    ) -> dict[str, exceptions.MinerResolutionError]:
+        """resolves the hosts names concurrently (CONCURRENCY at most)
+
+        Returns:
+            the failed hosts with their MinerResolutionError
+        """
+        semaphore = asyncio.Semaphore(CONCURRENCY)
+        failures: dict[str, exceptions.MinerResolutionError] = {}
+
+        async def lookup(host: str):
+            async with semaphore:
+                try:
+                    await self.aresolve(host, port)
+                except exceptions.MinerResolutionError as exc:
+                    failures[host] = exc
+
+        await asyncio.gather(*(lookup(host) for host in set(hosts)))
+        return failures
+
+
+#: the process-wide resolver
+RESOLVER = Resolver()
+
+
+def resolve(host: str, port: int) -> str:
+    """the host ip address, using the process-wide cache (blocking)"""
+    return RESOLVER.resolve(host, port)
+
+
+async def aresolve(host: str, port: int) -> str:
+    """the host ip address, using the process-wide cache"""
+    return await RESOLVER.aresolve(host, port)
+
+
+async def prefetch(
+    hosts: Iterable[str], port: int = 4028
+) -> dict[str, exceptions.MinerResolutionError]:
+    """resolves the hosts in bulk in the process-wide cache"""
+    return await RESOLVER.prefetch(hosts, port)
+
+
+def hostnames(addresses: Iterable[tuple[str, Any]]) -> set[str]:
+    """the hostnames (not ip addresses) in addresses
+
+    Lazy iterables (eg. a stdin stream) are not consumed, and return
+    an empty set: their names are resolved on connection.
+    """
+    if isinstance(addresses, ips.AddressBook):
+        return set(addresses.names.values())
+    if isinstance(addresses, ips.AddressSet):
+        return {host for names in addresses._names.values() for host in names}
+    if isinstance(addresses, Sequence):
+        return {host for host, _ in addresses if not is_address(host)}
+    return set()
@@ -3,27 +3,51 @@ from __future__ import annotations
 import asyncio
 import dataclasses as dc
 import json
-import traceback
 from typing import Any
 
 from .. import asyncops, misc, text
 
 
-@dc.dataclass
+@dc.dataclass(init=False)
 class Result:
     host: str
     port: int
-    tback: str = ""
+    exception: BaseException | None = dc.field(default=None, repr=False)
     value: Any = None
 
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        exception: BaseException | str | None = None,
+        value: Any = None,
+        tback: str = "",
+    ):
+        self.host = host
+        self.port = port
+        # the formatted traceback (the older signature) is kept as exception
+        if isinstance(exception, str):
+            tback = exception
+            exception = None
+        if exception is None and tback:
+            exception = misc.FormattedTraceback(tback)
+        self.exception = exception
+        self.value = value
+
+    @property
+    def tback(self) -> str:
+        if self.exception is None:
+            return ""
+        if isinstance(self.exception, asyncio.TimeoutError):
+            return "timeout error"
+        return misc.format_traceback(self.exception)
+
 
 async def wrapper(fn, host: str, port: int, *args, **kwargs) -> Result:
     try:
         return Result(host, port, value=await fn(host, port, *args, **kwargs))
-    except asyncio.TimeoutError:
-        return Result(host, port, tback="timeout error")
-    except Exception:
-        return Result(host, port, tback="".join(traceback.format_exc()))
+    except Exception as exc:
+        return Result(host, port, exception=misc.clear_frames(exc))
 
 
 async def run(
@@ -47,8 +71,8 @@ async def run(
             await asyncio.sleep(delay)
 
     alltasks = [task for group in result.values() for task in group]
-    successes = [task for task in alltasks if not task.tback]
-    failures = [task for task in alltasks if task.tback]
+    successes = [task for task in alltasks if task.exception is None]
+    failures = [task for task in alltasks if task.exception is not None]
 
     # print a nice report
     if details == "json":
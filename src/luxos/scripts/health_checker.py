@@ -11,6 +11,7 @@ import json
 import threading
 import asyncio
 from datetime import datetime
+from pathlib import Path
 from typing import Any
 
 from tqdm.asyncio import tqdm as async_tqdm
@@ -19,7 +20,9 @@ import shutil
 import yaml
 import pandas as pd
 
+from luxos import commands, fingerprint
 from luxos.api import logon_required
+from luxos.exceptions import MinerMessageReplyError
 
 from luxos.scripts.luxos import (generate_ip_range,
                    add_session_id_parameter, parameters_to_string,
@@ -50,6 +53,9 @@ INTERMEDIATE_CSV = "report_in_progress.csv"
 
 LUXOS_MINERS = []
 
+# the miners firmware/model/version, to skip the probes on the next sweeps
+FINGERPRINTS = fingerprint.FingerprintStore()
+
 log = logging.getLogger(__name__)
 
 
@@ -77,6 +83,7 @@ def parse_args():
     args.port = config['luxos']['port']
     args.port = config['luxos']['port']
     args.sleep_between_executions = config['sleep_between_executions']
+    args.fingerprints = config.get('fingerprints')
     args.db_host = config['database']['host']
     args.db_port = config['database']['port']
     args.db_database = config['database']['name']
@@ -132,18 +139,10 @@ def load_ip_list_from_csv(csv_file):
     return df['hostname'].dropna().tolist()
 
 
-def get_value_with_default(dictionary, key, default=0):
-    """
-    Retrieve a value from a dictionary for the given key.
-    If the key is not present or the value is None, return the default value.
-    """
-    return dictionary.get(
-        key, default) if dictionary.get(key) is not None else default
-
-
 async def internal_send_cgminer_command(host: str, port: int, command: str,
                                         timeout_sec: int,
-                                        verbose: bool) -> dict[str, Any]:
+                                        verbose: bool,
+                                        raw: bool = False) -> dict[str, Any] | bytes:
     writer = None
     try:
         reader, writer = await asyncio.wait_for(asyncio.open_connection(
@@ -163,6 +162,11 @@ async def internal_send_cgminer_command(host: str, port: int, command: str,
                 break
             response += data
 
+        if raw:
+            # left to commands.decode (msgspec), straight into the structs
+            if verbose:
+                logging.info(response)
+            return bytes(response)
         r = json.loads(response.decode())
         if verbose:
             logging.info(r)
@@ -181,14 +185,15 @@ async def internal_send_cgminer_command(host: str, port: int, command: str,
 
 
 async def send_cgminer_command(host: str, port: int, cmd: str, param: str,
-                               timeout_sec: int, verbose: bool) -> dict[str, Any]:
+                               timeout_sec: int, verbose: bool,
+                               raw: bool = False) -> dict[str, Any] | bytes:
     req = str(f"{{\"command\": \"{cmd}\", \"parameter\": \"{param}\"}}\n")
     if verbose:
         logging.info(
             f"Executing command: {cmd} with params: {param} to host: {host}")
 
     return await internal_send_cgminer_command(host, port, req, timeout_sec,
-                                               verbose)
+                                               verbose, raw)
 
 
 async def send_cgminer_simple_command(host: str, port: int, cmd: str,
@@ -212,7 +217,7 @@ async def logon(host: str, port: int, timeout: int, verbose: bool) -> str:
 
 
 async def execute_command(host: str, port: int, timeout_sec: int, cmd: str,
-                          parameters: list, verbose: bool):
+                          parameters: list, verbose: bool, raw: bool = False):
     try:
         logon_req = logon_required(cmd)
         if logon_req:
@@ -230,7 +235,7 @@ async def execute_command(host: str, port: int, timeout_sec: int, cmd: str,
         if verbose:
             logging.info(f"{cmd} on {host} with parameters: {param_string}")
         res = await send_cgminer_command(host, port, cmd, param_string,
-                                         timeout_sec, verbose)
+                                         timeout_sec, verbose, raw)
 
         if verbose:
             logging.info(res)
@@ -243,27 +248,37 @@ async def execute_command(host: str, port: int, timeout_sec: int, cmd: str,
         logging.error(f"Error executing {cmd} on {host}: {e}")
 
 
+def decode_items(cmd, res):
+    """the items of a (raw) reply as luxos.commands structs ([] if not valid)"""
+    try:
+        items = commands.decode(cmd, res)
+    except MinerMessageReplyError as e:
+        logging.debug(f"Invalid {cmd} reply: {e}")
+        return []
+    return items if isinstance(items, list) else [items]
+
+
 def parse_devs(json):
+    all_boards = decode_items('devs', json)
     devs_data = {
         'alive_board_count': 0,
         '5m_hr': 0,
-        'elapsed': json.get('DEVS', [{}])[0].get('Device Elapsed', 0) / 60,
+        'elapsed': (all_boards[0].elapsed if all_boards else 0) / 60,
         'boards': []
     }
 
-    all_boards = json.get('DEVS', [])
     for i in range(3):
-        board = all_boards[i] if i < len(all_boards) else {}
+        board = all_boards[i] if i < len(all_boards) else None
 
         board_data = {
-            '5m_hr': get_value_with_default(board, 'MHS 5m', 0) / 1e6,
-            'temperature': board.get('Temperature', 0),
-            'profile': board.get('Profile', 'Unknown')
+            '5m_hr': (board and board.mhs_5m or 0) / 1e6,
+            'temperature': board.temperature if board else 0,
+            'profile': (board.profile if board else '') or 'Unknown'
         }
 
         devs_data['boards'].append(board_data)
 
-        if board.get('Status') == 'Alive':
+        if board and board.status == 'Alive':
             devs_data['alive_board_count'] += 1
             devs_data['5m_hr'] += board_data['5m_hr']
 
@@ -285,8 +300,8 @@ def parse_board(fgpabuildhex, fpgabuildidstr):
 def parse_healthchip(healthchipget):
     try:
         unhealthy_count = 0
-        for chip in healthchipget.get("CHIPS", []):
-            if chip.get("Healthy") == "N":
+        for chip in decode_items('healthchipget', healthchipget):
+            if chip.healthy == "N":
                 unhealthy_count += 1
 
         healthy = unhealthy_count == 0
@@ -302,30 +317,27 @@ def parse_healthchip(healthchipget):
 
 
 def parse_config(json):
-    json = json.get('CONFIG', [{}])[0]
+    items = decode_items('config', json)
+    config = items[0] if items else commands.Config()
 
-    fgpabuildhex = json.get('FPGABuildIdHex', '')
-    fpgabuildidstr = json.get('FPGABuildIdStr', '')
-    if fgpabuildhex:
-        board = parse_board(fgpabuildhex, fpgabuildidstr)
+    board = 'Unknown'
+    if config.fpga_build_hex:
+        board = parse_board(config.fpga_build_hex, config.fpga_build_str)
 
     config_data = {
-        'is_atm_enabled': json.get('IsAtmEnabled', False),
-        'model': json.get('Model', 'Unknown'),
-        'mac_addr': json.get('MACAddr', 'Unknown'),
-        'os': json.get('OS', 'Unknown'),
+        'is_atm_enabled': config.atm_enabled,
+        'model': config.model or 'Unknown',
+        'mac_addr': config.mac or 'Unknown',
+        'os': config.os or 'Unknown',
         'board': board
     }
     return config_data
 
 
 def parse_version(json):
-    try:
-        luxminer_version = json.get('VERSION',
-                                    [{}])[0].get('LUXminer', 'Unknown')
-    except Exception:
-        luxminer_version = 'Unknown'
-    return {'version': luxminer_version}
+    items = decode_items('version', json)
+    luxminer_version = items[0].luxminer if items else ''
+    return {'version': luxminer_version or 'Unknown'}
 
 
 def parse_stats(json):
@@ -336,23 +348,17 @@ def parse_stats(json):
 
 def parse_pools(json):
     pool_data = {}
-    pools = json.get('POOLS', [{}])
+    pools = decode_items('pools', json)
 
-    try:
-        pool_data['pool_user'] = pools[0].get('User', '')
-    except Exception:
-        pool_data['pool_user'] = ''
+    pool_data['pool_user'] = pools[0].user if pools else ''
 
     for pool_id in range(3):
         try:
             pool = pools[pool_id]
-            pool_data[f'diff_accept_{pool_id}'] = pool.get(
-                'Difficulty Accepted', 'Unknown')
-            pool_data[f'diff_reject_{pool_id}'] = pool.get(
-                'Difficulty Rejected', 'Unknown')
-            pool_data[f'diff_stale_{pool_id}'] = pool.get(
-                'Difficulty Stale', 'Unknown')
-        except Exception:
+            pool_data[f'diff_accept_{pool_id}'] = pool.diff_accepted
+            pool_data[f'diff_reject_{pool_id}'] = pool.diff_rejected
+            pool_data[f'diff_stale_{pool_id}'] = pool.diff_stale
+        except IndexError:
             pool_data[f'diff_accept_{pool_id}'] = 'Pool_ID out of range.'
             pool_data[f'diff_reject_{pool_id}'] = 'Pool_ID out of range.'
             pool_data[f'diff_stale_{pool_id}'] = 'Pool_ID out of range.'
@@ -548,11 +554,13 @@ async def handle_db_row(row, lock, buffer, pool, table_name):
     await append_to_buffer_and_check(buffer, row, lock, pool, table_name)
 
 
-async def execute_with_retries(ip, port, timeout, command_name, verbose):
+async def execute_with_retries(ip, port, timeout, command_name, verbose,
+                               raw=False):
+    """raw returns the reply bytes, to decode with the parse_* functions"""
     for retry in range(1, MAX_RETRIES + 1):
         result = await execute_command(ip, port, timeout * retry, command_name,
-                                       '', verbose)
-        if result and isinstance(result, dict):
+                                       '', verbose, raw)
+        if result and isinstance(result, (dict, bytes)):
             return result
         logging.warning(
             f"Attempt {retry} failed for {ip}, command {command_name}. Retrying..."
@@ -563,8 +571,9 @@ async def execute_with_retries(ip, port, timeout, command_name, verbose):
 async def handle_devs_and_config(ip, res_devs, args, lock, buffer,
                                  handle_row_func, extra_arg):
     devs = parse_devs(res_devs)
+    elapsed = devs['elapsed'] * 60
     res_config = await execute_with_retries(ip, args.port, args.timeout,
-                                            'config', args.verbose)
+                                            'config', args.verbose, raw=True)
     if not res_config:
         logging.warning(
             f"Failed to get config for {ip} after {MAX_RETRIES} attempts. Skipping."
@@ -573,7 +582,7 @@ async def handle_devs_and_config(ip, res_devs, args, lock, buffer,
     config = parse_config(res_config)
 
     res_pools = await execute_with_retries(ip, args.port, args.timeout,
-                                           'pools', args.verbose)
+                                           'pools', args.verbose, raw=True)
 
     if not res_pools:
         logging.warning(
@@ -581,18 +590,29 @@ async def handle_devs_and_config(ip, res_devs, args, lock, buffer,
         )
         return
 
-    res_version = await execute_with_retries(ip, args.port, args.timeout,
-                                             'version', args.verbose)
+    # the version holds until the miner reboots (or it's another miner)
+    known = FINGERPRINTS.check(ip, args.port, elapsed, config['mac_addr'])
+    if known and known.family == fingerprint.LUXOS and known.version:
+        version = {'version': known.version}
+    else:
+        res_version = await execute_with_retries(ip, args.port, args.timeout,
+                                                 'version', args.verbose,
+                                                 raw=True)
 
-    if not res_version:
-        logging.warning(
-            f"Failed to get version for {ip} after {MAX_RETRIES} attempts. Skipping."
-        )
-        return
+        if not res_version:
+            logging.warning(
+                f"Failed to get version for {ip} after {MAX_RETRIES} attempts. Skipping."
+            )
+            return
+        version = parse_version(res_version)
+        FINGERPRINTS.update(
+            fingerprint.Fingerprint(ip, args.port, fingerprint.LUXOS,
+                                    config['model'], version['version'],
+                                    config['mac_addr'], elapsed))
 
     res_healthchipget = await execute_with_retries(ip, args.port, args.timeout,
                                                    'healthchipget',
-                                                   args.verbose)
+                                                   args.verbose, raw=True)
 
     if not res_healthchipget:
         logging.warning(
@@ -601,35 +621,54 @@ async def handle_devs_and_config(ip, res_devs, args, lock, buffer,
         return
 
     healthchipget = parse_healthchip(res_healthchipget)
-    version = parse_version(res_version)
     pools = parse_pools(res_pools)
     new_row = generate_row(ip, devs, config, pools, version, healthchipget)
     await handle_row_func(new_row, lock, buffer, extra_arg, args.db_table_name)
 
 
 async def handle_status_and_stats(ip, args, lock, buffer, handle_row_func,
-                                  extra_arg):
-    res_bitmain = await execute_with_retries(ip, args.port, args.timeout,
-                                             'stats', args.verbose)
+                                  extra_arg, known=None, res_bitmain=None):
+    """returns (False, the stats reply) if the known stock fingerprint is not
+    valid anymore, or a request failed: the miner is probed again with devs
+    (reusing the stats reply), as for the unknown miners"""
+    if res_bitmain is None:
+        res_bitmain = await execute_with_retries(ip, args.port, args.timeout,
+                                                 'stats', args.verbose)
     if not res_bitmain:
         logging.warning(
             f"Failed to get stats for {ip} after {MAX_RETRIES} attempts. Skipping."
         )
-        return
+        if known:
+            FINGERPRINTS.drop(ip, args.port)
+            return False, None
+        return True, None
+
+    stats = parse_bitmain_stats(res_bitmain)
+    elapsed = stats['Elapsed'] * 60
+    if known and not FINGERPRINTS.check(ip, args.port, elapsed):
+        # rebooted, maybe with a new firmware
+        return False, res_bitmain
+    if not known:
+        FINGERPRINTS.update(
+            fingerprint.Fingerprint(ip, args.port, fingerprint.STOCK,
+                                    stats['model'], elapsed=elapsed))
 
     res_pools = await execute_with_retries(ip, args.port, args.timeout,
-                                           'pools', args.verbose)
+                                           'pools', args.verbose, raw=True)
     if not res_pools:
         logging.warning(
             f"Failed to get pools for {ip} after {MAX_RETRIES} attempts. Skipping."
         )
-        return
+        if known:
+            FINGERPRINTS.drop(ip, args.port)
+            return False, res_bitmain
+        return True, res_bitmain
 
     pools = parse_pools(res_pools)
 
-    stats = parse_bitmain_stats(res_bitmain)
     new_row = generate_bitmain_row(ip, stats, pools)
     await handle_row_func(new_row, lock, buffer, extra_arg, args.db_table_name)
+    return True, res_bitmain
 
 
 async def handle_unknown_response(ip, args, res_devs, lock, buffer,
@@ -647,8 +686,18 @@ async def healthcheck(ip,
                       sem,
                       extra_arg=None):
     async with sem:
+        # known stock miners skip the devs probe (unless they fail, or
+        # the fingerprint expired)
+        res_bitmain = None
+        known = FINGERPRINTS.get(ip, args.port)
+        if known and known.family == fingerprint.STOCK:
+            handled, res_bitmain = await handle_status_and_stats(
+                ip, args, lock, buffer, handle_row_func, extra_arg, known)
+            if handled:
+                return
+
         res_devs = await execute_with_retries(ip, args.port, args.timeout,
-                                              'devs', args.verbose)
+                                              'devs', args.verbose, raw=True)
         if not res_devs:
             logging.warning(
                 f"Failed to get a response for {ip} after {MAX_RETRIES} attempts. Skipping."
@@ -658,18 +707,19 @@ async def healthcheck(ip,
                                   args.db_table_name)
             return
 
-        keys = list(res_devs.keys())
+        family = fingerprint.family(res_devs)
 
-        if keys == ['DEVS', 'STATUS', 'id']:
+        if family == fingerprint.LUXOS:
             await handle_devs_and_config(ip, res_devs, args, lock, buffer,
                                          handle_row_func, extra_arg)
 
             if args.executeconfigs == 'True':
                 async with lock:
                     LUXOS_MINERS.append(ip)
-        elif keys == ['STATUS', 'DEVS', 'id']:
+        elif family == fingerprint.STOCK:
             await handle_status_and_stats(ip, args, lock, buffer,
-                                          handle_row_func, extra_arg)
+                                          handle_row_func, extra_arg,
+                                          res_bitmain=res_bitmain)
 
         else:
             await handle_unknown_response(ip, args, res_devs, lock, buffer,
@@ -776,6 +826,8 @@ async def main_loop(ip_list, args, lock, sem, buffer, db_config):
         end_time_healthcheck = time.time()
         execution_time_healthcheck = end_time_healthcheck - start_time_healthcheck
         logging.info("Finished performing HealthCheck on all hosts.")
+        FINGERPRINTS.save()
+        logging.info("\n".join(FINGERPRINTS.report()))
         logging.info(
             f"Execution time for Health Check: {execution_time_healthcheck:.2f} seconds."
         )
@@ -832,6 +884,9 @@ async def run():
             'port': args.db_port
         }
 
+        FINGERPRINTS.path = Path(args.fingerprints) if args.fingerprints else None
+        FINGERPRINTS.load()
+
         lock = asyncio.Lock()
         sem = asyncio.Semaphore(args.max_threads)
         buffer = []
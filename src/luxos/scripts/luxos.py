@@ -88,31 +88,29 @@ def add_arguments(parser: cli.LuxosParserBase) -> None:
 def process_args(args: argparse.Namespace):
 
     def process_addresses():  # yes, it is pretty long
-        from luxos.ips import iter_ip_ranges, load_ips_from_csv
+        from luxos.ips import AddressSet, load_ips_from_csv
 
-        args.addresses = [
-            address for addresses in (args.addresses or []) for address in addresses
-        ]
+        addresses = AddressSet()
+        for group in args.addresses or []:
+            addresses.update(group)
 
         # old way
         if args.range_start and args.range_end:
-            args.addresses.extend(
-                iter_ip_ranges(f"{args.range_start}-{args.range_end}")
+            addresses.update(
+                AddressSet.from_expr(f"{args.range_start}-{args.range_end}")
             )
         elif args.range_start:
-            args.addresses.append((args.range_start, None))
+            addresses.add(args.range_start)
         elif args.range_end:
             args.error("--range_end requires --range_start")
 
         if args.ipfile:
             if args.ipfile.exists():
-                args.addresses.extend(load_ips_from_csv(args.ipfile))
+                addresses.update(load_ips_from_csv(args.ipfile))
             else:
                 args.error(f"file not found {args.ipfile}")
 
-        args.addresses = [
-            (host, port or args.luxos_port) for host, port in args.addresses
-        ]
+        args.addresses = addresses.with_port(args.luxos_port)
 
     process_addresses()
     if not args.addresses:
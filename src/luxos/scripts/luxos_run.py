@@ -99,12 +99,18 @@ async def main(args: argparse.Namespace):
 
     result = {}
 
+    # streamed addresses (--range @-) have no length
+    total = len(args.addresses) if hasattr(args.addresses, "__len__") else "?"
+
     def callback(result):
-        log.info("processed %i / %i", len(result), len(args.addresses))
+        log.info("processed %i / %s", len(result), total)
+
+    with cli.monitors.phase("launch", items=total if isinstance(total, int) else 0):
+        results = await utils.launch(
+            args.addresses, entrypoint, batch=args.batch, asobj=True, callback=callback
+        )
 
-    for data in await utils.launch(
-        args.addresses, entrypoint, batch=args.batch, asobj=True, callback=callback
-    ):
+    for data in results:
         if isinstance(data, utils.LuxosLaunchTimeoutError):
             log.warning(
                 "failed connection to %s: %s\n%s",
@@ -123,16 +129,18 @@ async def main(args: argparse.Namespace):
             result[data.address] = data.data
 
     if teardown:
-        if "result" in inspect.signature(teardown).parameters:
-            newresult = teardown(result)
-        else:
-            newresult = teardown()
-        result = newresult or result
-
-    if args.json:
-        print(json.dumps(result, indent=2))
-    if args.pickle:
-        args.pickle.write_bytes(pickle.dumps(result))
+        with cli.monitors.phase("teardown"):
+            if "result" in inspect.signature(teardown).parameters:
+                newresult = teardown(result)
+            else:
+                newresult = teardown()
+            result = newresult or result
+
+    with cli.monitors.phase("output"):
+        if args.json:
+            print(json.dumps(result, indent=2))
+        if args.pickle:
+            args.pickle.write_bytes(pickle.dumps(result))
 
 
 def run():
@@ -10,15 +10,23 @@ from typing import Any
 
 from luxos.api import logon_required
 
-from . import exceptions
+from . import exceptions, jsonlib, net, resolver, tracing
 from .asyncops import (
+    CONNECT_TIMEOUT,
+    DEADLINE,
+    IDLE_TIMEOUT,
+    LOGOFF_TIMEOUT,
     RETRIES,
     RETRIES_DELAY,
     TIMEOUT,
+    _expiry,
+    _left,
+    get_validator,
+    log_request,
     parameters_to_list,
-    validate,  # noqa: F401
     validate_message,
 )
+from .asyncops import validate as validate  # re-exported
 from .exceptions import MinerCommandSessionAlreadyActive, MinerConnectionError
 
 log = logging.getLogger(__name__)
@@ -84,24 +92,48 @@ def retryfn(
         raise exceptions.MinerCommandTimeoutError(host, port) from last_exception
 
 
-def _roundtrip(
-    host: str, port: int, cmd: bytes | str, timeout: float | None = None
-) -> str:
-    """simple asyncio socket based send/receive function
+def _settimeout(sock: socket.socket, timeout: float, expiry: float | None) -> None:
+    # timeout (0 for none) capped by expiry: a 0 socket timeout would
+    # make the socket non-blocking, so it raises once expired
+    if not timeout and expiry is None:
+        return
+    if (left := _left(_expiry(timeout or None, expiry))) == 0:
+        raise TimeoutError("deadline exceeded")
+    sock.settimeout(left)
+
+
+def _roundtrip_raw(
+    host: str,
+    port: int,
+    cmd: bytes | str,
+    timeout: float | None = None,
+    connect_timeout: float | None = None,
+    idle_timeout: float | None = None,
+    expiry: float | None = None,
+) -> bytes:
+    """simple socket based send/receive function (raw bytes)
+
+    The connection is limited by connect_timeout and each read by
+    idle_timeout (both default to timeout), all capped by the expiry
+    (monotonic) time.
 
     Example:
-        print(_roundtrip(host, port, "version"))
-        -> (str) "{'STATUS': [{'Code': 22, 'Description'...."
+        print(_roundtrip_raw(host, port, "version"))
+        -> (bytes) b"{'STATUS': [{'Code': 22, 'Description'...."
     """
     timeout = TIMEOUT if timeout is None else timeout
-    # Create a socket connection to the server
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+    connect_timeout = timeout if connect_timeout is None else connect_timeout
+    idle_timeout = timeout if idle_timeout is None else idle_timeout
+
+    address = resolver.resolve(host, port)
+    # Create a socket connection to the server (from net.SOURCES, if any)
+    with net.connection(family=net.address_family(address)) as sock:
         # set timeout
-        if timeout:
-            sock.settimeout(timeout)
+        _settimeout(sock, connect_timeout, expiry)
 
         # Connect to the server
-        sock.connect((host, port))
+        with tracing.span("connect", host, port):
+            sock.connect((address, port))
         log.debug("connecting to %s:%i", host, port)
         # Send the command to the server
         sock.sendall(cmd.encode() if isinstance(cmd, str) else cmd)
@@ -112,14 +144,29 @@ def _roundtrip(
         # this is to avoid waiting for the timeout as we don't know how long
         # the response will be and socket.recv() will block until reading
         # the specified number of bytes.
-        while data := sock.recv(2**3):
+        while True:
+            _settimeout(sock, idle_timeout, expiry)
+            if not (data := sock.recv(2**3)):
+                break
             response.append(data)
 
-        result = "".join(block.decode() for block in response)
+        result = b"".join(response)
         log.debug("received: %s", result)
         return result
 
 
+def _roundtrip(
+    host: str, port: int, cmd: bytes | str, timeout: float | None = None
+) -> str:
+    """simple socket based send/receive function
+
+    Example:
+        print(_roundtrip(host, port, "version"))
+        -> (str) "{'STATUS': [{'Code': 22, 'Description'...."
+    """
+    return _roundtrip_raw(host, port, cmd, timeout).decode()
+
+
 def roundtrip(
     host: str,
     port: int,
@@ -128,18 +175,31 @@ def roundtrip(
     timeout: float | None = None,
     retry: int | None = 0,
     retry_delay: float | None = None,
+    lazy: bool = False,
+    connect_timeout: float | None = None,
+    idle_timeout: float | None = None,
+    deadline: float | None = None,
 ):
     """utility wrapper around _roundrip
 
+    The connect_timeout, idle_timeout and deadline default to the
+    module values (see asyncops.roundtrip), the retries are stopped at
+    the deadline.
+
     Example:
         print(await roundtrip(host, port, {"version"}))
         -> (json) {'STATUS': [{'Code': 22, 'Description': 'LUXminer 20 ...
         print(await roundtrip(host, port, "version"))
         -> (str) "{'STATUS': [{'Code': 22, 'Description': 'LUXminer 20 ..
+        print(roundtrip(host, port, {"version"}, lazy=True))
+        -> (LazyReply) <LazyReply 312 bytes status=S>
     """
     timeout = TIMEOUT if timeout is None else timeout
     retry = RETRIES if retry is None else retry
     retry_delay = RETRIES_DELAY if retry_delay is None else retry_delay
+    connect_timeout = CONNECT_TIMEOUT if connect_timeout is None else connect_timeout
+    idle_timeout = IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+    expiry = _expiry(DEADLINE if deadline is None else deadline)
 
     if not isinstance(cmd, (bytes, str)):
         cmd = json.dumps(cmd, indent=2, sort_keys=True)
@@ -154,13 +214,23 @@ def roundtrip(
             break
         if timeout and (time.monotonic() - t0) >= timeout:
             break
+        if _left(expiry) == 0:
+            break
 
         try:
-            res = _roundtrip(host, port, cmd, timeout)
+            res = _roundtrip_raw(
+                host, port, cmd, timeout, connect_timeout, idle_timeout, expiry
+            )
+            if lazy:
+                return jsonlib.LazyReply(res)
             if asjson:
-                return json.loads(res)
+                with tracing.span("decode", host, port, size=len(res)):
+                    return jsonlib.loads(res)
             else:
-                return res
+                return res.decode()
+        except exceptions.MinerResolutionError:
+            # no point in retrying (the failure is cached)
+            raise
         except Exception as e:
             last_exception = e
         log.debug("failed to retrieve result for '%s'", cmd)
@@ -168,16 +238,18 @@ def roundtrip(
         if retry > 0:
             count -= 1
         if retry and retry_delay:
-            time.sleep(retry_delay)
+            time.sleep(_left(_expiry(retry_delay, expiry)) or 0)
 
     if last_exception is not None:
         raise exceptions.MinerCommandTimeoutError(host, port) from last_exception
+    if _left(expiry) == 0:
+        raise exceptions.MinerCommandTimeoutError(host, port, "deadline exceeded")
 
 
 @wrapped
-def logon(host: str, port: int, timeout: float | None = None) -> str:
+def logon(host: str, port: int, timeout: float | None = None, **kwargs) -> str:
     timeout = TIMEOUT if timeout is None else timeout
-    res = roundtrip(host, port, {"command": "logon"}, timeout=timeout)
+    res = roundtrip(host, port, {"command": "logon"}, timeout=timeout, **kwargs)
 
     # when we first logon, we'll receive a token (session_id)
     #   [STATUS][SessionID]
@@ -200,14 +272,33 @@ def logon(host: str, port: int, timeout: float | None = None) -> str:
 
 @wrapped
 def logoff(
-    host: str, port: int, sid: str, timeout: float | None = None
+    host: str, port: int, sid: str, timeout: float | None = None, **kwargs
 ) -> dict[str, Any]:
     timeout = TIMEOUT if timeout is None else timeout
     return roundtrip(
-        host, port, {"command": "logoff", "parameter": sid}, timeout=timeout
+        host, port, {"command": "logoff", "parameter": sid}, timeout=timeout, **kwargs
     )
 
 
+def _logoff(host: str, port: int, sid: str, timeout: float) -> None:
+    # closes the rexec session, within LOGOFF_TIMEOUT even past the deadline
+    # (not to leave it open): a failure doesn't lose the command reply
+    limit = min(timeout, LOGOFF_TIMEOUT)
+    try:
+        with tracing.span("logoff", host, port):
+            logoff(
+                host,
+                port,
+                sid,
+                limit,
+                connect_timeout=limit,
+                idle_timeout=limit,
+                deadline=limit,
+            )
+    except Exception as exc:
+        log.warning("cannot logoff from %s:%i: %s", host, port, exc)
+
+
 def rexec(
     host: str,
     port: int,
@@ -216,7 +307,28 @@ def rexec(
     timeout: float | None = None,
     retry: int | None = None,
     retry_delay: float | None = None,
-) -> dict[str, Any]:
+    lazy: bool = False,
+    validate: bool = False,
+    connect_timeout: float | None = None,
+    idle_timeout: float | None = None,
+    deadline: float | None = None,
+) -> Any:
+    expiry = _expiry(DEADLINE if deadline is None else deadline)
+
+    def limits() -> dict[str, Any]:
+        # the roundtrip limits, with the time left as deadline
+        return {
+            "connect_timeout": connect_timeout,
+            "idle_timeout": idle_timeout,
+            "deadline": _left(expiry),
+        }
+
+    if validate:
+        res = rexec(
+            host, port, cmd, parameters, timeout, retry, retry_delay, lazy, **limits()
+        )
+        return get_validator(cmd)(res)
+
     parameters = parameters_to_list(parameters)
 
     timeout = TIMEOUT if timeout is None else timeout
@@ -229,33 +341,44 @@ def rexec(
         for i in range(retry or 1):
             try:
                 if cmd == "logon":
-                    return {"sid": logon(host, port, timeout)}
+                    return {"sid": logon(host, port, timeout, **limits())}
                 else:
-                    return logoff(host, port, parameters[0])
+                    return logoff(host, port, parameters[0], **limits())
             except Exception as exc:
                 failure = exc
             if retry and (i < retry) and retry_delay:
-                time.sleep(retry_delay)
+                time.sleep(_left(_expiry(retry_delay, expiry)) or 0)
         if isinstance(failure, Exception):
             raise failure
 
+    t0 = time.monotonic()
     failure = None
     sid = ""
     for i in range(retry + 1):
         if not logon_required(cmd):
             log.debug("no logon required for command '%s' on %s:%i", cmd, host, port)
             break
+        if _left(expiry) == 0:
+            failure = failure or exceptions.MinerCommandTimeoutError(
+                host, port, "deadline exceeded"
+            )
+            break
         try:
-            sid = logon(host, port, timeout)
+            with tracing.span("logon", host, port):
+                sid = logon(host, port, timeout, **limits())
             parameters = [sid, *parameters]
             log.debug("session id requested & obtained for %s:%i (%s)", host, port, sid)
             break
+        except exceptions.MinerResolutionError as exc:
+            failure = exc
+            break
         except Exception as exc:
             failure = exc
         if retry and (i < retry) and retry_delay:
-            time.sleep(retry_delay)
+            time.sleep(_left(_expiry(retry_delay, expiry)) or 0)
 
     if isinstance(failure, Exception):
+        log_request(host, port, cmd, t0, retry + 1, failure)
         raise failure
 
     packet = {"command": cmd}
@@ -271,21 +394,34 @@ def rexec(
 
     failure = None
     for i in range(retry + 1):
+        if _left(expiry) == 0:
+            failure = failure or exceptions.MinerCommandTimeoutError(
+                host, port, "deadline exceeded"
+            )
+            break
         try:
-            ret = roundtrip(host, port, packet, timeout=timeout)
-            log.debug("received from %s:%s: %s", host, port, str(ret))
+            with tracing.span("command", host, port, cmd=cmd):
+                ret = roundtrip(
+                    host, port, packet, timeout=timeout, lazy=lazy, **limits()
+                )
+            log.debug("received from %s:%s: %s", host, port, ret)
             if sid:
-                logoff(host, port, sid)
+                _logoff(host, port, sid, timeout)
+            log_request(host, port, cmd, t0, i + 1)
             return ret
+        except exceptions.MinerResolutionError as exc:
+            failure = exc
+            break
         except Exception as exc:
             failure = exc
         if retry and (i < retry) and retry_delay:
             log.debug("failed attempt %i (out of %i)", i + 1, retry)
-            time.sleep(retry_delay)
+            time.sleep(_left(_expiry(retry_delay, expiry)) or 0)
 
     if sid:
-        logoff(host, port, sid)
+        _logoff(host, port, sid, timeout)
     if isinstance(failure, Exception):
+        log_request(host, port, cmd, t0, retry + 1, failure)
         raise failure
     return {}
 
@@ -336,7 +472,7 @@ def internal_send_cgminer_command(
                 response += data
 
             # Parse the response JSON
-            r = json.loads(response.decode())
+            r = jsonlib.loads(response)
             log.debug(r)
             return r
 
@@ -0,0 +1,95 @@
+"""per-miner timeline of the remote execution phases
+
+When TRACER is set, asyncops/syncops record a span for each phase
+(connect, logon, command, logoff, decode) of every miner request, that can be
+saved as a chrome trace-event file (load it in chrome://tracing or
+https://ui.perfetto.dev), each miner showing as a separate thread.
+
+Example::
+
+    from luxos import tracing
+
+    tracing.TRACER = tracing.Tracer()
+    ... run the commands
+    tracing.TRACER.dump("trace.json")
+
+Note:
+    spans are no-ops when TRACER is None (the default).
+"""
+
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import IO, Any, ContextManager
+
+#: the active tracer (None disables the tracing)
+TRACER: Tracer | None = None
+
+
+class Tracer:
+    """collects the spans as chrome "complete" (ph=X) trace events"""
+
+    def __init__(self) -> None:
+        self.t0 = time.perf_counter()
+        self.pid = os.getpid()
+        self.events: list[dict[str, Any]] = []
+        # one (fake) thread id per miner
+        self.tids: dict[tuple[str, int], int] = {}
+
+    def tid(self, host: str, port: int) -> int:
+        if (key := (host, port)) not in self.tids:
+            self.tids[key] = len(self.tids) + 1
+        return self.tids[key]
+
+    @contextlib.contextmanager
+    def span(self, name: str, host: str, port: int, **args):
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException as exc:
+            args["error"] = repr(exc)
+            raise
+        finally:
+            self.events.append(
+                {
+                    "name": name,
+                    "cat": "luxos",
+                    "ph": "X",
+                    "ts": round((start - self.t0) * 1e6, 1),
+                    "dur": round((time.perf_counter() - start) * 1e6, 1),
+                    "pid": self.pid,
+                    "tid": self.tid(host, port),
+                    "args": args,
+                }
+            )
+
+    def asdict(self) -> dict[str, Any]:
+        names = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": self.pid,
+                "tid": tid,
+                "args": {"name": f"{host}:{port}"},
+            }
+            for (host, port), tid in self.tids.items()
+        ]
+        return {"traceEvents": names + self.events, "displayTimeUnit": "ms"}
+
+    def dump(self, path: Path | str | IO[str]) -> None:
+        if isinstance(path, (str, Path)):
+            with Path(path).open("w") as fp:
+                json.dump(self.asdict(), fp)
+        else:
+            json.dump(self.asdict(), path)
+
+
+def span(name: str, host: str, port: int, **args) -> ContextManager[None]:
+    """records the phase name for host:port on the active TRACER"""
+    if TRACER is None:
+        return contextlib.nullcontext()
+    return TRACER.span(name, host, port, **args)
@@ -5,10 +5,11 @@ from __future__ import annotations
 import asyncio
 import dataclasses as dc
 import functools
-import traceback
-from typing import Any, Awaitable, Callable
+import logging
+from typing import Any, Awaitable, Callable, Iterable
 
 import luxos.misc
+from luxos import resolver
 from luxos.asyncops import rexec, validate  # noqa: F401
 
 # we bring here functions from other modules
@@ -16,6 +17,8 @@ from luxos.exceptions import MinerCommandTimeoutError
 from luxos.ips import ip_ranges, load_ips_from_csv  # noqa: F401
 from luxos.syncops import execute_command  # noqa: F401
 
+log = logging.getLogger(__name__)
+
 # + LuxosLaunchBaseResult
 #    + LuxosLaunchResult
 #    + LuxosLaunchError
@@ -37,19 +40,44 @@ class LuxosLaunchResult(LuxosLaunchBaseResult):
     data: Any = None
 
 
-@dc.dataclass
+@dc.dataclass(init=False)
 class LuxosLaunchError(LuxosLaunchBaseResult):
-    traceback: str | None = None
+    exception: BaseException | None = dc.field(default=None, repr=False)
     brief: str = ""
 
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        exception: BaseException | str | None = None,
+        brief: str = "",
+        traceback: str | None = None,
+    ):
+        super().__init__(host, port)
+        # the formatted traceback (the older signature) is kept as exception
+        if isinstance(exception, str):
+            traceback = exception
+            exception = None
+        if exception is None and traceback is not None:
+            exception = luxos.misc.FormattedTraceback(traceback)
+        self.exception = exception
+        self.brief = brief
 
-@dc.dataclass
+    @property
+    def traceback(self) -> str | None:
+        """the formatted traceback (computed on demand)"""
+        if self.exception is None:
+            return None
+        return luxos.misc.format_traceback(self.exception)
+
+
+@dc.dataclass(init=False)
 class LuxosLaunchTimeoutError(LuxosLaunchError, asyncio.TimeoutError):
     pass
 
 
 async def launch(
-    addresses: list[tuple[str, int]],
+    addresses: Iterable[tuple[str, int]],
     function: Callable[[str, int], Awaitable[Any]],
     batch: int = 0,
     asobj: bool = False,
@@ -62,12 +90,17 @@ async def launch(
     miners, and for each "point" call `function` on it.
 
     Arguments:
-        addresses: list of (host: str, port: int)
+        addresses: iterable of (host: str, port: int), eg. a list, an
+                   ips.AddressBook or an ips.AddressSet
         function: async callable with (host: str, port: int) call signature
         batch: limit the number of concurrent calls (unlimited by default)
         asobj: if True all results will be instances subclasses
                of LuxosLaunchBaseResult
 
+    Notes:
+        the miners hostnames are resolved in bulk (and cached) before
+        starting, see :py:mod:`luxos.resolver`.
+
     Examples:
         This will gather the miners versions in a dict::
 
@@ -87,17 +120,23 @@ async def launch(
                 data = await fn(host, port)
                 out = LuxosLaunchResult(host, port, data) if asobj else data
             except (asyncio.TimeoutError, MinerCommandTimeoutError) as exc:
-                tback = "".join(traceback.format_exc())
                 brief = repr(exc.__context__ or exc.__cause__)
-                out = LuxosLaunchTimeoutError(host, port, traceback=tback, brief=brief)
+                out = LuxosLaunchTimeoutError(
+                    host, port, exception=luxos.misc.clear_frames(exc), brief=brief
+                )
             except Exception as exc:
-                tback = "".join(traceback.format_exc())
                 brief = repr(exc.__context__ or exc.__cause__)
-                out = LuxosLaunchError(host, port, traceback=tback, brief=brief)
+                out = LuxosLaunchError(
+                    host, port, exception=luxos.misc.clear_frames(exc), brief=brief
+                )
             return out
 
         return _fn
 
+    if names := resolver.hostnames(addresses):
+        for host, exc in (await resolver.prefetch(names)).items():
+            log.warning("cannot resolve %s: %s", host, exc.__cause__)
+
     call = wraps(function)
     if batch:
         result = []
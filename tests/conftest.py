@@ -157,6 +157,36 @@ def port(miner_host_port):
     return miner_host_port[1]
 
 
+@pytest.fixture(scope="function")
+def dripserver():
+    """a server slowly dripping a never ending reply, one byte every 0.1s
+
+    Example:
+        def test_me(dripserver):
+            host, port = dripserver
+    """
+    import socketserver
+    import threading
+
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            self.request.recv(1024)
+            with contextlib.suppress(OSError):
+                while not stop.wait(0.1):
+                    self.request.sendall(b"x")
+
+    stop = threading.Event()
+    with socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler) as server:
+        server.daemon_threads = True
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield server.server_address
+        finally:
+            stop.set()
+            server.shutdown()
+
+
 def pytest_addoption(parser):
     parser.addoption(
         "--manual",
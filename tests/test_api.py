@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import pytest
+
+from luxos import api, asyncops, exceptions
+
+
+def test_commands_metadata():
+    for cmd, info in api.COMMANDS.items():
+        assert set(info) == set(api.DEFAULTS), f"wrong metadata for {cmd}"
+        if info["minfields"] is not None and info["maxfields"] is not None:
+            assert info["minfields"] <= info["maxfields"], cmd
+        if info["cache_ttl"]:
+            assert info["idempotent"], f"{cmd} cannot be cached"
+
+
+def test_invalidates():
+    # the cached replies, and the writes changing them
+    writes = {
+        "groups": [
+            "addgroup",
+            "removegroup",
+            "groupquota",
+            "addpool",
+            "removepool",
+            "switchpool",
+            "enablepool",
+            "disablepool",
+            "pooloptsset",
+        ],
+        "config": [
+            "addpool",
+            "removepool",
+            "switchpool",
+            "enablepool",
+            "disablepool",
+            "pooloptsset",
+            "profileset",
+            "profilerestore",
+            "tempctrlset",
+        ],
+        "profiles": ["profilenew", "profilerem", "profileset", "profilerestore"],
+        "tempctrl": ["tempctrlset"],
+    }
+    cached = {cmd for cmd in api.COMMANDS if api.cache_ttl(cmd)}
+    assert set(writes) <= cached
+    for cmd, stale in writes.items():
+        for write in stale:
+            names = api.invalidates(write)
+            assert names is None or cmd in names, f"{write} leaves {cmd} stale"
+
+
+def test_get_command():
+    assert api.get_command("version")["reply_key"] == "VERSION"
+    assert api.get_command("not-a-command") == api.DEFAULTS
+    assert api.is_idempotent("version")
+    assert not api.is_idempotent("profileset")
+    assert not api.is_idempotent("not-a-command")
+    assert api.cache_ttl("version") > 0
+    assert api.cache_ttl("devs") == 0
+
+
+def test_get_validator(resolver):
+    res = resolver.load("messages/version.json")
+    assert asyncops.get_validator("version") is asyncops.get_validator("version")
+    assert asyncops.get_validator("version")(res) == res["VERSION"][0]
+    assert asyncops.validate(res, "VERSION", 1, 1) == res["VERSION"][0]
+
+    res = resolver.load("messages/groups.json")
+    assert asyncops.get_validator("groups")(res) == res["GROUPS"]
+
+    # no reply key, but still the status is checked
+    res = {"STATUS": [{"STATUS": "S"}], "id": 1}
+    assert asyncops.get_validator("atmset")(res) is res
+    res["STATUS"][0]["STATUS"] = "E"
+    pytest.raises(exceptions.MinerMessageError, asyncops.get_validator("atmset"), res)
+
+    # unknown commands
+    assert asyncops.get_validator("not-a-command")(res) is res
+    pytest.raises(
+        exceptions.MinerMessageMalformedError,
+        asyncops.get_validator("not-a-command"),
+        {},
+    )
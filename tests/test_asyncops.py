@@ -1,6 +1,10 @@
 from __future__ import annotations
 
 import asyncio
+import json
+import socketserver
+import threading
+import time
 
 import pytest
 
@@ -158,6 +162,20 @@ def test_validate_message():
         validate(res, "KEY", 1, 2)
     assert excinfo.value.args[2] == "found too many items for 'KEY'  (3 > 2)"
 
+    for status in [[], [{"STATUS": "E"}]]:
+        res = {"STATUS": status, "id": 2, "KEY": [1]}
+        assert validate(res) is res
+        with pytest.raises(exceptions.MinerCommandMalformedMessageError) as excinfo:
+            validate(res, "KEY")
+        assert excinfo.value.args[2] == "no status information in message"
+
+    # any sized value, and no internal error for minfields > maxfields
+    res = {"STATUS": [{"STATUS": "S"}], "id": 2, "KEY": {"a": 1}}
+    assert validate(res, "KEY") is res
+    with pytest.raises(exceptions.MinerCommandMalformedMessageError) as excinfo:
+        validate(res, "KEY", 2, 1)
+    assert excinfo.value.args[2] == "found too few items for 'KEY'  (1 < 2)"
+
 
 @pytest.mark.asyncio
 async def test_private_roundtrip_one_listener(echopool):
@@ -326,3 +344,91 @@ async def test_bridge_execute_command(miner_host_port):
         parameters=[],
         verbose=True,
     )
+
+
+def test_log_request(caplog, monkeypatch):
+    monkeypatch.setattr(aapi, "REQUESTS_LOG_SAMPLE", 0)
+    monkeypatch.setattr(aapi, "REQUESTS_LOG_FAILURES", False)
+    caplog.set_level("INFO", logger="luxos.requests")
+
+    # disabled
+    aapi.log_request("127.0.0.1", 4028, "version", 0, 1)
+    assert not caplog.records
+
+    # only failures
+    monkeypatch.setattr(aapi, "REQUESTS_LOG_FAILURES", True)
+    aapi.log_request("127.0.0.1", 4028, "version", 0, 1)
+    aapi.log_request("127.0.0.1", 4028, "version", 0, 3, TimeoutError("boo"))
+    assert len(caplog.records) == 1
+    record = caplog.records[0].request
+    assert record["status"] == "failed"
+    assert record["attempts"] == 3
+    assert record["error"] == "TimeoutError('boo')"
+    caplog.clear()
+
+    # sampling 1 every 3
+    monkeypatch.setattr(aapi, "REQUESTS_LOG_FAILURES", False)
+    monkeypatch.setattr(aapi, "REQUESTS_LOG_SAMPLE", 3)
+    for _ in range(9):
+        aapi.log_request("127.0.0.1", 4028, "version", 0, 1)
+    assert len(caplog.records) == 3
+    assert {r.request["status"] for r in caplog.records} == {"ok"}
+
+
+@pytest.mark.asyncio
+async def test_rexec_deadline(dripserver):
+    host, port = dripserver
+
+    # a slow dripping miner never times out on the reads
+    t0 = time.monotonic()
+    with pytest.raises(exceptions.MinerCommandTimeoutError):
+        await aapi.rexec(host, port, "version", timeout=1, deadline=0.5)
+    assert time.monotonic() - t0 < 0.7
+
+    # .. unless the idle timeout is shorter than the drip
+    t0 = time.monotonic()
+    with pytest.raises(exceptions.MinerCommandTimeoutError):
+        await aapi.rexec(host, port, "version", timeout=1, idle_timeout=0.05)
+    assert time.monotonic() - t0 < 0.3
+
+    # the deadline includes the retries
+    t0 = time.monotonic()
+    with pytest.raises(exceptions.MinerCommandTimeoutError):
+        await aapi.rexec(
+            host,
+            port,
+            "version",
+            idle_timeout=0.05,
+            retry=5,
+            retry_delay=1,
+            deadline=0.4,
+        )
+    assert time.monotonic() - t0 < 0.6
+
+
+@pytest.mark.asyncio
+async def test_stream_items(resolver):
+    data = resolver.lookup("messages/healthchipget.json").read_bytes()
+
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            self.request.recv(1024)
+            for index in range(0, len(data), 1000):
+                self.request.sendall(data[index : index + 1000])
+                time.sleep(0.001)
+            self.request.sendall(b"\x00")
+
+    with socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler) as server:
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        host, port = server.server_address
+        chips = [
+            chip
+            async for chip in aapi.stream_items(host, port, "healthchipget", chunk=512)
+        ]
+        server.shutdown()
+    assert chips == json.loads(data)["CHIPS"]
+
+    with pytest.raises(ValueError):
+        async for _ in aapi.stream_items(host, port, "logoff"):
+            pass
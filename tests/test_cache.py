@@ -0,0 +1,176 @@
+import asyncio
+import json
+import logging
+import socketserver
+import threading
+
+import pytest
+
+from luxos import asyncops, cache, jsonlib
+
+OK = {"STATUS": [{"STATUS": "S"}], "id": 1}
+
+
+@pytest.fixture()
+def replyserver(resolver):
+    """replies with the captured messages, recording the commands"""
+    messages = {
+        name: resolver.lookup(f"messages/{name}.json").read_bytes()
+        for name in ["groups", "version"]
+    }
+    commands = []
+
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            cmd = json.loads(self.request.recv(1024))["command"]
+            commands.append(cmd)
+            data = messages.get(cmd, json.dumps(OK).encode())
+            self.request.sendall(data + b"\x00")
+
+    with socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler) as server:
+        server.daemon_threads = True
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield (*server.server_address, commands)
+        server.shutdown()
+
+
+def test_reply_cache():
+    replies = cache.ReplyCache(maxsize=3)
+    assert replies.put("a", 1, "version", [], OK)
+    assert replies.get("a", 2, "version") is None
+
+    # a new copy on each hit
+    reply = replies.get("a", 1, "version")
+    assert reply == OK
+    reply["STATUS"].clear()
+    assert replies.get("a", 1, "version") == OK
+    lazy = replies.get("a", 1, "version", lazy=True)
+    assert isinstance(lazy, jsonlib.LazyReply)
+    assert lazy.status == "S"
+
+    # not cacheable or error replies
+    assert not replies.put("a", 1, "devs", [], OK)
+    assert not replies.put("a", 1, "config", [], {"STATUS": [{"STATUS": "E"}]})
+
+    # the least recently used replies are dropped
+    replies.put("a", 1, "config", [], OK)
+    replies.put("a", 1, "profiles", [], OK)
+    replies.get("a", 1, "version")
+    replies.put("a", 1, "groups", [], OK)
+    assert [key[2] for key in replies.entries] == ["profiles", "version", "groups"]
+
+    # expired
+    key = ("a", 1, "version", ())
+    replies.entries[key] = (0, b"{}")
+    assert replies.get("a", 1, "version") is None
+    assert key not in replies.entries
+    assert (replies.hits, replies.misses) == (4, 2)
+
+
+def test_reply_cache_context(caplog, tmp_path):
+    caplog.set_level(logging.INFO)
+    path = tmp_path / "replies.json"
+    with cache.reply_cache(path) as replies:
+        assert cache.CACHE is replies
+        replies.put("a", 1, "version", [], OK)
+    assert cache.CACHE is None
+    assert caplog.records[-1].getMessage().endswith("1 cached")
+
+    with cache.reply_cache(path) as replies:
+        assert replies.get("a", 1, "version") == OK
+
+
+def test_reply_cache_invalidate():
+    replies = cache.ReplyCache()
+    for host in ["a", "b"]:
+        for cmd in ["version", "config", "profiles"]:
+            replies.put(host, 1, cmd, [], OK)
+
+    assert replies.invalidate("a", 1, "logon") == 0
+    assert replies.invalidate("a", 1, "profileset") == 2
+    assert [key[2] for key in replies.entries if key[0] == "a"] == ["version"]
+    # not listed in api.json: all the host replies
+    assert replies.invalidate("b", 1, "reboot") == 3
+    assert len(replies) == 1
+
+    # replies requested before an invalidation are not cached
+    generation = replies.generation("a", 1)
+    replies.invalidate("a", 1)
+    assert not replies.put("a", 1, "config", [], OK, generation)
+    assert replies.put("a", 1, "config", [], OK, replies.generation("a", 1))
+
+
+def test_reply_cache_persist(tmp_path):
+    path = tmp_path / "replies.json"
+    replies = cache.ReplyCache(path=path)
+    assert replies.load() == 0
+    replies.put("a", 1, "version", [], OK)
+    replies.put("a", 1, "config", ["x"], jsonlib.LazyReply(json.dumps(OK).encode()))
+    replies.put("b", 1, "version", [], OK)
+    replies.entries[("b", 1, "version", ())] = (0, b"{}")
+    replies.save()
+
+    loaded = cache.ReplyCache(path=path)
+    assert loaded.load() == 2
+    assert loaded.get("a", 1, "version") == OK
+    reply = loaded.get("a", 1, "config", ["x"], lazy=True)
+    assert isinstance(reply, jsonlib.LazyReply)
+    assert reply.status == "S"
+
+    for text in ["not json", '[["a", 1, "version", [], false, 1, {}]]']:
+        path.write_text(text)
+        assert cache.ReplyCache(path=path).load() == 0
+
+
+def test_reply_cache_save_errors(tmp_path, caplog):
+    # the replies are kept byte for byte, even if not valid utf-8
+    path = tmp_path / "replies.json"
+    raw = b'{"STATUS": [{"STATUS": "S"}], "id": 1, "VERSION": [{"API": "\xff"}]}'
+    replies = cache.ReplyCache(path=path)
+    assert replies.put("a", 1, "version", [], raw)
+    replies.save()
+    loaded = cache.ReplyCache(path=path)
+    assert loaded.load() == 1
+    assert loaded.entries[("a", 1, "version", ())][1] == raw
+
+    # write failures are logged
+    replies.path = tmp_path / "missing" / "replies.json"
+    with caplog.at_level(logging.WARNING):
+        replies.save()
+    assert "cannot save the replies cache" in caplog.text
+    assert not (tmp_path / "missing").exists()
+
+
+@pytest.mark.asyncio
+async def test_rexec_reply_cache(replyserver, monkeypatch):
+    host, port, commands = replyserver
+    monkeypatch.setattr(cache, "CACHE", cache.ReplyCache())
+
+    for _ in range(3):
+        reply = await asyncops.rexec(host, port, "version")
+        assert reply["STATUS"][0]["STATUS"] == "S"
+        reply.clear()
+        await asyncops.rexec(host, port, "groups", validate=True)
+    assert commands == ["version", "groups"]
+    reply = await asyncops.rexec(host, port, "version", lazy=True)
+    assert isinstance(reply, jsonlib.LazyReply)
+
+    # addgroup makes groups stale
+    await asyncops.rexec(host, port, "addgroup", "x")
+    await asyncio.gather(
+        *(asyncops.rexec(host, port, cmd) for cmd in ["version", "groups"])
+    )
+    assert commands == ["version", "groups", "addgroup", "groups"]
+    assert cache.CACHE.report() == [
+        "replies cache: 6 hits, 3 misses (67% hit rate), 1 invalidated, 2 cached"
+    ]
+
+    # the never cached commands skip the cache (not counted as misses)
+    for _ in range(2):
+        reply = await asyncops.rexec(host, port, "devs")
+        assert isinstance(reply, dict)
+    assert commands[-2:] == ["devs", "devs"]
+    assert cache.CACHE.report() == [
+        "replies cache: 6 hits, 3 misses (67% hit rate), 1 invalidated, 2 cached"
+    ]
@@ -1,6 +1,9 @@
 import argparse
+import asyncio
+import logging
 import subprocess
 import sys
+import threading
 from unittest import mock
 
 import pytest
@@ -62,6 +65,51 @@ def test_wrapped_cli():
     assert main2.attributes["doc"] == main2.__doc__
 
 
+def test_queue_logging():
+    records = []
+
+    class Handler(logging.Handler):
+        def emit(self, record):
+            records.append((threading.current_thread(), record.getMessage()))
+
+    logger = logging.getLogger("luxos.test-queue-logging")
+    logger.propagate = False
+    handler = Handler()
+    logger.addHandler(handler)
+    try:
+        with cli.queue_logging(logger) as listener:
+            assert listener
+            assert isinstance(logger.handlers[0], cli.QueueHandler)
+            logger.warning("hello %s", "world")
+        assert logger.handlers == [handler]
+    finally:
+        logger.removeHandler(handler)
+
+    assert len(records) == 1
+    assert records[0][0] is not threading.current_thread()
+    assert records[0][1] == "hello world"
+
+
+def test_queue_logging_async():
+    found = {}
+
+    @cli.cli()
+    async def main(args):
+        found["handlers"] = logging.getLogger().handlers[:]
+
+    @cli.cli()
+    def main2(args):
+        found["handlers2"] = logging.getLogger().handlers[:]
+
+    handlers = logging.getLogger().handlers[:]
+    with mock.patch.object(sys, "argv", ["dummy.py"]):
+        asyncio.run(main())
+        main2()
+    assert [type(h) for h in found["handlers"]] == [cli.QueueHandler]
+    assert found["handlers2"] == handlers
+    assert logging.getLogger().handlers == handlers
+
+
 @pytest.mark.parametrize("script", ["luxos", "luxos_run"])
 def test_scripts_version(script):
     """test the --version flag on scripts"""
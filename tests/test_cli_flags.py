@@ -54,3 +54,97 @@ def test_type_ipaddress():
 
     pytest.raises(RuntimeError, flags.type_ipaddress, "12:dwedwe")
     pytest.raises(argparse.ArgumentTypeError, flags.type_ipaddress(), "12:dwedwe")
+
+
+def test_add_arguments_new_miners_ips(resolver):
+    from luxos.cli.shared import LuxosParserBase
+
+    parser = LuxosParserBase([])
+    flags.add_arguments_new_miners_ips(parser)
+    args = parser.parse_args(
+        [
+            "--range",
+            "127.0.0.1-127.0.0.10",
+            "--range",
+            "127.0.0.5-127.0.0.15,a.host:9999",
+            "--range",
+            "127.0.0.3",
+        ]
+    )
+    for callback in parser.callbacks:
+        callback(args)
+
+    # the overlaps are merged
+    assert len(args.addresses) == 16
+    assert list(args.addresses)[0] == ("127.0.0.1", 4028)
+    assert ("a.host", 9999) in args.addresses
+
+
+def test_add_arguments_new_miners_ips_stdin(monkeypatch):
+    import io
+
+    from luxos.cli.shared import LuxosParserBase
+
+    parser = LuxosParserBase([])
+    flags.add_arguments_new_miners_ips(parser)
+    monkeypatch.setattr("sys.stdin", io.StringIO("127.0.0.2:9999\n127.0.0.3\n"))
+    args = parser.parse_args(["--range", "127.0.0.1", "--range", "@-"])
+    for callback in parser.callbacks:
+        callback(args)
+
+    # the stdin addresses are read lazily, after the others
+    assert not hasattr(args.addresses, "__len__")
+    assert list(args.addresses) == [
+        ("127.0.0.1", 4028),
+        ("127.0.0.2", 9999),
+        ("127.0.0.3", 4028),
+    ]
+
+
+def test_add_arguments_rexec_timeouts(monkeypatch):
+    from luxos import asyncops, syncops
+    from luxos.cli.shared import LuxosParserBase
+
+    for name in ["CONNECT_TIMEOUT", "IDLE_TIMEOUT", "DEADLINE"]:
+        monkeypatch.setattr(asyncops, name, None)
+        monkeypatch.setattr(syncops, name, None)
+
+    parser = LuxosParserBase([])
+    flags.add_arguments_rexec(parser)
+    args = parser.parse_args(["--connect-timeout", "0.2", "--deadline", "5"])
+    for callback in parser.callbacks:
+        callback(args)
+    assert (asyncops.CONNECT_TIMEOUT, asyncops.IDLE_TIMEOUT) == (0.2, None)
+    assert asyncops.DEADLINE == syncops.DEADLINE == 5.0
+
+
+def test_add_arguments_rexec_single_flight(monkeypatch):
+    from luxos import asyncops
+    from luxos.cli.shared import LuxosParserBase
+
+    monkeypatch.setattr(asyncops, "SINGLE_FLIGHT", False)
+    parser = LuxosParserBase([])
+    flags.add_arguments_rexec(parser)
+    for argv, expected in [([], False), (["--single-flight"], True)]:
+        args = parser.parse_args(argv)
+        for callback in parser.callbacks:
+            callback(args)
+        assert asyncops.SINGLE_FLIGHT is expected
+
+
+def test_add_arguments_rexec_sources(monkeypatch):
+    from luxos import net
+    from luxos.cli.shared import LuxosParserBase
+
+    monkeypatch.setattr(net, "SOURCES", None)
+    monkeypatch.setattr(net, "PROFILE", net.PROFILES["default"])
+    parser = LuxosParserBase([])
+    flags.add_arguments_rexec(parser)
+    args = parser.parse_args(
+        ["--source", "127.0.0.2", "--source", "%lo", "--socket-profile", "sweep"]
+    )
+    for callback in parser.callbacks:
+        callback(args)
+    assert net.SOURCES
+    assert [str(s) for s in net.SOURCES.sources] == ["127.0.0.2", "%lo"]
+    assert net.PROFILE.name == "sweep"
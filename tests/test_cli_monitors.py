@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import logging
+import pstats
+import sys
+import time
+from unittest import mock
+
+from luxos import tracing
+from luxos.cli import monitors
+from luxos.cli import v1 as cli
+
+
+def blocking_call(delay):
+    time.sleep(delay)
+
+
+def test_loop_monitor():
+    async def main():
+        monitor = monitors.LoopMonitor(threshold=0.05, maxitems=2)
+        monitor.start()
+        await asyncio.sleep(0.05)
+        blocking_call(0.3)
+        await asyncio.sleep(0.05)
+        monitor.stop()
+        return monitor
+
+    monitor = asyncio.run(main())
+    assert monitor.samples > 1
+    assert monitor.maxlag >= 0.25
+    assert len(monitor.slowest) == 1
+
+    lines = monitor.report()
+    assert lines[0].startswith("loop lag: max ")
+    assert lines[1].startswith("loop blocked for ")
+    assert "in blocking_call" in "\n".join(lines[2:])
+
+
+def test_loop_monitor_no_loop(caplog):
+    with monitors.loop_monitor() as monitor:
+        assert monitor is None
+    assert "no running event loop" in caplog.text
+
+
+def test_loop_monitor_flag(caplog):
+    caplog.set_level(logging.INFO)
+
+    @cli.cli()
+    async def main(args):
+        assert args.loop_monitor == 0.05
+        blocking_call(0.2)
+
+    with mock.patch.object(sys, "argv", ["dummy.py", "--loop-monitor", "0.05"]):
+        asyncio.run(main())
+
+    messages = [r.getMessage() for r in caplog.records]
+    index = next(i for i, m in enumerate(messages) if m.startswith("task completed"))
+    assert messages[index + 1].startswith("loop lag: max ")
+    assert "in blocking_call" in messages[index + 1]
+
+
+def test_profile_trace_flags(tmp_path):
+    @cli.cli()
+    def main(args):
+        with tracing.span("connect", "127.0.0.1", 4028):
+            blocking_call(0.01)
+
+    profile = tmp_path / "run.pstats"
+    trace = tmp_path / "trace.json"
+    argv = ["dummy.py", "--profile", str(profile), "--trace-out", str(trace)]
+    with mock.patch.object(sys, "argv", argv):
+        main()
+    assert tracing.TRACER is None
+
+    stats = pstats.Stats(str(profile))
+    assert any(func[2] == "blocking_call" for func in stats.stats)
+
+    events = json.loads(trace.read_text())["traceEvents"]
+    assert [e["name"] for e in events] == ["thread_name", "connect"]
+
+
+def test_memory_report():
+    report = monitors.MemoryReport(top=2)
+    report.start()
+    try:
+        with report.phase("alloc", items=1000):
+            data = [str(i) * 10 for i in range(1000)]
+        with report.phase("free"):
+            del data
+    finally:
+        report.stop()
+
+    alloc, free = report.phases
+    assert alloc.name == "alloc"
+    assert alloc.items == 1000
+    assert alloc.delta > 1000 * 50
+    assert alloc.peak >= alloc.delta
+    assert __file__ in {site.traceback[0].filename for site in alloc.sites}
+    assert free.delta < 0
+
+    lines = report.report()
+    assert lines[0].startswith("memory: peak rss ")
+    assert lines[1].strip().startswith("alloc")
+    assert "per item" in lines[1]
+
+
+def test_memory_report_lookup():
+    parser = cli.LuxosParser.get_parser([cli])
+    assert parser.memory_report(["--memory-report"])
+    assert parser.memory_report(["-v", "--memory", "x"])
+    assert not parser.memory_report(["-v"])
+    assert not parser.memory_report(["--memory-report=1"])
+    assert parser.parse_args(["--memory"]).memory_report
+
+
+def test_memory_report_flag(caplog):
+    caplog.set_level(logging.INFO)
+
+    @cli.cli()
+    def main(args):
+        with monitors.phase("launch", items=10):
+            pass
+
+    with mock.patch.object(sys, "argv", ["dummy.py", "--memory"]):
+        main()
+    assert monitors.MEMORY is None
+    assert isinstance(monitors.phase("launch"), contextlib.nullcontext)
+
+    report = caplog.records[-1].getMessage().split("\n")
+    assert report[0].startswith("memory: peak rss ")
+    phases = [line.split()[0] for line in report if line[2] != " "]
+    assert phases == ["memory:", "arguments", "launch"]
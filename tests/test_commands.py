@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import pytest
+
+from luxos import asyncops, commands, exceptions, jsonlib
+
+
+def test_struct():
+    version = commands.Version(luxminer="2000.1.1")
+    assert version.luxminer == "2000.1.1"
+    assert version.api == ""
+    assert version == commands.Version.from_dict({"LUXminer": "2000.1.1"})
+    assert repr(version).startswith("Version(luxminer='2000.1.1', api=''")
+    pytest.raises(TypeError, commands.Version, not_a_field=1)
+
+    # structs are slotted
+    assert not hasattr(version, "__dict__")
+    pytest.raises(AttributeError, setattr, version, "not_a_field", 1)
+
+
+def test_exposed_in_asyncops():
+    assert asyncops.commands.devs is commands.devs
+
+
+def test_decode_devs(resolver):
+    boards = commands.decode("devs", resolver.load("messages/devs.json"))
+    assert len(boards) == 3
+    assert all(isinstance(board, commands.Board) for board in boards)
+    assert [board.asc for board in boards] == [0, 1, 2]
+    assert boards[0].alive
+    assert boards[0].elapsed == 274_613
+    assert boards[1].temperature == 65.5
+    assert boards[2].profile == "default"
+
+
+def test_decode_healthchipget(resolver):
+    chips = commands.decode(
+        "healthchipget", resolver.load("messages/healthchipget.json")
+    )
+    assert len(chips) == 3 * 126
+    assert sum(1 for chip in chips if not chip.is_healthy) == 9
+
+
+def test_decode_version(resolver):
+    res = resolver.load("messages/version.json")
+    version = commands.decode("version", res)
+    assert version == commands.Version(
+        luxminer="2000.1.1.12345-aaabbbc",
+        api="3.7",
+        miner="some id",
+        type="A model",
+        compile_time="Mon Jan 01 00:01:01 UTC 2000",
+    )
+
+    res["STATUS"][0]["STATUS"] = "E"
+    pytest.raises(exceptions.MinerMessageError, commands.decode, "version", res)
+
+
+def test_decode_empty():
+    res = {"STATUS": [{"STATUS": "S"}], "id": 1}
+    assert commands.decode("pools", res) == []
+    pytest.raises(exceptions.MinerMessageInvalidError, commands.decode, "config", res)
+    pytest.raises(KeyError, commands.decode, "not-a-command", res)
+
+
+@pytest.mark.parametrize(
+    "cmd, path",
+    [
+        ("devs", "messages/devs.json"),
+        ("healthchipget", "messages/healthchipget.json"),
+        ("version", "messages/version.json"),
+    ],
+)
+@pytest.mark.parametrize("msgspec", [True, False])
+def test_decode_raw(resolver, monkeypatch, cmd, path, msgspec):
+    if msgspec:
+        pytest.importorskip("msgspec")
+    else:
+        monkeypatch.setattr(commands, "_raw_decoder", lambda cmd: None)
+
+    raw = resolver.lookup(path).read_bytes()
+    expected = commands.decode(cmd, resolver.load(path))
+    for res in [raw, bytearray(raw), jsonlib.LazyReply(raw)]:
+        values = commands.decode(cmd, res)
+        assert values == expected
+        assert expected == values
+        assert repr(values) == repr(expected)
+
+    items = values if isinstance(values, list) else [values]
+    assert all(isinstance(item, commands.DECODERS[cmd]) for item in items)
+
+
+@pytest.mark.parametrize("msgspec", [True, False])
+def test_decode_raw_invalid(monkeypatch, msgspec):
+    if msgspec:
+        pytest.importorskip("msgspec")
+    else:
+        monkeypatch.setattr(commands, "_raw_decoder", lambda cmd: None)
+
+    res = b'{"STATUS": [{"STATUS": "E", "Msg": "failed"}], "id": 1}'
+    pytest.raises(exceptions.MinerMessageError, commands.decode, "version", res)
+    pytest.raises(
+        exceptions.MinerMessageMalformedError, commands.decode, "version", b"{"
+    )
@@ -0,0 +1,53 @@
+from luxos import fingerprint
+
+
+def test_family(resolver):
+    devs = resolver.load("messages/devs.json")
+    assert fingerprint.family(devs) == fingerprint.LUXOS
+    assert fingerprint.family({"STATUS": [], "DEVS": [], "id": 1}) == "stock"
+    assert fingerprint.family({"STATUS": [], "id": 1}) is None
+
+
+def test_family_raw(resolver):
+    raw = resolver.lookup("messages/devs.json").read_bytes()
+    assert fingerprint.family(raw) == fingerprint.LUXOS
+    assert fingerprint.family(b' {"STATUS": [], "DEVS": [], "id": 1}') == "stock"
+    assert fingerprint.family(b'{"STATUS": [], "id": 1}') is None
+    assert fingerprint.family(b"") is None
+
+
+def test_check():
+    store = fingerprint.FingerprintStore()
+    assert store.check("a", 1, elapsed=10) is None
+    store.update(fingerprint.Fingerprint("a", 1, "luxos", "S19", "1.0", "m1", 100))
+
+    known = store.check("a", 1, elapsed=160, mac="m1")
+    assert known and known.version == "1.0"
+    assert known.elapsed == 160
+
+    # a different miner
+    assert store.check("a", 1, elapsed=200, mac="m2") is None
+    assert store.get("a", 1) is None
+
+    # rebooted
+    store.update(fingerprint.Fingerprint("a", 1, "stock", elapsed=100))
+    assert store.check("a", 1, elapsed=150)
+    assert store.check("a", 1, elapsed=20) is None
+    assert store.report() == ["fingerprints: 2 still valid, 3 probed, 0 known"]
+
+
+def test_persist(tmp_path):
+    path = tmp_path / "fingerprints.json"
+    store = fingerprint.FingerprintStore(path)
+    assert store.load() == 0
+    store.update(fingerprint.Fingerprint("a", 1, "luxos", "S19", "1.0", "m1", 100))
+    store.update(fingerprint.Fingerprint("b", 1, "stock", "S9", elapsed=5))
+    store.save()
+
+    loaded = fingerprint.FingerprintStore(path)
+    assert loaded.load() == 2
+    assert loaded.get("a", 1) == store.get("a", 1)
+    assert loaded.check("b", 1, elapsed=10)
+
+    path.write_text('[{"host": "a"}]')
+    assert fingerprint.FingerprintStore(path).load() == 0
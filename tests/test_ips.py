@@ -1,5 +1,10 @@
 from __future__ import annotations
 
+import io
+import ipaddress
+import random
+import timeit
+
 import pytest
 
 from luxos import ips
@@ -14,6 +19,9 @@ VALUES = """
 127.0.0.1:1234-127.0.0.3:1234   -> 127.0.0.1, 127.0.0.3, 1234
 a.host                          -> a.host, None, None
 a.host:1234                     -> a.host, None, 1234
+10.1.0.0/16                     -> 10.1.0.0, 10.1.255.255, None
+10.1.2.3/24:1234                -> 10.1.2.0, 10.1.2.255, 1234
+10.1.2.3/32                     -> 10.1.2.3, 10.1.2.3, None
 """
 
 
@@ -112,6 +120,208 @@ def test_iter_ip_ranges():
     }
 
 
+def test_iter_hosts():
+    def expected(first, last):
+        first = ipaddress.IPv4Address(first)
+        last = ipaddress.IPv4Address(last)
+        return [str(ipaddress.IPv4Address(n)) for n in range(int(first), int(last) + 1)]
+
+    def hosts(first, last):
+        return list(
+            ips.iter_hosts(
+                int(ipaddress.IPv4Address(first)), int(ipaddress.IPv4Address(last))
+            )
+        )
+
+    assert hosts("127.0.0.1", "127.0.0.1") == ["127.0.0.1"]
+    assert hosts("127.0.0.3", "127.0.0.1") == []
+    for first, last in [
+        ("127.0.0.250", "127.0.1.3"),
+        ("10.0.255.0", "10.2.0.7"),
+        ("0.0.0.0", "0.0.0.255"),
+        ("255.255.255.250", "255.255.255.255"),
+    ]:
+        assert hosts(first, last) == expected(first, last)
+
+
+def test_iter_ip_ranges_networks():
+    assert len(list(ips.iter_ip_ranges("10.1.0.0/16"))) == 65536
+    assert list(ips.iter_ip_ranges("10.1.0.0/30:99")) == [
+        ("10.1.0.0", 99),
+        ("10.1.0.1", 99),
+        ("10.1.0.2", 99),
+        ("10.1.0.3", 99),
+    ]
+    assert list(ips.iter_ip_ranges("10.1.0.0/30", hosts_only=True)) == [
+        ("10.1.0.1", None),
+        ("10.1.0.2", None),
+    ]
+    # only networks skip the network/broadcast addresses
+    assert list(ips.iter_ip_ranges("10.1.0.0-10.1.0.1", hosts_only=True)) == [
+        ("10.1.0.0", None),
+        ("10.1.0.1", None),
+    ]
+    pytest.raises(ips.AddressParsingError, ips.parse_expr, "10.1.0.0/33")
+
+    # lazy expansion
+    addresses = ips.iter_ip_ranges("10.0.0.0/8")
+    assert next(addresses) == ("10.0.0.0", None)
+
+
+def test_iter_ip_ranges_exclusions():
+    txt = "10.1.0.0/29,!10.1.0.2-10.1.0.3,!10.1.0.5:99,a.host,b.host,!a.host"
+    assert list(ips.iter_ip_ranges(txt, port=99)) == [
+        ("10.1.0.0", 99),
+        ("10.1.0.1", 99),
+        ("10.1.0.4", 99),
+        ("10.1.0.6", 99),
+        ("10.1.0.7", 99),
+        ("b.host", 99),
+    ]
+
+    # exclusions with a port only apply to it
+    assert list(ips.iter_ip_ranges("10.1.0.0/30:88,!10.1.0.0/31:99")) == [
+        ("10.1.0.0", 88),
+        ("10.1.0.1", 88),
+        ("10.1.0.2", 88),
+        ("10.1.0.3", 88),
+    ]
+
+    addresses = ips.AddressSet.from_expr("10.1.0.0/12,!10.1.255.0/24", port=4028)
+    assert len(addresses) == 2**20 - 256
+    assert ("10.1.254.255", 4028) in addresses
+    assert ("10.1.255.3", 4028) not in addresses
+    assert addresses == ips.AddressSet.from_expr(
+        "10.0.0.0-10.1.254.255:4028,10.2.0.0-10.15.255.255:4028"
+    )
+
+
+def test_load_ips_exclusions(tmp_path):
+    path = tmp_path / "miners.csv"
+    path.write_text("10.1.0.0/29\n!10.1.0.4/30 # excluded\nhost\n!host\n")
+    assert ips.load_ips_from_csv(path, hosts_only=True) == [
+        ("10.1.0.1", 4028),
+        ("10.1.0.2", 4028),
+        ("10.1.0.3", 4028),
+    ]
+
+    path = tmp_path / "miners.yaml"
+    path.write_text(
+        """
+miners:
+  addresses:
+    - 10.1.0.0/29
+    - "!10.1.0.4/30"
+"""
+    )
+    assert ips.load_ips_from_yaml(path) == [
+        ("10.1.0.0", 4028),
+        ("10.1.0.1", 4028),
+        ("10.1.0.2", 4028),
+        ("10.1.0.3", 4028),
+    ]
+
+
+def test_address_set():
+    addresses = ips.AddressSet.from_expr("10.0.0.0-10.0.255.255:4028")
+    assert len(addresses) == 65536
+    assert ("10.0.1.1", 4028) in addresses
+    assert ("10.0.1.1", 4029) not in addresses
+    assert ("10.1.0.0", 4028) not in addresses
+    assert addresses.intervals(4028) == [(167772160, 167837695)]
+
+    # overlaps and duplicates are merged
+    addresses |= ips.AddressSet(
+        [("10.0.1.1", 4028), ("10.1.0.0", 4028), ("a.host", None), ("a.host", None)]
+    )
+    assert len(addresses) == 65538
+    assert addresses.intervals(4028) == [(167772160, 167837696)]
+    assert ("a.host", None) in addresses
+    assert addresses.ports() == [4028, None]
+    assert repr(addresses) == "<AddressSet 65538 addresses, 2 ports>"
+
+    # lazy, ordered by port then address
+    items = iter(addresses)
+    assert next(items) == ("10.0.0.0", 4028)
+    assert next(items) == ("10.0.0.1", 4028)
+    assert list(addresses)[-2:] == [("10.1.0.0", 4028), ("a.host", None)]
+
+    assert ips.AddressSet([("a.host", None)]).with_port(4028) == [("a.host", 4028)]
+    assert addresses.with_port(4028).ports() == [4028]
+    assert not ips.AddressSet()
+
+
+def test_address_set_algebra():
+    left = ips.AddressSet.from_expr("127.0.0.1-127.0.0.10,a.host,b.host:99")
+    right = ips.AddressSet.from_expr("127.0.0.5-127.0.0.15,127.0.0.1:99,b.host:99")
+
+    assert left | right == ips.AddressSet.from_expr(
+        "127.0.0.1-127.0.0.15,a.host,127.0.0.1:99,b.host:99"
+    )
+    assert left & right == [("b.host", 99), *ips.iter_ip_ranges("127.0.0.5-127.0.0.10")]
+    assert left - right == ips.AddressSet.from_expr("127.0.0.1-127.0.0.4,a.host")
+    assert right - left == ips.AddressSet.from_expr(
+        "127.0.0.11-127.0.0.15,127.0.0.1:99"
+    )
+
+    # holes
+    holes = ips.AddressSet.from_expr("127.0.0.1-127.0.0.20") - ips.AddressSet.from_expr(
+        "127.0.0.3-127.0.0.4,127.0.0.10,127.0.0.20"
+    )
+    assert holes == ips.AddressSet.from_expr(
+        "127.0.0.1-127.0.0.2,127.0.0.5-127.0.0.9,127.0.0.11-127.0.0.19"
+    )
+    assert len(holes) == 16
+    assert set(holes) == set(ips.iter_ip_ranges("127.0.0.1-127.0.0.20")) - set(
+        ips.iter_ip_ranges("127.0.0.3-127.0.0.4,127.0.0.10,127.0.0.20")
+    )
+
+
+def test_address_book():
+    book = ips.AddressBook.from_expr("10.0.0.0/16:4028,a.host,10.1.0.1")
+    assert len(book) == 65538
+    assert book[0] == ("10.0.0.0", 4028)
+    assert book[-2] == ("a.host", None)
+    assert book[-1] == ("10.1.0.1", None)
+    pytest.raises(IndexError, book.__getitem__, 65538)
+    assert ("10.0.1.1", 4028) in book
+    assert ("10.0.1.1", None) not in book
+    assert ("a.host", None) in book
+    assert repr(book) == "<AddressBook 65538 addresses>"
+    assert book.hosts.itemsize * len(book.hosts) <= 4 * len(book)
+
+    # slices are address books too
+    assert book[-3:] == [("10.0.255.255", 4028), ("a.host", None), ("10.1.0.1", None)]
+    assert isinstance(book[1:3], ips.AddressBook)
+    assert book[-3::2] == (("10.0.255.255", 4028), ("10.1.0.1", None))
+
+    assert book.with_port(1234)[-2:] == [("a.host", 1234), ("10.1.0.1", 1234)]
+
+    # shards
+    book.shuffle(random.Random(1))
+    assert len(book) == 65538
+    shards = [book[i::3] for i in range(3)]
+    assert sum(len(shard) for shard in shards) == len(book)
+    assert set().union(*shards) == set(
+        ips.iter_ip_ranges("10.0.0.0/16:4028,a.host,10.1.0.1")
+    )
+    assert ips.AddressSet(book) == ips.AddressSet.from_expr(
+        "10.0.0.0/16:4028,a.host,10.1.0.1"
+    )
+
+    book2 = ips.AddressBook(ips.AddressSet.from_expr("127.0.0.1-127.0.0.2,b.host:9"))
+    book2.extend(ips.AddressBook([("c.host", 1)]))
+    book2.append("127.0.0.3", 8)
+    assert book2 == [
+        ("127.0.0.1", None),
+        ("127.0.0.2", None),
+        ("b.host", 9),
+        ("c.host", 1),
+        ("127.0.0.3", 8),
+    ]
+    assert book2 == ips.AddressBook(list(book2))
+
+
 def test_load_ips_from_csv(resolver):
     pytest.raises(FileNotFoundError, ips.load_ips_from_csv, "/xwexwe/ewdew")
 
@@ -146,3 +356,125 @@ def test_load_ips_from_yaml(resolver):
         ("an.host", 4028),
         ("another.host", 111),
     ]
+
+
+def test_iter_ips_streaming(tmp_path, monkeypatch):
+    import io
+    import types
+
+    path = tmp_path / "miners.csv"
+    path.write_text("hostname\n10.1.0.0/30:9999\n\nhost # comment\n!10.1.0.2\n")
+
+    stream = ips.iter_ips_from_csv(path)
+    assert isinstance(stream, types.GeneratorType)
+    # exclusions apply to the whole file, also to the lines before them
+    assert list(stream) == [
+        ("10.1.0.0", 9999),
+        ("10.1.0.1", 9999),
+        ("10.1.0.3", 9999),
+        ("host", 4028),
+    ]
+    assert list(ips.iter_ips_from_csv(path)) == list(ips.load_ips_from_csv(path))
+
+    # from stdin exclusions apply only to the following lines
+    monkeypatch.setattr("sys.stdin", io.StringIO("10.1.0.0/31\n!10.1.0.1\n10.1.0.1"))
+    assert list(ips.iter_ips_from_csv("-", None)) == [
+        ("10.1.0.0", None),
+        ("10.1.0.1", None),
+    ]
+
+    path = tmp_path / "miners.yaml"
+    path.write_text("miners:\n  luxos_port: 1234\n  addresses:\n    - 10.1.0.0/31\n")
+    assert list(ips.iter_ips_from_yaml(path)) == [
+        ("10.1.0.0", 1234),
+        ("10.1.0.1", 1234),
+    ]
+    monkeypatch.setattr("sys.stdin", io.StringIO(path.read_text()))
+    assert ips.load_ips_from_yaml("-") == [("10.1.0.0", 1234), ("10.1.0.1", 1234)]
+
+
+def test_load_ips_cache(tmp_path, monkeypatch):
+    path = tmp_path / "miners.csv"
+    path.write_text("10.1.0.0/30:9999\nhost\n")
+    expected = [
+        ("10.1.0.0", 9999),
+        ("10.1.0.1", 9999),
+        ("10.1.0.2", 9999),
+        ("10.1.0.3", 9999),
+        ("host", 4028),
+    ]
+    assert ips.load_ips(path) == expected
+    assert ips.cache_path(path) == tmp_path / ".miners.csv.ipcache"
+    assert ips.cache_path(path).exists()
+
+    # cached, the inventory is not parsed
+    with monkeypatch.context() as mp:
+        mp.setattr(ips, "load_ips_from_csv", None)
+        assert ips.load_ips(path) == expected
+        # .. unless the arguments are different
+        pytest.raises(TypeError, ips.load_ips, path, port=None)
+
+    # invalidated on change
+    path.write_text("10.1.0.0/30:9999\n")
+    assert ips.load_cache(path) is None
+    assert ips.load_ips(path) == expected[:-1]
+
+    # corrupted
+    data = bytearray(ips.cache_path(path).read_bytes())
+    data[-4] ^= 0xFF
+    ips.cache_path(path).write_bytes(data)
+    assert ips.load_cache(path) is None
+
+    monkeypatch.setattr(ips, "CACHE_DIR", tmp_path / "cache")
+    assert ips.load_ips(path) == expected[:-1]
+    assert ips.cache_path(path).parent == tmp_path / "cache"
+    assert ips.load_cache(path) == expected[:-1]
+
+
+def test_load_ips_stdin(monkeypatch):
+    # read once, for both the yaml and csv attempts
+    for text in [
+        "10.0.0.1-10.0.0.3\n!10.0.0.2\n",
+        'miners:\n  addresses:\n    - 10.0.0.1-10.0.0.3\n    - "!10.0.0.2"\n',
+    ]:
+        monkeypatch.setattr("sys.stdin", io.StringIO(text))
+        assert ips.load_ips("-") == [("10.0.0.1", 4028), ("10.0.0.3", 4028)]
+
+
+@pytest.mark.manual
+def test_benchmark_parse(tmp_path):
+    """parse_expr, iter_ip_ranges and load_ips_from_csv timings
+
+    Run with: pytest --manual -s -k benchmark_parse
+    """
+    number = 10_000
+    exprs = [
+        f"10.{i // 256}.{i % 256}.1-10.{i // 256}.{i % 256}.9:9999"
+        for i in range(number)
+    ]
+
+    def parse():
+        ips.parse_expr.cache_clear()
+        for expr in exprs:
+            ips.parse_expr(expr)
+
+    delta = timeit.timeit(parse, number=1)
+    print(f"\nparse_expr {number} exprs {delta:.3f}s ({delta / number * 1e6:.1f}us)")
+    delta = timeit.timeit(lambda: [ips.parse_expr(e) for e in exprs], number=1)
+    print(f"parse_expr {number} exprs (cached) {delta:.3f}s")
+
+    delta = timeit.timeit(
+        lambda: list(ips.iter_ip_ranges("10.0.0.0-10.3.255.255")), number=1
+    )
+    print(f"iter_ip_ranges 262144 addresses {delta:.3f}s")
+
+    path = tmp_path / "inventory.csv"
+    path.write_text(
+        "\n".join(f"10.{i // 65536}.{i // 256 % 256}.{i % 256}" for i in range(100_000))
+    )
+    delta = timeit.timeit(lambda: ips.load_ips_from_csv(path), number=1)
+    print(f"load_ips_from_csv 100000 lines {delta:.3f}s")
+
+    ips.load_ips(path)
+    delta = timeit.timeit(lambda: ips.load_ips(path), number=1)
+    print(f"load_ips 100000 lines (cached) {delta:.3f}s")
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import json
+import math
+import timeit
+
+import pytest
+
+from luxos import jsonlib
+
+
+@pytest.fixture(scope="function")
+def backend():
+    previous = jsonlib.BACKEND
+    try:
+        yield
+    finally:
+        jsonlib.set_backend(previous)
+
+
+def test_available():
+    found = jsonlib.available()
+    assert found[-1] == "json"
+    assert set(found).issubset(jsonlib.PREFERENCE)
+
+
+@pytest.mark.parametrize("name", jsonlib.PREFERENCE)
+def test_loads(resolver, backend, name):
+    if name not in jsonlib.available():
+        pytest.skip(f"backend {name} not installed")
+    assert jsonlib.set_backend(name) == name
+    assert jsonlib.BACKEND == name
+
+    data = resolver.lookup("messages/devs.json").read_bytes()
+    expected = json.loads(data)
+    assert jsonlib.loads(data) == expected
+    assert jsonlib.loads(bytearray(data)) == expected
+    assert jsonlib.loads(data.decode()) == expected
+
+    # stricter backends fallback to the stdlib
+    assert math.isnan(jsonlib.loads(b'{"value": NaN}')["value"])
+
+    pytest.raises(ValueError, jsonlib.loads, b'{"value": ')
+
+
+def test_set_backend(backend):
+    assert jsonlib.set_backend("auto") == jsonlib.available()[0]
+    assert jsonlib.set_backend(None) == jsonlib.available()[0]
+    pytest.raises(ValueError, jsonlib.set_backend, "not-a-backend")
+
+
+@pytest.mark.manual
+@pytest.mark.parametrize("message", ["devs", "healthchipget"])
+def test_benchmark_loads(resolver, backend, message):
+    """compare the backends decoding captured replies
+
+    Run with: pytest --manual -s -k benchmark_loads
+    """
+    data = resolver.lookup(f"messages/{message}.json").read_bytes()
+    number = 2_000
+
+    reference = timeit.timeit(lambda: json.loads(data.decode()), number=number)
+    print(f"\n{message} ({len(data)} bytes, {number} loops)")
+    print(f"  {'json (str)':<12} {reference:.3f}s")
+    for name in jsonlib.available():
+        jsonlib.set_backend(name)
+        delta = timeit.timeit(lambda: jsonlib.loads(data), number=number)
+        print(f"  {name:<12} {delta:.3f}s ({reference / delta:.1f}x)")
+
+
+def test_lazy_reply(resolver, tmp_path):
+    data = resolver.lookup("messages/version.json").read_bytes()
+
+    reply = jsonlib.LazyReply(data)
+    assert reply.status == "S"
+    assert reply.id == 1
+    assert "STATUS" in reply and "id" in reply
+    assert not reply.parsed
+    assert repr(reply) == f"<LazyReply {len(data)} bytes status=S>"
+
+    reply.write(tmp_path / "reply.json")
+    assert (tmp_path / "reply.json").read_bytes() == data
+    assert not reply.parsed
+
+    # access a field
+    assert reply["VERSION"][0]["API"] == "3.7"
+    assert reply.parsed
+    assert reply == json.loads(data)
+    assert set(reply) == {"STATUS", "VERSION", "id"}
+    assert reply.status == "S"
+
+
+def test_lazy_reply_id():
+    # the top level id only
+    reply = jsonlib.LazyReply(b'{"STATUS": [{"STATUS": "S"}], "DEVS": [{"id": 7}]}')
+    assert reply.id is None
+    reply = jsonlib.LazyReply(b'{"DEVS": [{"id": 7}], "id": 1 }\n')
+    assert reply.id == 1
+    assert not reply.parsed
+    reply = jsonlib.LazyReply(b'{"x": {"id": 7}}')
+    assert reply.id is None
+
+    # not the last key
+    reply = jsonlib.LazyReply(b'{"id": 2, "DEVS": [{"id": 7}]}')
+    assert reply.id == 2
+    assert reply.parsed
+
+
+def test_lazy_reply_missing_fields():
+    reply = jsonlib.LazyReply(b'{"hello": "world"}')
+    assert reply.status is None
+    assert reply.id is None
+    assert "STATUS" not in reply
+    assert not reply.parsed
+    assert "hello" in reply
+    assert reply.parsed
+
+
+@pytest.mark.parametrize("size", [1, 7, 4096])
+def test_array_stream(resolver, size):
+    data = resolver.lookup("messages/healthchipget.json").read_bytes()
+    expected = json.loads(data)
+
+    stream = jsonlib.ArrayStream("CHIPS")
+    items = []
+    for index in range(0, len(data), size):
+        items.extend(stream.feed(data[index : index + size]))
+    assert items == expected["CHIPS"]
+    assert stream.count == len(items)
+    assert stream.close() == {**expected, "CHIPS": []}
+
+
+def test_array_stream_tokens():
+    # same key nested, escapes, brackets in strings and split numbers
+    data = (
+        '{"X": {"A": [0]}, "s": "a\\"],[", '
+        '"A": [1, "x\\\\é", [2, {"A": [3]}], "]", 1234], "A2": [5]}'
+    ).encode()
+    stream = jsonlib.ArrayStream("A")
+    items = []
+    for index in range(len(data)):
+        items.extend(stream.feed(data[index : index + 1]))
+    assert items == [1, "x\\é", [2, {"A": [3]}], "]", 1234]
+    assert stream.close() == {"X": {"A": [0]}, "s": 'a"],[', "A": [], "A2": [5]}
+
+    stream = jsonlib.ArrayStream("A")
+    assert stream.feed(b'{"A": [{"a": 1}, {"a"') == [{"a": 1}]
+    pytest.raises(ValueError, stream.close)
+
+    stream = jsonlib.ArrayStream("A")
+    assert stream.feed(b'{"B": []}') == []
+    assert not stream.found
+    assert stream.close() == {"B": []}
@@ -27,3 +27,32 @@ def test_iter_ip_ranges():
         "127.0.0.3",
         "127.0.0.15",
     }
+
+
+def test_format_traceback():
+    import traceback
+
+    def fail(index):
+        try:
+            {}["key"]
+        except KeyError as exc:
+            raise RuntimeError(f"failure {index}") from exc
+
+    exceptions = []
+    for index in range(3):
+        try:
+            fail(index)
+        except RuntimeError as exc:
+            exceptions.append(misc.clear_frames(exc))
+
+    misc._TRACEBACKS.clear()
+    for index, failure in enumerate(exceptions):
+        txt = misc.format_traceback(failure)
+        assert txt == "".join(
+            traceback.format_exception(type(failure), failure, failure.__traceback__)
+        )
+        assert txt.endswith(f"RuntimeError: failure {index}\n")
+        assert "KeyError: 'key'" in txt
+
+    # the two stacks (KeyError and RuntimeError) are formatted only once
+    assert len(misc._TRACEBACKS) == 2
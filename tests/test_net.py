@@ -0,0 +1,308 @@
+import asyncio
+import errno
+import json
+import logging
+import socket
+import socketserver
+import statistics
+import struct
+import threading
+import time
+
+import pytest
+
+from luxos import asyncops, net, syncops
+
+
+class PeerHandler(socketserver.BaseRequestHandler):
+    """replies with the client address"""
+
+    def handle(self):
+        self.request.recv(1024)
+        self.request.sendall(self.client_address[0].encode() + b"\x00")
+
+
+@pytest.fixture()
+def peerserver():
+    with socketserver.ThreadingTCPServer(("127.0.0.1", 0), PeerHandler) as server:
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield server.server_address
+        server.shutdown()
+
+
+class KeepAliveHandler(socketserver.BaseRequestHandler):
+    """replies with the client port to each command, keeping the connection"""
+
+    def handle(self):
+        while self.request.recv(1024):
+            self.request.sendall(str(self.client_address[1]).encode() + b"\x00")
+
+
+@pytest.fixture()
+def keepaliveserver():
+    with socketserver.ThreadingTCPServer(("127.0.0.1", 0), KeepAliveHandler) as server:
+        server.daemon_threads = True
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield server.server_address
+        server.shutdown()
+
+
+@pytest.fixture()
+def sources(monkeypatch):
+    # loopback aliases (all of 127.0.0.0/8 on linux)
+    with socket.socket() as sock:
+        try:
+            sock.bind(("127.0.0.2", 0))
+        except OSError:
+            pytest.skip("no 127.0.0.2 loopback alias")
+    pool = net.SourcePool(["127.0.0.2", "127.0.0.3"])
+    monkeypatch.setattr(net, "SOURCES", pool)
+    return pool
+
+
+class PeerServer6(socketserver.ThreadingTCPServer):
+    address_family = socket.AF_INET6
+
+
+@pytest.fixture()
+def peerserver6():
+    try:
+        server = PeerServer6(("::1", 0), PeerHandler)
+    except OSError:
+        pytest.skip("no ipv6 loopback")
+    with server:
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield server.server_address[:2]
+        server.shutdown()
+
+
+def test_source_parse(monkeypatch):
+    assert net.Source.parse("10.0.0.1") == net.Source("10.0.0.1")
+    assert net.Source.parse("10.0.0.1%eth1") == net.Source("10.0.0.1", "eth1")
+    assert net.Source.parse("%eth1") == net.Source("", "eth1")
+    assert str(net.Source.parse("10.0.0.1%eth1")) == "10.0.0.1%eth1"
+    pytest.raises(ValueError, net.Source.parse, "%")
+    pytest.raises(ValueError, net.SourcePool, [])
+
+    # no interface binding (eg. on windows/macos)
+    monkeypatch.setattr(net, "SO_BINDTODEVICE", None)
+    pytest.raises(ValueError, net.Source.parse, "10.0.0.1%eth1")
+    with socket.socket() as sock:
+        pytest.raises(OSError, net.Source("", "eth1").bind, sock)
+
+
+@pytest.mark.asyncio
+async def test_sources_async(peerserver, sources):
+    host, port = peerserver
+    peers = [
+        await asyncops.roundtrip(host, port, "hello", asjson=False) for _ in range(4)
+    ]
+    assert peers == ["127.0.0.2", "127.0.0.3"] * 2
+    assert [(s.connections, s.active, s.failures) for s in sources.sources] == [
+        (2, 0, 0),
+        (2, 0, 0),
+    ]
+    assert sources.report()[0] == "127.0.0.2: 2 connections, 0 active, 0 failed"
+
+
+def test_sources_sync(peerserver, sources):
+    host, port = peerserver
+    peers = [syncops.roundtrip(host, port, "hello", asjson=False) for _ in range(3)]
+    assert peers == ["127.0.0.2\x00", "127.0.0.3\x00", "127.0.0.2\x00"]
+    assert [s.connections for s in sources.sources] == [2, 1]
+
+
+@pytest.mark.asyncio
+async def test_ipv6(peerserver6):
+    host, port = peerserver6
+    assert net.address_family(host) == socket.AF_INET6
+    assert await asyncops.roundtrip(host, port, "hello", asjson=False) == "::1"
+    assert syncops.roundtrip(host, port, "hello", asjson=False) == "::1\x00"
+
+
+@pytest.mark.asyncio
+async def test_sources_family(peerserver, peerserver6, sources, monkeypatch):
+    assert net.Source("", "eth1").accepts(socket.AF_INET6)
+    with pytest.raises(OSError) as info:
+        sources.acquire(socket.AF_INET6)
+    assert info.value.errno == errno.EAFNOSUPPORT
+
+    # each connection from a source of the miner address family
+    pool = net.SourcePool(["127.0.0.2", "::1"])
+    monkeypatch.setattr(net, "SOURCES", pool)
+    peers = [
+        await asyncops.roundtrip(*server, "hello", asjson=False)
+        for server in [peerserver6, peerserver, peerserver, peerserver6]
+    ]
+    assert peers == ["::1", "127.0.0.2", "127.0.0.2", "::1"]
+    assert [source.connections for source in pool.sources] == [2, 2]
+
+
+def test_keep_alive(caplog):
+    caplog.set_level(logging.INFO)
+    with net.keep_alive() as pool:
+        assert net.POOL is pool
+    assert net.POOL is None
+    assert caplog.records[-1].getMessage().startswith("connections pool: 0 hits")
+
+
+@pytest.mark.asyncio
+async def test_connection_pool(keepaliveserver, peerserver, monkeypatch):
+    pool = net.ConnectionPool()
+    monkeypatch.setattr(net, "POOL", pool)
+
+    # the same connection (client port) is reused
+    host, port = keepaliveserver
+    replies = [
+        await asyncops.roundtrip(host, port, "x", asjson=False) for _ in range(3)
+    ]
+    assert len(set(replies)) == 1
+    assert (pool.hits, pool.misses) == (2, 1)
+    assert pool.capable == {(host, port): True}
+
+    # the miner closes the connection: fallback to a new one
+    host2, port2 = peerserver
+    for _ in range(3):
+        assert await asyncops.roundtrip(host2, port2, "x", asjson=False) == "127.0.0.1"
+    assert pool.capable[(host2, port2)] is False
+    assert pool.acquire(host2, port2) is None
+
+    pool.close()
+    assert pool.report()[0].startswith("connections pool: 2 hits, 5 misses")
+
+
+def test_socket_profile(monkeypatch):
+    monkeypatch.setattr(net, "PROFILE", net.PROFILES["sweep"])
+    with net.connection() as sock:
+        assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+        linger = sock.getsockopt(
+            socket.SOL_SOCKET, socket.SO_LINGER, struct.calcsize(net.LINGER_FORMAT)
+        )
+        assert struct.unpack(net.LINGER_FORMAT, linger) == (1, 0)
+
+    monkeypatch.setattr(net, "PROFILE", net.PROFILES["default"])
+    with net.connection() as sock:
+        assert not sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+
+
+@pytest.mark.manual
+@pytest.mark.asyncio
+async def test_benchmark_socket_profiles(echopool, monkeypatch):
+    """connection rate and latency of the socket profiles (on the emulator)
+
+    Run with: pytest --manual -s -k benchmark_socket_profiles
+    """
+    echopool.start(1)
+    host, port = echopool.addresses[0]
+    number, concurrency = 2_000, 50
+
+    async def call(semaphore, latencies):
+        async with semaphore:
+            t0 = time.perf_counter()
+            await asyncops.roundtrip(host, port, "hello", asjson=False)
+            latencies.append(time.perf_counter() - t0)
+
+    print()
+    for name, profile in net.PROFILES.items():
+        monkeypatch.setattr(net, "PROFILE", profile)
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies: list[float] = []
+        t0 = time.perf_counter()
+        await asyncio.gather(*(call(semaphore, latencies) for _ in range(number)))
+        delta = time.perf_counter() - t0
+        quantiles = statistics.quantiles(latencies, n=100)
+        print(
+            f"{name:<8} {number / delta:7.0f} conn/s, latency "
+            f"p50 {quantiles[49] * 1000:.2f}ms p99 {quantiles[98] * 1000:.2f}ms"
+        )
+
+
+@pytest.mark.asyncio
+async def test_rexec_single_flight(resolver, monkeypatch):
+    data = resolver.lookup("messages/version.json").read_bytes()
+    commands = []
+
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            commands.append(json.loads(self.request.recv(1024))["command"])
+            time.sleep(0.1)
+            self.request.sendall(data + b"\x00")
+
+    with socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler) as server:
+        server.daemon_threads = True
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        host, port = server.server_address
+        monkeypatch.setattr(asyncops, "SINGLE_FLIGHT", True)
+
+        # the concurrent calls share one request, a cancelled one doesn't matter
+        calls = [
+            asyncio.ensure_future(asyncops.rexec(host, port, "version"))
+            for _ in range(5)
+        ]
+        await asyncio.sleep(0.01)
+        calls[0].cancel()
+        replies = await asyncio.gather(*calls[1:])
+        assert commands == ["version"]
+        assert all(reply == replies[0] for reply in replies)
+        # each caller gets its own copy
+        replies[0]["VERSION"].clear()
+        assert replies[1]["VERSION"][0]["API"] == "3.7"
+        assert not asyncops._inflight
+
+        # the lazy replies share the request, different limits don't
+        replies = await asyncio.gather(
+            asyncops.rexec(host, port, "version", lazy=True),
+            asyncops.rexec(host, port, "version", lazy=True),
+            asyncops.rexec(host, port, "version", deadline=5),
+        )
+        assert commands == ["version"] * 3
+        assert replies[0] is not replies[1]
+        assert replies[0].raw == replies[1].raw
+
+        # the calls after the reply get a new request
+        await asyncops.rexec(host, port, "version", validate=True)
+        assert commands == ["version"] * 4
+
+        monkeypatch.setattr(asyncops, "SINGLE_FLIGHT", False)
+        await asyncio.gather(*(asyncops.rexec(host, port, "version") for _ in range(2)))
+        assert commands == ["version"] * 6
+        server.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_rexec_logoff_best_effort(monkeypatch):
+    """a stuck logoff doesn't lose the command reply (nor retries the command)"""
+    commands = []
+
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            cmd = json.loads(self.request.recv(1024))["command"]
+            commands.append(cmd)
+            reply = {"STATUS": [{"STATUS": "S"}], "id": 1}
+            if cmd == "logon":
+                reply["SESSION"] = [{"SessionID": "abc"}]
+            elif cmd == "logoff":
+                time.sleep(1)
+            # no NUL terminator, the sync roundtrip reads up to the end
+            self.request.sendall(json.dumps(reply).encode())
+
+    with socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler) as server:
+        server.daemon_threads = True
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        host, port = server.server_address
+        monkeypatch.setattr(asyncops, "LOGOFF_TIMEOUT", 0.1)
+        monkeypatch.setattr(syncops, "LOGOFF_TIMEOUT", 0.1)
+
+        res = await asyncops.rexec(host, port, "fanset", retry=2, deadline=0.5)
+        assert res["STATUS"][0]["STATUS"] == "S"
+        assert commands == ["logon", "fanset", "logoff"]
+
+        res = syncops.rexec(host, port, "fanset", retry=2, deadline=0.5)
+        assert res["STATUS"][0]["STATUS"] == "S"
+        assert commands == ["logon", "fanset", "logoff"] * 2
+        server.shutdown()
@@ -0,0 +1,98 @@
+import asyncio
+import socket
+
+import pytest
+
+from luxos import asyncops, exceptions, ips, resolver, syncops
+
+
+@pytest.fixture()
+def lookups(monkeypatch):
+    """fake resolver: the .bad hosts fail, the others resolve to 10.0.0.1"""
+    calls = []
+
+    def getaddrinfo(host, port, *args, **kwargs):
+        calls.append(host)
+        if host.endswith(".bad"):
+            raise socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+        if host.endswith(".v6"):
+            return [
+                (socket.AF_INET6, socket.SOCK_STREAM, 6, "", ("fd00::1", port, 0, 0))
+            ]
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("10.0.0.1", port))]
+
+    monkeypatch.setattr(socket, "getaddrinfo", getaddrinfo)
+    monkeypatch.setattr(resolver, "RESOLVER", resolver.Resolver())
+    return calls
+
+
+def test_resolve(lookups, monkeypatch):
+    assert resolver.resolve("127.0.0.1", 4028) == "127.0.0.1"
+    assert resolver.resolve("fd00::2", 4028) == "fd00::2"
+    assert lookups == []
+    assert resolver.resolve("a.v6", 4028) == "fd00::1"
+    lookups.clear()
+
+    assert resolver.resolve("a.host", 4028) == "10.0.0.1"
+    assert resolver.resolve("a.host", 4029) == "10.0.0.1"
+    assert lookups == ["a.host"]
+
+    # failures are cached too
+    pytest.raises(exceptions.MinerResolutionError, resolver.resolve, "x.bad", 4028)
+    pytest.raises(exceptions.MinerResolutionError, resolver.resolve, "x.bad", 4028)
+    assert lookups == ["a.host", "x.bad"]
+    assert (resolver.RESOLVER.hits, resolver.RESOLVER.misses) == (2, 3)
+
+    # expired
+    monkeypatch.setattr(resolver, "TTL", -1)
+    resolver.RESOLVER.clear()
+    resolver.resolve("a.host", 4028)
+    resolver.resolve("a.host", 4028)
+    assert lookups == ["a.host", "x.bad", "a.host", "a.host"]
+
+
+@pytest.mark.asyncio
+async def test_aresolve(lookups):
+    result = await asyncio.gather(
+        *(resolver.aresolve("a.host", 4028) for _ in range(10))
+    )
+    assert result == ["10.0.0.1"] * 10
+    # a single lookup, shared by the concurrent calls
+    assert lookups == ["a.host"]
+
+    failures = await resolver.prefetch(["a.host", "b.host", "x.bad", "y.bad", "x.bad"])
+    assert sorted(failures) == ["x.bad", "y.bad"]
+    assert failures["x.bad"].address == ("x.bad", 4028)
+    assert sorted(lookups) == ["a.host", "b.host", "x.bad", "y.bad"]
+
+
+@pytest.mark.asyncio
+async def test_rexec_resolution_error(lookups):
+    with pytest.raises(exceptions.MinerResolutionError) as info:
+        await asyncops.rexec("x.bad", 4028, "version", retry=3, retry_delay=10)
+    assert info.value.address == ("x.bad", 4028)
+    assert lookups == ["x.bad"]
+
+    pytest.raises(
+        exceptions.MinerResolutionError,
+        syncops.rexec,
+        "x.bad",
+        4028,
+        "version",
+        retry=3,
+        retry_delay=10,
+    )
+    assert lookups == ["x.bad"]
+
+
+def test_hostnames():
+    assert resolver.hostnames([("a.host", 1), ("127.0.0.1", 2), ("::1", 3)]) == {
+        "a.host"
+    }
+    assert resolver.hostnames(ips.AddressBook.from_expr("127.0.0.1,a.host:9")) == {
+        "a.host"
+    }
+    assert resolver.hostnames(ips.AddressSet.from_expr("127.0.0.1,a.host")) == {
+        "a.host"
+    }
+    assert resolver.hostnames(iter([("a.host", 1)])) == set()
@@ -1,3 +1,4 @@
+import time
 from string import ascii_lowercase
 
 import pytest
@@ -160,3 +161,31 @@ def test_atm_flip(miner_host_port):
 
     syncops.rexec(host, port, "atmset", {"enabled": not getatm()})
     assert status == getatm()
+
+
+def test_rexec_deadline(dripserver):
+    host, port = dripserver
+
+    t0 = time.monotonic()
+    with pytest.raises(exceptions.MinerCommandTimeoutError):
+        syncops.rexec(host, port, "version", timeout=1, deadline=0.5)
+    assert time.monotonic() - t0 < 0.7
+
+    # roundtrip keeps retrying the failed reads up to timeout
+    t0 = time.monotonic()
+    with pytest.raises(exceptions.MinerCommandTimeoutError):
+        syncops.rexec(host, port, "version", timeout=0.25, idle_timeout=0.05)
+    assert time.monotonic() - t0 < 0.4
+
+    t0 = time.monotonic()
+    with pytest.raises(exceptions.MinerCommandTimeoutError):
+        syncops.rexec(
+            host,
+            port,
+            "version",
+            idle_timeout=0.05,
+            retry=5,
+            retry_delay=1,
+            deadline=0.4,
+        )
+    assert time.monotonic() - t0 < 0.6
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import contextlib
+import io
+import json
+
+import pytest
+
+from luxos import tracing
+
+
+def test_span_disabled(monkeypatch):
+    monkeypatch.setattr(tracing, "TRACER", None)
+    assert isinstance(tracing.span("connect", "a", 1), contextlib.nullcontext)
+
+
+def test_tracer(monkeypatch):
+    tracer = tracing.Tracer()
+    monkeypatch.setattr(tracing, "TRACER", tracer)
+
+    with tracing.span("command", "host-a", 4028, cmd="version"):
+        with tracing.span("connect", "host-a", 4028):
+            pass
+    with pytest.raises(TimeoutError):
+        with tracing.span("connect", "host-b", 4028):
+            raise TimeoutError("boo")
+
+    assert [(e["name"], e["tid"]) for e in tracer.events] == [
+        ("connect", 1),
+        ("command", 1),
+        ("connect", 2),
+    ]
+    command = tracer.events[1]
+    assert command["args"] == {"cmd": "version"}
+    assert command["ph"] == "X"
+    assert command["ts"] <= tracer.events[0]["ts"]
+    assert command["dur"] >= tracer.events[0]["dur"]
+    assert tracer.events[2]["args"] == {"error": "TimeoutError('boo')"}
+
+    fp = io.StringIO()
+    tracer.dump(fp)
+    data = json.loads(fp.getvalue())
+    names = [e for e in data["traceEvents"] if e["ph"] == "M"]
+    assert [e["args"]["name"] for e in names] == ["host-a:4028", "host-b:4028"]
+    assert len(data["traceEvents"]) == 5
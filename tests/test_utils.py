@@ -6,7 +6,7 @@ import asyncio
 import pytest
 
 import luxos.asyncops
-from luxos import utils
+from luxos import ips, misc, utils
 
 
 @pytest.mark.manual
@@ -126,3 +126,39 @@ async def test_launch_with_exceptions(miner_host_port):
     assert isinstance(result, utils.LuxosLaunchTimeoutError)
     assert isinstance(result, asyncio.TimeoutError)
     assert "ConnectionRefusedError" in str(result.traceback)
+
+
+@pytest.mark.asyncio
+async def test_launch_lazy_traceback():
+    async def broken(host, port):
+        return {}["a-key"]
+
+    addresses = [("127.0.0.1", 4028), ("127.0.0.2", 4028)]
+    result = await utils.launch(addresses, broken, asobj=True)
+    assert all(isinstance(item, utils.LuxosLaunchError) for item in result)
+    assert isinstance(result[0].exception, KeyError)
+    assert result[0].traceback == result[1].traceback
+    assert result[0].traceback.endswith("KeyError: 'a-key'\n")
+
+
+@pytest.mark.asyncio
+async def test_launch_address_book():
+    async def echo(host, port):
+        return (host, port)
+
+    addresses = ips.AddressBook.from_expr("127.0.0.1-127.0.0.5:4028")
+    assert await utils.launch(addresses, echo) == list(addresses)
+    assert await utils.launch(addresses, echo, batch=2) == list(addresses)
+
+
+def test_launch_error_traceback_kwarg():
+    from luxos.scripts.async_luxos import Result
+
+    error = utils.LuxosLaunchTimeoutError("a", 1, traceback="a traceback", brief="x")
+    assert isinstance(error.exception, misc.FormattedTraceback)
+    assert error.traceback == "a traceback"
+    assert utils.LuxosLaunchError("a", 1, "positional").traceback == "positional"
+    assert utils.LuxosLaunchError("a", 1).traceback is None
+
+    assert Result("a", 1, tback="timeout error").tback == "timeout error"
+    assert Result("a", 1, value=2).exception is None